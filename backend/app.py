@@ -1,108 +1,216 @@
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError, OperationalError
 from datetime import datetime, timedelta
+import base64
+import click
+import json
 import os
+import shutil
+import tempfile
+
+from models import db, User, Fleet, Vehicle, Station, Order, PlatformRawData, PricingRule, DiscountRule, RechargeRecord, Job, normalize_plate
+import balance
+from batching import iter_chunks
+import dashboard
+from database import configure_database, configure_engines, instrument_engine, read_replica
+import db_utils
+import exporter
+import importer
+import jobs
+import partitions
+import reconciliation
+from jobs import JobCancelled, JobRunner, job_handler
+from metrics import RequestMetrics, check_metrics_token
+import settlement
+from passwords import HashingBusy, password_hasher
+import plate_index
+from plate_index import PlateIndex
+from serializers import FastJSONProvider, isoformat, to_columns
+import vehicle_bulk
 
 # 创建Flask应用
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # 配置
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///data_platform.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-string'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 
+# 数据导出每批读取的行数
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 5000))
+# 车辆批量写入每条语句处理的行数
+app.config['VEHICLE_BULK_BATCH_SIZE'] = int(os.environ.get('VEHICLE_BULK_BATCH_SIZE', 500))
+# 订单导入每批处理的行数
+app.config['IMPORT_CHUNK_SIZE'] = int(os.environ.get('IMPORT_CHUNK_SIZE', 2000))
+# 多文件导入的解析进程数，默认使用全部CPU核心
+app.config['IMPORT_WORKERS'] = int(os.environ.get('IMPORT_WORKERS', 0)) or os.cpu_count()
+# 订单列表单次查询的最大日期跨度（天），限制扫描的月份分区数
+app.config['ORDER_QUERY_MAX_DAYS'] = int(os.environ.get('ORDER_QUERY_MAX_DAYS', 366))
+# 车牌联想内存索引的最大车辆数（0 表示不建索引，联想直接查询数据库）及其他进程写入的同步间隔（秒）
+app.config['VEHICLE_INDEX_MAX_SIZE'] = int(os.environ.get('VEHICLE_INDEX_MAX_SIZE', 200000))
+app.config['VEHICLE_INDEX_REFRESH'] = int(os.environ.get('VEHICLE_INDEX_REFRESH', 60))
+
+# 后台任务（见 jobs.py）：thread 为进程内工作线程，celery 经 Redis 分发给独立 worker，inline 在请求内同步执行
+app.config['JOB_BACKEND'] = os.environ.get('JOB_BACKEND', 'thread')
+# 每个 Web 进程的工作线程数；0 表示 Web 进程不执行任务，由 flask run-jobs 单独运行
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+# 运行中任务超过该秒数没有心跳视为进程已退出，重新排队
+app.config['JOB_STALE_SECONDS'] = int(os.environ.get('JOB_STALE_SECONDS', 300))
+# 失败重试的基础等待秒数，每次翻倍
+app.config['JOB_RETRY_DELAY'] = int(os.environ.get('JOB_RETRY_DELAY', 10))
+# 导入文件和导出结果的存放目录，结束的任务文件保留 JOB_RESULT_TTL 秒
+app.config['JOB_STORAGE_DIR'] = os.environ.get('JOB_STORAGE_DIR') or os.path.join(app.instance_path, 'jobs')
+app.config['JOB_RESULT_TTL'] = int(os.environ.get('JOB_RESULT_TTL', 86400))
+app.config['CELERY_BROKER_URL'] = os.environ.get('CELERY_BROKER_URL') or os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+# 数据库引擎：DATABASE_URL、连接池、SQLite PRAGMA 及只读副本，见 database.py
+configure_database(app)
+
 # 初始化扩展
-db = SQLAlchemy(app)
+db.init_app(app)
 jwt = JWTManager(app)
 CORS(app)
 
-# 用户模型
-class User(db.Model):
-    __tablename__ = 'users'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.String(20), default='user')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'role': self.role,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+# 请求埋点：路由耗时、SQL 语句数与耗时，指标见 /api/metrics
+request_metrics = RequestMetrics()
+request_metrics.init_app(app)
+with app.app_context():
+    configure_engines(list(db.engines.values()))
+    for engine in db.engines.values():
+        instrument_engine(engine, request_metrics)
 
-# 车队模型
-class Fleet(db.Model):
-    __tablename__ = 'fleets'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    description = db.Column(db.Text)
-    contact_person = db.Column(db.String(50))
-    contact_phone = db.Column(db.String(20))
-    status = db.Column(db.String(20), default='active')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'contact_person': self.contact_person,
-            'contact_phone': self.contact_phone,
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+job_runner = JobRunner(app)
 
-# 车辆模型
-class Vehicle(db.Model):
-    __tablename__ = 'vehicles'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    plate_number = db.Column(db.String(20), unique=True, nullable=False)
-    vehicle_type = db.Column(db.String(50), nullable=False)
-    fleet_id = db.Column(db.Integer, db.ForeignKey('fleets.id'), nullable=False)
-    driver_name = db.Column(db.String(50))
-    driver_phone = db.Column(db.String(20))
-    status = db.Column(db.String(20), default='normal')
-    remark = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    # 关联关系
-    fleet = db.relationship('Fleet', backref=db.backref('vehicles', lazy=True))
+# 车牌前缀联想的进程内索引，见 plate_index.py
+vehicle_plates = PlateIndex(app)
+
+# 车辆列表投影查询：只取响应需要的列，车队名称通过 JOIN 一次带出，避免逐行懒加载
+def vehicle_list_query():
+    return db.session.query(
+        Vehicle.id,
+        Vehicle.plate_number,
+        Vehicle.vehicle_type,
+        Vehicle.fleet_id,
+        Fleet.name.label('fleet_name'),
+        Vehicle.driver_name,
+        Vehicle.driver_phone,
+        Vehicle.status,
+        Vehicle.remark,
+        Vehicle.created_at
+    ).outerjoin(Fleet, Vehicle.fleet_id == Fleet.id)
+
+def vehicle_row_to_dict(row):
+    data = row._asdict()
+    data['created_at'] = row.created_at.isoformat() if row.created_at else None
+    return data
+
+VEHICLE_LIST_FIELDS = (
+    'id', 'plate_number', 'vehicle_type', 'fleet_id', 'fleet_name',
+    'driver_name', 'driver_phone', 'status', 'remark', 'created_at'
+)
+
+# 列表响应格式：默认每行一个对象；?format=columnar 时每个字段一个数组，适合大列表
+def wants_columnar():
+    return request.args.get('format') == 'columnar'
+
+def vehicle_items(rows):
+    if wants_columnar():
+        return to_columns(rows, VEHICLE_LIST_FIELDS, {'created_at': isoformat})
+    return [vehicle_row_to_dict(row) for row in rows]
+
+# 车辆关键词检索：SQLite 使用 FTS5 trigram 索引（任意子串匹配，按 bm25 排序）
+VEHICLE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE vehicles_fts USING fts5(
+        plate_number, vehicle_type, driver_name,
+        content='vehicles', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER vehicles_fts_ai AFTER INSERT ON vehicles BEGIN
+        INSERT INTO vehicles_fts(rowid, plate_number, vehicle_type, driver_name)
+        VALUES (new.id, new.plate_number, new.vehicle_type, new.driver_name);
+    END""",
+    """CREATE TRIGGER vehicles_fts_ad AFTER DELETE ON vehicles BEGIN
+        INSERT INTO vehicles_fts(vehicles_fts, rowid, plate_number, vehicle_type, driver_name)
+        VALUES ('delete', old.id, old.plate_number, old.vehicle_type, old.driver_name);
+    END""",
+    """CREATE TRIGGER vehicles_fts_au AFTER UPDATE ON vehicles BEGIN
+        INSERT INTO vehicles_fts(vehicles_fts, rowid, plate_number, vehicle_type, driver_name)
+        VALUES ('delete', old.id, old.plate_number, old.vehicle_type, old.driver_name);
+        INSERT INTO vehicles_fts(rowid, plate_number, vehicle_type, driver_name)
+        VALUES (new.id, new.plate_number, new.vehicle_type, new.driver_name);
+    END""",
+    "INSERT INTO vehicles_fts(vehicles_fts) VALUES ('rebuild')"
+]
+
+# trigram 分词要求关键词至少3个字符，更短的关键词走 LIKE 回退
+VEHICLE_FTS_MIN_LENGTH = 3
+
+_vehicle_fts_available = None
+
+def create_vehicle_search_index():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    # 触发器随 vehicles 表一起删除，缺失时整体重建索引
+    exists = db.session.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'vehicles_fts_au'")
+    ).first()
+    if exists:
+        return True
+    try:
+        db.session.execute(db.text('DROP TABLE IF EXISTS vehicles_fts'))
+        for ddl in VEHICLE_FTS_DDL:
+            db.session.execute(db.text(ddl))
+        db.session.commit()
+        return True
+    except OperationalError:
+        # SQLite 未编译 FTS5 或版本过低（trigram 需要 3.34+）
+        db.session.rollback()
+        return False
+
+def vehicle_search_available():
+    global _vehicle_fts_available
+    if _vehicle_fts_available is None:
+        _vehicle_fts_available = db.engine.dialect.name == 'sqlite' and db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vehicles_fts'")
+        ).first() is not None
+    return _vehicle_fts_available
+
+def apply_vehicle_keyword(query, keyword):
+    if len(keyword) >= VEHICLE_FTS_MIN_LENGTH and vehicle_search_available():
+        match = '"' + keyword.replace('"', '""') + '"'
+        fts = db.select(
+            db.literal_column('rowid').label('vehicle_id'),
+            db.literal_column('rank').label('rank')
+        ).select_from(db.text('vehicles_fts')).where(
+            db.text('vehicles_fts MATCH :match').bindparams(match=match)
+        ).subquery()
+        return query.join(fts, fts.c.vehicle_id == Vehicle.id), fts.c.rank
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'plate_number': self.plate_number,
-            'vehicle_type': self.vehicle_type,
-            'fleet_id': self.fleet_id,
-            'fleet_name': self.fleet.name if self.fleet else None,
-            'driver_name': self.driver_name,
-            'driver_phone': self.driver_phone,
-            'status': self.status,
-            'remark': self.remark,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    query = query.filter(
+        db.or_(
+            Vehicle.plate_number.contains(keyword),
+            Vehicle.vehicle_type.contains(keyword),
+            Vehicle.driver_name.contains(keyword)
+        )
+    )
+    return query, None
+
+# 游标工具函数
+def encode_cursor(created_at, record_id):
+    payload = json.dumps([created_at.isoformat(), record_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (ValueError, TypeError):
+        raise ValueError('无效的游标')
 
 # 认证路由
 @app.route('/api/auth/login', methods=['POST'])
@@ -120,7 +228,15 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        # 哈希校验在有界线程池中执行，繁忙时返回 429
+        if user and password_hasher.verify(user.password_hash, password):
+            # 存量哈希参数与当前配置不同时顺带重算；线程池繁忙则留到下次登录
+            if password_hasher.needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = password_hasher.hash(password)
+                    db.session.commit()
+                except HashingBusy:
+                    pass
             access_token = create_access_token(identity=user.id)
             return jsonify({
                 'code': 200,
@@ -136,6 +252,11 @@ def login():
                 'message': '用户名或密码错误'
             }), 401
             
+    except HashingBusy:
+        return jsonify({
+            'code': 429,
+            'message': '登录请求过多，请稍后重试'
+        }), 429, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -169,28 +290,73 @@ def get_current_user():
 # 车辆管理路由
 @app.route('/api/vehicles', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_vehicles():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         keyword = request.args.get('keyword', '')
+        after = request.args.get('after')
+        limit = request.args.get('limit', type=int)
         
-        query = Vehicle.query
+        query = vehicle_list_query()
+        rank = None
         
         if keyword:
-            query = query.filter(
-                db.or_(
-                    Vehicle.plate_number.contains(keyword),
-                    Vehicle.vehicle_type.contains(keyword),
-                    Vehicle.driver_name.contains(keyword)
+            query, rank = apply_vehicle_keyword(query, keyword)
+        
+        # 按 (created_at, id) 倒序，保证翻页顺序稳定
+        ordered = query.order_by(Vehicle.created_at.desc(), Vehicle.id.desc())
+        
+        # 游标模式：?after=<cursor>&limit=，不使用 OFFSET，默认不统计总数
+        if after is not None or limit is not None:
+            limit = min(max(limit or 20, 1), 200)
+            with_total = request.args.get('with_total', 'false').lower() in ('1', 'true')
+            
+            page_query = ordered
+            if after:
+                try:
+                    cursor_time, cursor_id = decode_cursor(after)
+                except ValueError as e:
+                    return jsonify({
+                        'code': 400,
+                        'message': str(e)
+                    }), 400
+                page_query = page_query.filter(
+                    db.or_(
+                        Vehicle.created_at < cursor_time,
+                        db.and_(Vehicle.created_at == cursor_time, Vehicle.id < cursor_id)
+                    )
                 )
-            )
+            
+            # 多取一条用于判断是否还有下一页
+            rows = page_query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            
+            data = {
+                'items': vehicle_items(rows),
+                'limit': limit,
+                'has_more': has_more,
+                'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+            }
+            if with_total:
+                data['total'] = query.order_by(None).count()
+            
+            return jsonify({
+                'code': 200,
+                'data': data
+            })
         
-        pagination = query.paginate(
+        # 关键词命中全文索引时按相关度排序
+        if rank is not None:
+            ordered = query.order_by(rank, Vehicle.created_at.desc(), Vehicle.id.desc())
+        
+        pagination = ordered.paginate(
             page=page, per_page=per_page, error_out=False
         )
         
-        vehicles = [vehicle.to_dict() for vehicle in pagination.items]
+        vehicles = vehicle_items(pagination.items)
         
         return jsonify({
             'code': 200,
@@ -209,39 +375,182 @@ def get_vehicles():
             'message': f'服务器错误: {str(e)}'
         }), 500
 
+def insert_vehicle(values):
+    # 支持 RETURNING 的数据库（SQLite / PostgreSQL）一次往返完成写入并取回响应字段，MySQL 写入后按主键再查一次
+    table = Vehicle.__table__
+    fleet_name = db.select(Fleet.name).where(Fleet.id == values['fleet_id']).scalar_subquery()
+    statement = db.insert(table).values(**values)
+    if db.session.get_bind().dialect.insert_returning:
+        row = db.session.execute(statement.returning(
+            table.c.id, table.c.created_at, fleet_name.label('fleet_name')
+        )).one()
+        result = {**values, 'id': row.id, 'fleet_name': row.fleet_name, 'created_at': isoformat(row.created_at)}
+    else:
+        vehicle_id = db.session.execute(statement).inserted_primary_key[0]
+        result = vehicle_row_to_dict(vehicle_list_query().filter(Vehicle.id == vehicle_id).one())
+    return {field: result[field] for field in VEHICLE_LIST_FIELDS}
+
 @app.route('/api/vehicles', methods=['POST'])
 @jwt_required()
 def create_vehicle():
     try:
         data = request.get_json()
         
-        # 检查车牌号是否已存在
-        existing_vehicle = Vehicle.query.filter_by(plate_number=data['plate_number']).first()
-        if existing_vehicle:
+        values = {
+            'plate_number': data['plate_number'],
+            'vehicle_type': data['vehicle_type'],
+            'fleet_id': data['fleet_id'],
+            'driver_name': data.get('driver_name'),
+            'driver_phone': data.get('driver_phone'),
+            'status': data.get('status', 'normal'),
+            'remark': data.get('remark')
+        }
+        
+        # 直接写入，车牌号重复由唯一约束拦截，不预先查询；车队名称随 RETURNING 一并取回
+        result = insert_vehicle(values)
+        db.session.commit()
+        vehicle_plates.add([(result['id'], result['plate_number'], result['fleet_id'])])
+        
+        return jsonify({
+            'code': 200,
+            'message': '车辆创建成功',
+            'data': result
+        })
+        
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 400,
+            'message': '车牌号已存在' if db_utils.is_unique_violation(e, 'plate_number') else '数据不符合约束'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.route('/api/vehicles/suggest', methods=['GET'])
+@jwt_required()
+@read_replica
+def suggest_vehicles():
+    try:
+        prefix = request.args.get('prefix', '').strip()
+        limit = min(max(request.args.get('limit', plate_index.DEFAULT_LIMIT, type=int), 1), plate_index.MAX_LIMIT)
+        
+        key = normalize_plate(prefix)
+        items = vehicle_plates.suggest(key, limit) if key else []
+        if items is None:
+            # 索引加载中或车辆数超过上限：按规范化车牌前缀查询数据库，匹配规则与内存索引相同
+            rows = db.session.execute(
+                db.select(Vehicle.id, Vehicle.plate_number, Vehicle.fleet_id)
+                .where(db.or_(*(
+                    Vehicle.plate_key.startswith(value, autoescape=True) for value in plate_index.expand_prefix(key)
+                )))
+                .order_by(Vehicle.plate_key, Vehicle.id)
+                .limit(limit)
+            ).all()
+            items = [row._asdict() for row in rows]
+        
+        return jsonify({
+            'code': 200,
+            'data': items
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+def bulk_summary(results):
+    summary = {'results': results}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return summary
+
+@app.route('/api/vehicles/bulk', methods=['POST'])
+@jwt_required()
+def bulk_upsert_vehicles():
+    try:
+        data = request.get_json() or {}
+        written, results = vehicle_bulk.upsert_vehicles(
+            db.session,
+            data.get('vehicles'),
+            on_error=data.get('on_error', 'rollback'),
+            batch_size=app.config['VEHICLE_BULK_BATCH_SIZE']
+        )
+        
+        if not written:
+            db.session.rollback()
             return jsonify({
                 'code': 400,
-                'message': '车牌号已存在'
+                'message': '数据校验失败，未写入任何车辆',
+                'data': bulk_summary(results)
             }), 400
         
-        vehicle = Vehicle(
-            plate_number=data['plate_number'],
-            vehicle_type=data['vehicle_type'],
-            fleet_id=data['fleet_id'],
-            driver_name=data.get('driver_name'),
-            driver_phone=data.get('driver_phone'),
-            status=data.get('status', 'normal'),
-            remark=data.get('remark')
+        db.session.commit()
+        vehicle_plates.add([
+            (result['id'], result['plate_number'], data['vehicles'][result['index']]['fleet_id'])
+            for result in results if result['status'] in ('created', 'updated')
+        ])
+        return jsonify({
+            'code': 200,
+            'message': '批量保存完成',
+            'data': bulk_summary(results)
+        })
+        
+    except vehicle_bulk.BulkRequestError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e)
+        }), 400
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 400,
+            'message': '车牌号已存在' if db_utils.is_unique_violation(e, 'plate_number') else '数据不符合约束'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.route('/api/vehicles/bulk', methods=['DELETE'])
+@jwt_required()
+def bulk_delete_vehicles():
+    try:
+        data = request.get_json() or {}
+        deleted, results = vehicle_bulk.delete_vehicles(
+            db.session,
+            data.get('ids'),
+            on_error=data.get('on_error', 'rollback'),
+            batch_size=app.config['VEHICLE_BULK_BATCH_SIZE']
         )
         
-        db.session.add(vehicle)
-        db.session.commit()
+        if not deleted:
+            db.session.rollback()
+            return jsonify({
+                'code': 400,
+                'message': '部分车辆不存在或ID无效，未删除任何车辆',
+                'data': bulk_summary(results)
+            }), 400
         
+        db.session.commit()
+        vehicle_plates.remove([(result['id'], result['plate_number']) for result in results if result['status'] == 'deleted'])
         return jsonify({
             'code': 200,
-            'message': '车辆创建成功',
-            'data': vehicle.to_dict()
+            'message': '批量删除完成',
+            'data': bulk_summary(results)
         })
         
+    except vehicle_bulk.BulkRequestError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e)
+        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -250,25 +559,975 @@ def create_vehicle():
         }), 500
 
 # 车队管理路由
+FLEET_LIST_FIELDS = ('id', 'name', 'description', 'contact_person', 'contact_phone', 'status', 'created_at')
+
 @app.route('/api/fleets', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_fleets():
     try:
-        fleets = Fleet.query.all()
+        rows = db.session.execute(db.select(*[getattr(Fleet, field) for field in FLEET_LIST_FIELDS])).all()
+        if wants_columnar():
+            data = to_columns(rows, FLEET_LIST_FIELDS, {'created_at': isoformat})
+        else:
+            data = [{**row._asdict(), 'created_at': isoformat(row.created_at)} for row in rows]
+        return jsonify({
+            'code': 200,
+            'data': data
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+# 订单列表：查询始终带 order_time 的日期范围，分区表只扫描涉及的月份
+def order_list_query():
+    return db.session.query(
+        Order.id,
+        Order.order_no,
+        Order.platform_id,
+        Order.vehicle_id,
+        Vehicle.plate_number,
+        Order.fleet_id,
+        Order.station_id,
+        Order.amount,
+        Order.settlement_amount,
+        Order.charge_kwh,
+        Order.order_time,
+        Order.status
+    ).outerjoin(Vehicle, Order.vehicle_id == Vehicle.id)
+
+ORDER_LIST_FIELDS = (
+    'id', 'order_no', 'platform_id', 'vehicle_id', 'plate_number', 'fleet_id', 'station_id',
+    'amount', 'settlement_amount', 'charge_kwh', 'order_time', 'status'
+)
+
+def order_items(rows):
+    if wants_columnar():
+        return to_columns(rows, ORDER_LIST_FIELDS, {
+            'amount': str,
+            'settlement_amount': lambda value: str(value) if value is not None else None,
+            'charge_kwh': lambda value: str(value) if value is not None else None,
+            'order_time': isoformat
+        })
+    return [order_row_to_dict(row) for row in rows]
+
+def order_row_to_dict(row):
+    data = row._asdict()
+    for field in ('amount', 'settlement_amount', 'charge_kwh'):
+        if data[field] is not None:
+            data[field] = str(data[field])
+    data['order_time'] = isoformat(row.order_time)
+    return data
+
+@app.route('/api/orders', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_orders():
+    try:
+        try:
+            today = datetime.now().date()
+            end_date = parse_date(request.args.get('end_date'), today)
+            start_date = parse_date(request.args.get('start_date'), end_date.replace(day=1))
+            filters = {
+                field: int(request.args[field])
+                for field in ('platform_id', 'fleet_id', 'vehicle_id', 'station_id')
+                if request.args.get(field)
+            }
+        except ValueError:
+            return jsonify({
+                'code': 400,
+                'message': '日期格式应为 YYYY-MM-DD，筛选ID应为整数'
+            }), 400
+        if start_date > end_date:
+            return jsonify({
+                'code': 400,
+                'message': '开始日期不能晚于结束日期'
+            }), 400
+        if (end_date - start_date).days >= app.config['ORDER_QUERY_MAX_DAYS']:
+            return jsonify({
+                'code': 400,
+                'message': f"查询范围不能超过 {app.config['ORDER_QUERY_MAX_DAYS']} 天"
+            }), 400
+        
+        start_time, end_time = partitions.order_time_bounds(start_date, end_date)
+        query = order_list_query().filter(Order.order_time >= start_time, Order.order_time < end_time)
+        for field, value in filters.items():
+            query = query.filter(getattr(Order, field) == value)
+        if request.args.get('status'):
+            query = query.filter(Order.status == request.args['status'])
+        
+        # 按 (order_time, id) 倒序的游标分页；游标时间同时收紧 order_time 上界，翻页越深扫描的分区越少
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        after = request.args.get('after')
+        if after:
+            try:
+                cursor_time, cursor_id = decode_cursor(after)
+            except ValueError as e:
+                return jsonify({
+                    'code': 400,
+                    'message': str(e)
+                }), 400
+            query = query.filter(
+                Order.order_time <= cursor_time,
+                db.or_(
+                    Order.order_time < cursor_time,
+                    db.and_(Order.order_time == cursor_time, Order.id < cursor_id)
+                )
+            )
+        
+        rows = query.order_by(Order.order_time.desc(), Order.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        return jsonify({
+            'code': 200,
+            'data': {
+                'items': order_items(rows),
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat(),
+                'limit': limit,
+                'has_more': has_more,
+                'next_cursor': encode_cursor(rows[-1].order_time, rows[-1].id) if has_more else None
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+# 订单导入路由
+def import_form_files():
+    # 上传的文件与平台ID：多个文件可共用一个平台ID，或按顺序逐个对应；校验失败时返回错误信息
+    files = [file for file in request.files.getlist('file') if file.filename]
+    platform_ids = request.form.getlist('platform_id', type=int)
+    if not files:
+        return None, None, '请上传导入文件'
+    if len(platform_ids) == 1:
+        platform_ids = platform_ids * len(files)
+    if len(platform_ids) != len(files) or not all(1 <= platform_id <= 11 for platform_id in platform_ids):
+        return None, None, '平台ID必须在1-11之间'
+    return files, platform_ids, None
+
+def save_import_files(files, platform_ids, workdir):
+    # 上传文件落盘，返回 [(本地路径, 原始文件名, 平台ID)]
+    saved = []
+    for index, (file, platform_id) in enumerate(zip(files, platform_ids)):
+        path = os.path.join(workdir, f'{index}{os.path.splitext(file.filename)[1].lower()}')
+        file.save(path)
+        saved.append((path, file.filename, platform_id))
+    return saved
+
+def wants_async(values):
+    # 以后台任务提交：表单参数 async=1，或 JSON 中 "async": true
+    value = values.get('async')
+    return value is True or str(value).lower() in ('1', 'true', 'yes')
+
+def job_accepted(job):
+    return jsonify({
+        'code': 202,
+        'message': '任务已提交',
+        'data': job.to_dict()
+    }), 202
+
+@app.route('/api/orders/import', methods=['POST'])
+@jwt_required()
+def import_orders():
+    try:
+        files, platform_ids, error = import_form_files()
+        encoding = request.form.get('encoding', 'utf-8-sig')
+        
+        if error:
+            return jsonify({
+                'code': 400,
+                'message': error
+            }), 400
+        
+        if wants_async(request.form):
+            # 后台导入：文件保存到任务目录后立即返回任务ID
+            job_id = jobs.new_job_id()
+            saved = save_import_files(files, platform_ids, job_runner.storage_dir(job_id, 'input'))
+            job = job_runner.submit(
+                'import_orders',
+                {'files': saved, 'encoding': encoding},
+                created_by=get_jwt_identity(),
+                job_id=job_id
+            )
+            return job_accepted(job)
+        
+        # 计价/优惠规则整个导入过程只载入一次
+        rulebook = settlement.RuleBook.load(db.session)
+        
+        if len(files) == 1:
+            summary = importer.import_order_file(
+                db.session,
+                files[0].stream,
+                files[0].filename,
+                platform_ids[0],
+                chunk_size=app.config['IMPORT_CHUNK_SIZE'],
+                encoding=encoding,
+                rulebook=rulebook
+            )
+        else:
+            # 多文件上传：先落盘，文件较大时由进程池并行解析
+            workdir = tempfile.mkdtemp(prefix='import_')
+            try:
+                saved = save_import_files(files, platform_ids, workdir)
+                summary = importer.import_order_files(
+                    db.session,
+                    saved,
+                    workers=app.config['IMPORT_WORKERS'],
+                    chunk_size=app.config['IMPORT_CHUNK_SIZE'],
+                    encoding=encoding,
+                    rulebook=rulebook
+                )
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+        
+        return jsonify({
+            'code': 200,
+            'message': '导入完成',
+            'data': summary
+        })
+        
+    except (importer.ImportFormatError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 400,
+            'message': f'文件格式错误: {str(e)}'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+# 导入前预检：按内容哈希统计文件中已导入过的行，不写入数据
+@app.route('/api/orders/import/precheck', methods=['POST'])
+@jwt_required()
+def precheck_import():
+    try:
+        files, platform_ids, error = import_form_files()
+        encoding = request.form.get('encoding', 'utf-8-sig')
+        
+        if error:
+            return jsonify({
+                'code': 400,
+                'message': error
+            }), 400
+        
+        results = []
+        for file, platform_id in zip(files, platform_ids):
+            summary = importer.precheck_order_file(
+                db.session,
+                file.stream,
+                file.filename,
+                platform_id,
+                chunk_size=app.config['IMPORT_CHUNK_SIZE'],
+                encoding=encoding
+            )
+            results.append({'filename': file.filename, 'platform_id': platform_id, **summary})
+        
+        return jsonify({
+            'code': 200,
+            'message': '预检完成',
+            'data': results[0] if len(results) == 1 else {
+                'files': results,
+                **{field: sum(result[field] for result in results) for field in ('total_rows', 'known', 'duplicates', 'new')}
+            }
+        })
+        
+    except (importer.ImportFormatError, UnicodeDecodeError) as e:
+        return jsonify({
+            'code': 400,
+            'message': f'文件格式错误: {str(e)}'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+# 重新结算每批的结算金额变化计入车队当月消费和仪表盘日收入
+def apply_settlement_deltas(deltas):
+    monthly = {}
+    for (day, platform_id, station_id, fleet_id), delta in deltas.items():
+        key = (fleet_id, day.year, day.month)
+        monthly[key] = monthly.get(key, 0) + balance.to_money(delta)
+    balance.apply_changes(db.session, {key: (delta, 0) for key, delta in monthly.items()})
+    dashboard.apply_order_changes(db.session, {
+        key: (0, 0, delta, 0) for key, delta in deltas.items()
+    })
+
+def resettle_month(year, month, fleet_id=None, progress=None):
+    start_time, end_time = settlement.month_range(year, month)
+    rulebook = settlement.RuleBook.load(db.session, [fleet_id] if fleet_id is not None else None)
+    summary = settlement.resettle_orders(
+        db.session,
+        rulebook,
+        start_time,
+        end_time,
+        fleet_id=fleet_id,
+        on_batch=apply_settlement_deltas,
+        progress=progress
+    )
+    return {
+        'scanned': summary['scanned'],
+        'updated': summary['updated']
+    }
+
+# 结算路由
+@app.route('/api/settlement/resettle', methods=['POST'])
+@jwt_required()
+def resettle_orders():
+    try:
+        data = request.get_json() or {}
+        year = data.get('year')
+        month = data.get('month')
+        fleet_id = data.get('fleet_id')
+        
+        if not isinstance(year, int) or not isinstance(month, int) or not 1 <= month <= 12:
+            return jsonify({
+                'code': 400,
+                'message': '请提供有效的年份和月份'
+            }), 400
+        
+        if wants_async(data):
+            job = job_runner.submit(
+                'resettle',
+                {'year': year, 'month': month, 'fleet_id': fleet_id},
+                created_by=get_jwt_identity()
+            )
+            return job_accepted(job)
+        
+        return jsonify({
+            'code': 200,
+            'message': '重新结算完成',
+            'data': resettle_month(year, month, fleet_id)
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+# 数据导出路由
+@app.route('/api/export/data', methods=['POST'])
+@jwt_required()
+@read_replica
+def export_data():
+    try:
+        data = request.get_json() or {}
+        export_format = data.get('format', 'excel')
+        
+        if export_format not in exporter.EXPORT_FORMATS:
+            return jsonify({
+                'code': 400,
+                'message': '导出格式仅支持 csv 或 excel'
+            }), 400
+        
+        plan = exporter.plan_export(data.get('table_name'), data.get('columns'), data.get('conditions'))
+        
+        if wants_async(data):
+            # 后台导出：结果文件写入任务目录，完成后经 /api/jobs/<id>/download 下载
+            job = job_runner.submit(
+                'export',
+                {
+                    'table_name': data.get('table_name'),
+                    'columns': data.get('columns'),
+                    'conditions': data.get('conditions'),
+                    'export_format': export_format
+                },
+                created_by=get_jwt_identity()
+            )
+            return job_accepted(job)
+        
+    except exporter.ExportError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e)
+        }), 400
+    
+    # 响应体由生成器逐批产出，请求上下文（含数据库会话）保持到输出结束
+    mimetype, extension = exporter.EXPORT_FORMATS[export_format]
+    filename = f"{plan.table_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{extension}"
+    return Response(
+        stream_with_context(
+            exporter.stream_export(db.session, plan, export_format, batch_size=app.config['EXPORT_BATCH_SIZE'])
+        ),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def parse_year_month(values):
+    # 从请求参数中取出 year / month，无效时返回 None
+    try:
+        year = int(values.get('year'))
+        month = int(values.get('month'))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= month <= 12:
+        return None
+    return year, month
+
+# 充值与余额路由
+@app.route('/api/recharge', methods=['POST'])
+@jwt_required()
+def create_recharge():
+    try:
+        data = request.get_json() or {}
+        
+        if not data.get('fleet_id') or data.get('amount') is None:
+            return jsonify({
+                'code': 400,
+                'message': '车队ID和充值金额不能为空'
+            }), 400
+        
+        if not Fleet.query.get(data['fleet_id']):
+            return jsonify({
+                'code': 404,
+                'message': '车队不存在'
+            }), 404
+        
+        try:
+            amount = balance.to_money(data['amount'])
+            recharge_time = datetime.fromisoformat(data['recharge_time']) if data.get('recharge_time') else datetime.utcnow()
+        except (ArithmeticError, ValueError):
+            return jsonify({
+                'code': 400,
+                'message': '充值金额或充值时间格式错误'
+            }), 400
+        
+        record = RechargeRecord(
+            fleet_id=data['fleet_id'],
+            amount=amount,
+            recharge_time=recharge_time,
+            payment_method=data.get('payment_method'),
+            status=data.get('status', 'completed'),
+            remark=data.get('remark')
+        )
+        db.session.add(record)
+        db.session.flush()
+        balance.apply_recharge(db.session, record)
+        dashboard.apply_recharge(db.session, record)
+        db.session.commit()
+        
+        return jsonify({
+            'code': 200,
+            'message': '充值成功',
+            'data': record.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.route('/api/reconciliation/balance', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_fleet_balances():
+    try:
+        period = parse_year_month(request.args)
+        if period is None:
+            return jsonify({
+                'code': 400,
+                'message': '请提供有效的年份和月份'
+            }), 400
+        
+        return jsonify({
+            'code': 200,
+            'message': '获取成功',
+            'data': balance.get_month_balances(db.session, *period)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.route('/api/reconciliation/monthly-settlement', methods=['POST'])
+@jwt_required()
+def monthly_settlement():
+    try:
+        data = request.get_json() or {}
+        period = parse_year_month(data)
+        if period is None:
+            return jsonify({
+                'code': 400,
+                'message': '请提供有效的年份和月份'
+            }), 400
+        
+        if wants_async(data):
+            job = job_runner.submit(
+                'monthly_settlement',
+                {'year': period[0], 'month': period[1]},
+                created_by=get_jwt_identity()
+            )
+            return job_accepted(job)
+        
+        fleets = balance.close_month(db.session, *period)
+        
+        return jsonify({
+            'code': 200,
+            'message': '月结完成',
+            'data': {
+                'year': period[0],
+                'month': period[1],
+                'fleets': fleets
+            }
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.route('/api/reconciliation/verify', methods=['GET'])
+@jwt_required()
+@read_replica
+def verify_balances():
+    try:
+        period = parse_year_month(request.args)
+        if period is None:
+            return jsonify({
+                'code': 400,
+                'message': '请提供有效的年份和月份'
+            }), 400
+        
+        return jsonify({
+            'code': 200,
+            'message': '校验完成',
+            'data': balance.verify_month(db.session, *period)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.cli.command('verify-balances')
+@click.argument('year', type=int)
+@click.argument('month', type=int)
+def verify_balances_command(year, month):
+    # 全量重算指定月份并与 fleet_balance 比对：flask --app app verify-balances 2025 8
+    result = balance.verify_month(db.session, year, month)
+    for mismatch in result['mismatches']:
+        click.echo(f"车队 {mismatch['fleet_id']} {mismatch['field']}: 期望 {mismatch['expected']}, 实际 {mismatch['actual']}")
+    click.echo(f"共校验 {result['checked']} 个车队, 不一致 {len(result['mismatches'])} 项")
+    if result['mismatches']:
+        raise SystemExit(1)
+
+# 平台对账单核对：上传对账单（参数同订单导入）与对账月份，返回差异报告
+@app.route('/api/reconciliation/match', methods=['POST'])
+@jwt_required()
+@read_replica
+def match_statements():
+    try:
+        files, platform_ids, error = import_form_files()
+        encoding = request.form.get('encoding', 'utf-8-sig')
+        period = parse_year_month(request.form)
+        window_minutes = request.form.get('window_minutes', 5, type=int)
+        
+        if error:
+            return jsonify({
+                'code': 400,
+                'message': error
+            }), 400
+        if period is None:
+            return jsonify({
+                'code': 400,
+                'message': '请提供有效的年份和月份'
+            }), 400
+        
+        if wants_async(request.form):
+            # 后台核对：完整差异明细写入 CSV，经 /api/jobs/<id>/download 下载
+            job_id = jobs.new_job_id()
+            saved = save_import_files(files, platform_ids, job_runner.storage_dir(job_id, 'input'))
+            job = job_runner.submit(
+                'reconcile',
+                {
+                    'files': saved,
+                    'encoding': encoding,
+                    'year': period[0],
+                    'month': period[1],
+                    'window_minutes': window_minutes
+                },
+                created_by=get_jwt_identity(),
+                job_id=job_id
+            )
+            return job_accepted(job)
+        
+        reconciler = reconciliation.Reconciler(
+            db.session,
+            *settlement.month_range(*period),
+            window=timedelta(minutes=window_minutes)
+        )
+        for file, platform_id in zip(files, platform_ids):
+            reconciler.add_statement(file.stream, file.filename, platform_id, encoding)
+        
+        return jsonify({
+            'code': 200,
+            'message': '核对完成',
+            'data': reconciler.finish()
+        })
+        
+    except (importer.ImportFormatError, UnicodeDecodeError) as e:
+        return jsonify({
+            'code': 400,
+            'message': f'文件格式错误: {str(e)}'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+def parse_date(value, default):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else default
+
+# 仪表盘统计：只读日汇总表，按日期范围与维度聚合
+@app.route('/api/dashboard/stats', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_dashboard_stats():
+    try:
+        try:
+            today = datetime.now().date()
+            end_date = parse_date(request.args.get('end_date'), today)
+            start_date = parse_date(request.args.get('start_date'), end_date)
+            filters = {
+                field: int(request.args[field])
+                for field in ('platform_id', 'station_id', 'fleet_id')
+                if request.args.get(field)
+            }
+        except ValueError:
+            return jsonify({
+                'code': 400,
+                'message': '日期格式应为 YYYY-MM-DD，筛选ID应为整数'
+            }), 400
+        group_by = [field for field in request.args.get('group_by', '').split(',') if field]
+        
         return jsonify({
             'code': 200,
-            'data': [fleet.to_dict() for fleet in fleets]
+            'message': '获取成功',
+            'data': dashboard.get_stats(db.session, start_date, end_date, group_by, filters)
         })
         
+    except dashboard.StatsError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'code': 500,
             'message': f'服务器错误: {str(e)}'
         }), 500
 
+@app.cli.command('rebuild-dashboard-stats')
+@click.argument('start_date', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.argument('end_date', type=click.DateTime(formats=['%Y-%m-%d']))
+def rebuild_dashboard_stats_command(start_date, end_date):
+    # 从订单和充值记录重算日汇总（含首尾两天）：flask --app app rebuild-dashboard-stats 2025-01-01 2025-03-31
+    summary = dashboard.rebuild(db.session, start_date.date(), end_date.date())
+    click.echo(f"订单汇总 {summary['order_rows']} 行, 充值汇总 {summary['recharge_rows']} 行")
+
+@app.cli.command('backfill-raw-data')
+def backfill_raw_data_command():
+    # 为历史原始记录补齐内容哈希、压缩大记录并删除重复：flask --app app backfill-raw-data
+    summary = importer.backfill_raw_data(db.session)
+    click.echo(f"补齐哈希 {summary['hashed']} 条, 压缩 {summary['compressed']} 条, 删除重复 {summary['removed']} 条")
+
+# 后台任务处理函数：在工作线程 / Celery worker 的应用上下文中执行，参数来自提交时写入的 jobs.params
+@job_handler('import_orders', max_attempts=3)
+def run_import_job(context, files, encoding):
+    # 原始记录按内容哈希去重，重试时已写入的行计为跳过
+    rulebook = settlement.RuleBook.load(db.session)
+    reported = {}
+    
+    def progress(file_summary):
+        reported[id(file_summary)] = file_summary
+        context.progress(
+            files=len(files),
+            files_done=sum(1 for item in reported.values() if item['status'] in ('done', 'error', 'cancelled')),
+            **{field: sum(item[field] for item in reported.values()) for field in ('total_rows', 'imported', 'skipped', 'failed')}
+        )
+    
+    summary = importer.import_order_files(
+        db.session,
+        [tuple(file) for file in files],
+        workers=app.config['IMPORT_WORKERS'],
+        chunk_size=app.config['IMPORT_CHUNK_SIZE'],
+        encoding=encoding,
+        progress=progress,
+        cancel_event=context.cancel_event,
+        rulebook=rulebook
+    )
+    if summary['cancelled']:
+        raise JobCancelled(summary)
+    return summary
+
+@job_handler('resettle', max_attempts=3)
+def run_resettle_job(context, year, month, fleet_id=None):
+    # 只回写结算金额有变化的订单，重试时已处理的批次不再产生变化；取消时已提交的批次保留
+    def progress(summary):
+        context.progress(**summary)
+        context.check_cancelled()
+    
+    return resettle_month(year, month, fleet_id, progress=progress)
+
+@job_handler('monthly_settlement', max_attempts=3)
+def run_monthly_settlement_job(context, year, month):
+    return {
+        'year': year,
+        'month': month,
+        'fleets': balance.close_month(db.session, year, month)
+    }
+
+@job_handler('export')
+def run_export_job(context, table_name, columns, conditions, export_format):
+    plan = exporter.plan_export(table_name, columns, conditions)
+    mimetype, extension = exporter.EXPORT_FORMATS[export_format]
+    filename = f"{plan.table_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{extension}"
+    path = os.path.join(context.storage_dir('output'), filename)
+    size = 0
+    # 与同步导出一致从只读副本读取；结束后恢复，任务状态写回主库
+    g.use_replica = True
+    try:
+        with open(path, 'wb') as output:
+            for chunk in exporter.stream_export(db.session, plan, export_format, batch_size=app.config['EXPORT_BATCH_SIZE']):
+                output.write(chunk)
+                size += len(chunk)
+                context.progress(bytes_written=size)
+                context.check_cancelled()
+    finally:
+        g.use_replica = False
+        db.session.rollback()
+    return {
+        'filename': filename,
+        'mimetype': mimetype,
+        'size': size
+    }
+
+@job_handler('reconcile', max_attempts=3)
+def run_reconcile_job(context, files, encoding, year, month, window_minutes):
+    # 只读核对，可安全重跑
+    filename = f"reconciliation_{year}{month:02d}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+    path = os.path.join(context.storage_dir('output'), filename)
+    
+    def progress(summary):
+        context.progress(**summary)
+        context.check_cancelled()
+    
+    g.use_replica = True
+    try:
+        with open(path, 'w', newline='', encoding='utf-8-sig') as report_file:
+            reconciler = reconciliation.Reconciler(
+                db.session,
+                *settlement.month_range(year, month),
+                window=timedelta(minutes=window_minutes),
+                report_file=report_file
+            )
+            for file_path, name, platform_id in files:
+                with open(file_path, 'rb') as stream:
+                    reconciler.add_statement(stream, name, platform_id, encoding, progress=progress)
+            result = reconciler.finish()
+    finally:
+        g.use_replica = False
+        db.session.rollback()
+    return {
+        **result,
+        'filename': filename,
+        'mimetype': 'text/csv; charset=utf-8',
+        'size': os.path.getsize(path)
+    }
+
+# 任务查询路由：任务只对提交人和管理员可见
+def find_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return None
+    current_user_id = get_jwt_identity()
+    if job.created_by != current_user_id:
+        user = db.session.get(User, current_user_id)
+        if user is None or user.role != 'admin':
+            return None
+    return job
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    try:
+        job = find_job(job_id)
+        if job is None:
+            return jsonify({
+                'code': 404,
+                'message': '任务不存在'
+            }), 404
+        
+        return jsonify({
+            'code': 200,
+            'message': '获取成功',
+            'data': job.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_job(job_id):
+    try:
+        job = find_job(job_id)
+        if job is None:
+            return jsonify({
+                'code': 404,
+                'message': '任务不存在'
+            }), 404
+        if job.status in jobs.FINISHED_STATUSES:
+            return jsonify({
+                'code': 400,
+                'message': '任务已结束'
+            }), 400
+        
+        job_runner.cancel(job.id)
+        db.session.refresh(job)
+        
+        return jsonify({
+            'code': 200,
+            'message': '已取消' if job.status == 'cancelled' else '已请求取消',
+            'data': job.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.route('/api/jobs/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_job_result(job_id):
+    try:
+        job = find_job(job_id)
+        if job is None:
+            return jsonify({
+                'code': 404,
+                'message': '任务不存在'
+            }), 404
+        if job.status != 'succeeded' or not (job.result or {}).get('filename'):
+            return jsonify({
+                'code': 400,
+                'message': '任务没有可下载的结果'
+            }), 400
+        
+        path = os.path.join(app.config['JOB_STORAGE_DIR'], job.id, 'output', job.result['filename'])
+        if not os.path.exists(path):
+            return jsonify({
+                'code': 410,
+                'message': '导出文件已过期'
+            }), 410
+        
+        return send_file(path, mimetype=job.result['mimetype'], as_attachment=True, download_name=job.result['filename'])
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.cli.command('ensure-partitions')
+@click.option('--months-ahead', type=int, default=3, help='预建的后续月份数')
+def ensure_partitions_command(months_ahead):
+    # 预建订单与原始数据的月分区（PostgreSQL，未安装 pg_cron 时每天执行）：flask --app app ensure-partitions
+    created = partitions.ensure_partitions(db.session, months_ahead)
+    if not created:
+        click.echo('当前数据库未使用分区表')
+    for table, count in created.items():
+        click.echo(f'{table}: 新建分区 {count} 个')
+
+@app.cli.command('detach-partitions')
+@click.argument('before', type=click.DateTime(formats=['%Y-%m']))
+@click.option('--drop', is_flag=True, help='分离后直接删除，不保留归档表')
+def detach_partitions_command(before, drop):
+    # 分离 BEFORE（YYYY-MM）之前月份的分区：flask --app app detach-partitions 2023-01
+    detached = partitions.detach_partitions(db.session, before.date(), drop=drop)
+    if not detached:
+        click.echo('当前数据库未使用分区表')
+    for table, names in detached.items():
+        click.echo(f"{table}: {'删除' if drop else '分离'} {len(names)} 个分区 {' '.join(names)}")
+
+@app.cli.command('run-jobs')
+@click.option('--workers', type=int, default=2, help='工作线程数')
+def run_jobs_command(workers):
+    # 独立的任务进程（JOB_BACKEND=thread）：flask --app app run-jobs --workers 4，可配合 JOB_WORKERS=0
+    for thread in job_runner.start(workers):
+        thread.join()
+
+# Prometheus 指标，需携带 Authorization: Bearer <METRICS_TOKEN>；未设置 METRICS_TOKEN 时接口关闭
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    denied = check_metrics_token(request.headers.get('Authorization'))
+    if denied:
+        return jsonify({
+            'code': denied[0],
+            'message': denied[1]
+        }), denied[0]
+    return Response(request_metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+# create_all 不为已存在的表加列：早期创建的库补上 orders.fleet_id，并按车辆当前所属车队回填
+# （PostgreSQL 见 migrations/007_orders_fleet_id.sql）
+def add_order_fleet_column():
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('orders')}
+    if 'fleet_id' in columns:
+        return
+    with db.engine.begin() as connection:
+        connection.execute(db.text('ALTER TABLE orders ADD COLUMN fleet_id INTEGER REFERENCES fleets(id)'))
+        connection.execute(db.text(
+            'UPDATE orders SET fleet_id = (SELECT vehicles.fleet_id FROM vehicles WHERE vehicles.id = orders.vehicle_id)'
+        ))
+
+# 早期创建的库补上 vehicles.plate_key（规范化车牌，车牌联想的数据库查询使用），按现有车牌回填
+def add_vehicle_plate_key_column():
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('vehicles')}
+    if 'plate_key' in columns:
+        return
+    with db.engine.begin() as connection:
+        connection.execute(db.text('ALTER TABLE vehicles ADD COLUMN plate_key VARCHAR(20)'))
+        rows = connection.execute(db.text('SELECT id, plate_number FROM vehicles')).all()
+        for batch in iter_chunks(rows, app.config['VEHICLE_BULK_BATCH_SIZE']):
+            connection.execute(
+                db.text('UPDATE vehicles SET plate_key = :plate_key WHERE id = :id'),
+                [{'id': row.id, 'plate_key': normalize_plate(row.plate_number)} for row in batch]
+            )
+
 # 初始化数据库
 def create_tables():
     db.create_all()
+    # create_all 不为已存在的表建索引，补建后续新增的订单、车辆索引
+    add_order_fleet_column()
+    add_vehicle_plate_key_column()
+    for index in [*Order.__table__.indexes, *Vehicle.__table__.indexes]:
+        index.create(db.engine, checkfirst=True)
+    create_vehicle_search_index()
     
     # 创建默认管理员用户
     admin = User.query.filter_by(username='admin').first()
@@ -0,0 +1,272 @@
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, literal, or_, select, update
+
+from db_utils import upsert
+from models import Fleet, FleetBalance, FleetBalanceHistory, Order, RechargeRecord
+from settlement import month_range
+
+# 车队余额：fleet_balance 按 (车队, 年, 月) 作为累计值增量维护，余额页面只做主键查找
+#
+#   current_balance = previous_balance + monthly_recharge - monthly_consumption
+#   previous_balance = 上一个有记录月份的 current_balance
+#
+# 订单导入、重新结算和充值只提交变化量；变化落在较早月份时，同车队之后各月的余额一并顺延
+
+BALANCE_FIELDS = ('previous_balance', 'monthly_consumption', 'monthly_recharge', 'current_balance')
+
+ZERO = Decimal('0.00')
+
+
+def to_money(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def consumption_changes(rows):
+    # rows: [{'fleet_id', 'order_time', 'settlement_amount', 'amount'}]，结算金额为空时按订单金额计
+    changes = {}
+    for row in rows:
+        if row.get('fleet_id') is None:
+            continue
+        key = (row['fleet_id'], row['order_time'].year, row['order_time'].month)
+        amount = row.get('settlement_amount')
+        if amount is None:
+            amount = row['amount']
+        consumption, recharge = changes.get(key, (ZERO, ZERO))
+        changes[key] = (consumption + to_money(amount), recharge)
+    return changes
+
+
+def carried_balances(session, keys):
+    # 每个 (车队, 年, 月) 之前最近一个月的 current_balance，作为新建月份的 previous_balance
+    carried = {}
+    for fleet_id, year, month in keys:
+        carried[(fleet_id, year, month)] = session.execute(
+            select(FleetBalance.current_balance).where(
+                FleetBalance.fleet_id == fleet_id,
+                or_(FleetBalance.year < year, and_(FleetBalance.year == year, FleetBalance.month < month))
+            ).order_by(FleetBalance.year.desc(), FleetBalance.month.desc()).limit(1)
+        ).scalar() or ZERO
+    return carried
+
+
+def apply_changes(session, changes):
+    # changes: {(车队ID, 年, 月): (消费变化, 充值变化)}；与业务写入处于同一事务，由调用方提交
+    changes = {
+        key: (to_money(consumption), to_money(recharge))
+        for key, (consumption, recharge) in changes.items()
+        if key[0] is not None and (consumption or recharge)
+    }
+    if not changes:
+        return
+
+    table = FleetBalance.__table__
+    carried = carried_balances(session, changes.keys())
+    now = datetime.utcnow()
+
+    upsert(
+        session,
+        table,
+        [
+            {
+                'fleet_id': fleet_id,
+                'year': year,
+                'month': month,
+                'previous_balance': carried[(fleet_id, year, month)],
+                'monthly_consumption': consumption,
+                'monthly_recharge': recharge,
+                'current_balance': carried[(fleet_id, year, month)] + recharge - consumption,
+                'updated_at': now
+            }
+            for (fleet_id, year, month), (consumption, recharge) in changes.items()
+        ],
+        key_columns=('fleet_id', 'year', 'month'),
+        increment_columns=('monthly_consumption', 'monthly_recharge'),
+        update_columns=('updated_at',),
+        # 已有记录时期末余额只累加净变化，期初余额保持不变
+        extra_set=lambda new: {
+            'current_balance': table.c.current_balance + new.monthly_recharge - new.monthly_consumption
+        }
+    )
+
+    # 之后各月的期初、期末余额顺延同样的净变化
+    session.execute(
+        update(table).where(
+            table.c.fleet_id == bindparam('b_fleet_id'),
+            or_(
+                table.c.year > bindparam('b_year'),
+                and_(table.c.year == bindparam('b_year'), table.c.month > bindparam('b_month'))
+            )
+        ).values(
+            previous_balance=table.c.previous_balance + bindparam('b_delta'),
+            current_balance=table.c.current_balance + bindparam('b_delta'),
+            updated_at=now
+        ),
+        [
+            {'b_fleet_id': fleet_id, 'b_year': year, 'b_month': month, 'b_delta': recharge - consumption}
+            for (fleet_id, year, month), (consumption, recharge) in changes.items()
+        ]
+    )
+
+
+def apply_recharge(session, record):
+    if record.status != 'completed':
+        return
+    key = (record.fleet_id, record.recharge_time.year, record.recharge_time.month)
+    apply_changes(session, {key: (ZERO, record.amount)})
+
+
+def get_month_balances(session, year, month):
+    rows = session.execute(
+        select(FleetBalance.fleet_id, Fleet.name.label('fleet_name'), *[getattr(FleetBalance, field) for field in BALANCE_FIELDS])
+        .join(Fleet, Fleet.id == FleetBalance.fleet_id)
+        .where(FleetBalance.year == year, FleetBalance.month == month)
+        .order_by(FleetBalance.fleet_id)
+    ).all()
+    balances = []
+    for row in rows:
+        data = {'fleet_id': row.fleet_id, 'fleet_name': row.fleet_name, 'year': year, 'month': month}
+        for field in BALANCE_FIELDS:
+            data[field] = str(to_money(getattr(row, field)))
+        balances.append(data)
+    return balances
+
+
+def close_month(session, year, month):
+    # 月结：补齐无发生额车队的当月记录 -> 写入历史快照（重复执行覆盖旧快照）-> 预建下月记录，
+    # 每一步都是针对车队集合的单条语句，耗时只与车队数相关
+    table = FleetBalance.__table__
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    now = datetime.utcnow()
+
+    latest = select(
+        FleetBalance.fleet_id,
+        func.max(FleetBalance.year * 100 + FleetBalance.month).label('period')
+    ).where(
+        FleetBalance.year * 100 + FleetBalance.month <= year * 100 + month
+    ).group_by(FleetBalance.fleet_id).subquery()
+    carry_rows = session.execute(
+        select(FleetBalance.fleet_id, FleetBalance.year, FleetBalance.month, FleetBalance.current_balance)
+        .join(latest, and_(
+            latest.c.fleet_id == FleetBalance.fleet_id,
+            latest.c.period == FleetBalance.year * 100 + FleetBalance.month
+        ))
+    ).all()
+    upsert(
+        session,
+        table,
+        [
+            {
+                'fleet_id': row.fleet_id,
+                'year': year,
+                'month': month,
+                'previous_balance': row.current_balance,
+                'monthly_consumption': ZERO,
+                'monthly_recharge': ZERO,
+                'current_balance': row.current_balance,
+                'updated_at': now
+            }
+            for row in carry_rows
+            if (row.year, row.month) != (year, month)
+        ],
+        key_columns=('fleet_id', 'year', 'month')
+    )
+
+    history = FleetBalanceHistory.__table__
+    session.execute(delete(history).where(history.c.year == year, history.c.month == month))
+    session.execute(
+        insert(history).from_select(
+            ['fleet_id', *BALANCE_FIELDS, 'year', 'month', 'settled_at'],
+            select(
+                table.c.fleet_id,
+                *[table.c[field] for field in BALANCE_FIELDS],
+                table.c.year,
+                table.c.month,
+                literal(now)
+            ).where(table.c.year == year, table.c.month == month)
+        )
+    )
+
+    closed = session.execute(
+        select(table.c.fleet_id, table.c.current_balance).where(table.c.year == year, table.c.month == month)
+    ).all()
+    upsert(
+        session,
+        table,
+        [
+            {
+                'fleet_id': row.fleet_id,
+                'year': next_year,
+                'month': next_month,
+                'previous_balance': row.current_balance,
+                'monthly_consumption': ZERO,
+                'monthly_recharge': ZERO,
+                'current_balance': row.current_balance,
+                'updated_at': now
+            }
+            for row in closed
+        ],
+        key_columns=('fleet_id', 'year', 'month')
+    )
+    session.commit()
+    return len(closed)
+
+
+def verify_month(session, year, month):
+    # 全量重算当月消费与充值，与累计值逐车队比对，并检查余额链是否连续
+    start_time, end_time = month_range(year, month)
+
+    # 与导入时的增量一致，按订单记录的车队归属，不受之后车辆改派或删除影响
+    consumption = dict(session.execute(
+        select(
+            Order.fleet_id,
+            func.sum(case((Order.settlement_amount.is_(None), Order.amount), else_=Order.settlement_amount))
+        ).where(
+            Order.fleet_id.is_not(None),
+            Order.order_time >= start_time,
+            Order.order_time < end_time
+        ).group_by(Order.fleet_id)
+    ).all())
+    recharge = dict(session.execute(
+        select(RechargeRecord.fleet_id, func.sum(RechargeRecord.amount)).where(
+            RechargeRecord.status == 'completed',
+            RechargeRecord.recharge_time >= start_time,
+            RechargeRecord.recharge_time < end_time
+        ).group_by(RechargeRecord.fleet_id)
+    ).all())
+
+    stored = {
+        row.fleet_id: row
+        for row in session.execute(
+            select(FleetBalance).where(FleetBalance.year == year, FleetBalance.month == month)
+        ).scalars()
+    }
+    previous = carried_balances(session, [(fleet_id, year, month) for fleet_id in stored])
+
+    mismatches = []
+    for fleet_id in sorted(set(consumption) | set(recharge) | set(stored), key=str):
+        row = stored.get(fleet_id)
+        expected = {
+            'monthly_consumption': to_money(consumption.get(fleet_id)),
+            'monthly_recharge': to_money(recharge.get(fleet_id))
+        }
+        if row is None:
+            if expected['monthly_consumption'] or expected['monthly_recharge']:
+                mismatches.append({'fleet_id': fleet_id, 'field': 'missing', 'expected': None, 'actual': None})
+            continue
+        expected['previous_balance'] = to_money(previous[(fleet_id, year, month)])
+        expected['current_balance'] = (
+            to_money(row.previous_balance) + expected['monthly_recharge'] - expected['monthly_consumption']
+        )
+        for field, value in expected.items():
+            actual = to_money(getattr(row, field))
+            if actual != value:
+                mismatches.append({'fleet_id': fleet_id, 'field': field, 'expected': str(value), 'actual': str(actual)})
+
+    return {
+        'year': year,
+        'month': month,
+        'checked': len(set(consumption) | set(recharge) | set(stored)),
+        'mismatches': mismatches
+    }
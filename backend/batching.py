@@ -0,0 +1,12 @@
+# 分批工具：不依赖 pandas / numpy，车辆批量写入等轻量路径可直接使用
+
+
+def iter_chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,292 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import case, delete, extract, func, insert, select
+
+from balance import ZERO, to_money
+from db_utils import upsert
+from models import Fleet, Order, OrderDailyStat, RechargeDailyStat, RechargeRecord, Station, Vehicle
+
+# 仪表盘汇总：order_daily_stats 按 (日期, 平台, 站点, 车队)、recharge_daily_stats 按 (日期, 车队) 累计，
+# 订单导入、重新结算和充值在同一事务内提交变化量；统计接口只读汇总表，耗时与订单总量无关。
+# 收入口径与车队余额一致：结算金额为空时按订单金额计
+
+ORDER_MEASURES = ('order_count', 'total_amount', 'revenue', 'charge_kwh')
+
+RECHARGE_MEASURES = ('recharge_count', 'recharge_amount')
+
+# 可用的分组维度；day 与 month 二选一，充值只按 day / month / fleet 分组
+GROUP_FIELDS = ('day', 'month', 'platform', 'station', 'fleet')
+
+ZERO_KWH = Decimal('0.000')
+
+
+class StatsError(Exception):
+    pass
+
+
+def to_kwh(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.001'))
+
+
+def to_date(value):
+    # SQLite 的 date() 返回字符串，PostgreSQL / MySQL 返回 date
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def order_changes(rows):
+    # rows: [{'order_time', 'platform_id', 'station_id', 'fleet_id', 'amount', 'settlement_amount', 'charge_kwh'}]
+    changes = {}
+    for row in rows:
+        key = (row['order_time'].date(), row['platform_id'], row.get('station_id') or 0, row.get('fleet_id') or 0)
+        revenue = row.get('settlement_amount')
+        if revenue is None:
+            revenue = row['amount']
+        count, amount, total_revenue, kwh = changes.get(key, (0, ZERO, ZERO, ZERO_KWH))
+        changes[key] = (
+            count + 1,
+            amount + to_money(row['amount']),
+            total_revenue + to_money(revenue),
+            kwh + to_kwh(row.get('charge_kwh'))
+        )
+    return changes
+
+
+def apply_order_changes(session, changes):
+    # changes: {(日期, 平台ID, 站点ID, 车队ID): (订单数变化, 订单金额变化, 收入变化, 电量变化)}；由调用方提交
+    now = datetime.utcnow()
+    upsert(
+        session,
+        OrderDailyStat.__table__,
+        [
+            {
+                'stat_date': stat_date,
+                'platform_id': platform_id,
+                'station_id': station_id or 0,
+                'fleet_id': fleet_id or 0,
+                'order_count': count,
+                'total_amount': to_money(amount),
+                'revenue': to_money(revenue),
+                'charge_kwh': to_kwh(kwh),
+                'updated_at': now
+            }
+            for (stat_date, platform_id, station_id, fleet_id), (count, amount, revenue, kwh) in changes.items()
+            if count or amount or revenue or kwh
+        ],
+        key_columns=('stat_date', 'platform_id', 'station_id', 'fleet_id'),
+        increment_columns=ORDER_MEASURES,
+        update_columns=('updated_at',)
+    )
+
+
+def apply_recharge(session, record):
+    if record.status != 'completed':
+        return
+    upsert(
+        session,
+        RechargeDailyStat.__table__,
+        [{
+            'stat_date': record.recharge_time.date(),
+            'fleet_id': record.fleet_id,
+            'recharge_count': 1,
+            'recharge_amount': to_money(record.amount),
+            'updated_at': datetime.utcnow()
+        }],
+        key_columns=('stat_date', 'fleet_id'),
+        increment_columns=RECHARGE_MEASURES,
+        update_columns=('updated_at',)
+    )
+
+
+def month_chunks(start_date, end_date):
+    # [start_date, end_date] 按自然月切分为左闭右开的日期区间
+    current = start_date
+    while current <= end_date:
+        next_month = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+        stop = min(next_month, end_date + timedelta(days=1))
+        yield current, stop
+        current = stop
+
+
+def rebuild(session, start_date, end_date):
+    # 从 orders / recharge_records 全量重算 [start_date, end_date] 的汇总，每个自然月一个事务；
+    # 重算期间同一日期范围内的导入会被覆盖，应在导入空闲时执行
+    summary = {'order_rows': 0, 'recharge_rows': 0}
+    for chunk_start, chunk_stop in month_chunks(start_date, end_date):
+        start_time = datetime.combine(chunk_start, time.min)
+        end_time = datetime.combine(chunk_stop, time.min)
+
+        stat_date = func.date(Order.order_time)
+        station_id = func.coalesce(Order.station_id, 0)
+        fleet_id = func.coalesce(Order.fleet_id, 0)
+        order_rows = session.execute(
+            select(
+                stat_date,
+                Order.platform_id,
+                station_id,
+                fleet_id,
+                func.count(),
+                func.sum(Order.amount),
+                func.sum(case((Order.settlement_amount.is_(None), Order.amount), else_=Order.settlement_amount)),
+                func.sum(Order.charge_kwh)
+            ).where(
+                Order.order_time >= start_time,
+                Order.order_time < end_time
+            ).group_by(stat_date, Order.platform_id, station_id, fleet_id)
+        ).all()
+
+        recharge_date = func.date(RechargeRecord.recharge_time)
+        recharge_rows = session.execute(
+            select(
+                recharge_date,
+                RechargeRecord.fleet_id,
+                func.count(),
+                func.sum(RechargeRecord.amount)
+            ).where(
+                RechargeRecord.status == 'completed',
+                RechargeRecord.recharge_time >= start_time,
+                RechargeRecord.recharge_time < end_time
+            ).group_by(recharge_date, RechargeRecord.fleet_id)
+        ).all()
+
+        now = datetime.utcnow()
+        session.execute(delete(OrderDailyStat).where(
+            OrderDailyStat.stat_date >= chunk_start, OrderDailyStat.stat_date < chunk_stop
+        ))
+        session.execute(delete(RechargeDailyStat).where(
+            RechargeDailyStat.stat_date >= chunk_start, RechargeDailyStat.stat_date < chunk_stop
+        ))
+        if order_rows:
+            session.execute(insert(OrderDailyStat.__table__), [
+                {
+                    'stat_date': to_date(row[0]),
+                    'platform_id': row[1],
+                    'station_id': row[2],
+                    'fleet_id': row[3],
+                    'order_count': row[4],
+                    'total_amount': to_money(row[5]),
+                    'revenue': to_money(row[6]),
+                    'charge_kwh': to_kwh(row[7]),
+                    'updated_at': now
+                }
+                for row in order_rows
+            ])
+        if recharge_rows:
+            session.execute(insert(RechargeDailyStat.__table__), [
+                {
+                    'stat_date': to_date(row[0]),
+                    'fleet_id': row[1],
+                    'recharge_count': row[2],
+                    'recharge_amount': to_money(row[3]),
+                    'updated_at': now
+                }
+                for row in recharge_rows
+            ])
+        session.commit()
+
+        summary['order_rows'] += len(order_rows)
+        summary['recharge_rows'] += len(recharge_rows)
+    return summary
+
+
+def group_columns(model, group_by):
+    columns = []
+    for field in group_by:
+        if field == 'day':
+            columns.append(model.stat_date.label('day'))
+        elif field == 'month':
+            columns.append(extract('year', model.stat_date).label('year'))
+            columns.append(extract('month', model.stat_date).label('month'))
+        elif field == 'platform' and hasattr(model, 'platform_id'):
+            columns.append(model.platform_id)
+        elif field == 'station' and hasattr(model, 'station_id'):
+            columns.append(model.station_id)
+        elif field == 'fleet':
+            columns.append(model.fleet_id)
+    return columns
+
+
+def grouped_rows(session, model, measures, group_by, filters, start_date, end_date):
+    columns = group_columns(model, group_by)
+    query = select(*columns, *[func.sum(getattr(model, measure)).label(measure) for measure in measures]).where(
+        model.stat_date >= start_date,
+        model.stat_date <= end_date
+    )
+    for column, value in filters.items():
+        if hasattr(model, column):
+            query = query.where(getattr(model, column) == value)
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+
+    items = []
+    for row in session.execute(query).mappings():
+        item = {}
+        for key in row.keys():
+            if key == 'day':
+                item['day'] = to_date(row[key]).isoformat()
+            elif key == 'year':
+                continue
+            elif key == 'month':
+                item['month'] = f"{int(row['year']):04d}-{int(row['month']):02d}"
+            elif key not in measures:
+                item[key] = row[key]
+        for measure in measures:
+            item[measure] = row[measure] or 0
+        items.append(item)
+    return items
+
+
+def attach_names(session, items, id_field, name_field, model):
+    ids = {item[id_field] for item in items if item.get(id_field)}
+    names = dict(session.execute(select(model.id, model.name).where(model.id.in_(ids))).all()) if ids else {}
+    for item in items:
+        if id_field in item:
+            item[name_field] = names.get(item[id_field])
+
+
+def format_measures(items):
+    for item in items:
+        for field in ('order_count', 'recharge_count'):
+            if field in item:
+                item[field] = int(item[field])
+        for field in ('total_amount', 'revenue', 'recharge_amount'):
+            if field in item:
+                item[field] = str(to_money(item[field]))
+        if 'charge_kwh' in item:
+            item['charge_kwh'] = str(to_kwh(item['charge_kwh']))
+    return items
+
+
+def get_stats(session, start_date, end_date, group_by=(), filters=None):
+    # filters: {'platform_id' / 'station_id' / 'fleet_id': 值}；充值不区分平台和站点，只按车队筛选
+    unknown = set(group_by) - set(GROUP_FIELDS)
+    if unknown:
+        raise StatsError(f'不支持的分组: {", ".join(sorted(unknown))}')
+    if 'day' in group_by and 'month' in group_by:
+        raise StatsError('day 与 month 不能同时分组')
+    if start_date > end_date:
+        raise StatsError('开始日期不能晚于结束日期')
+    filters = filters or {}
+
+    orders = grouped_rows(session, OrderDailyStat, ORDER_MEASURES, group_by, filters, start_date, end_date)
+    recharges = grouped_rows(session, RechargeDailyStat, RECHARGE_MEASURES, group_by, filters, start_date, end_date)
+
+    totals = {measure: sum((item[measure] for item in orders), 0) for measure in ORDER_MEASURES}
+    totals.update({measure: sum((item[measure] for item in recharges), 0) for measure in RECHARGE_MEASURES})
+    format_measures([totals])
+    totals['vehicle_count'] = session.scalar(select(func.count()).select_from(Vehicle))
+    totals['fleet_count'] = session.scalar(select(func.count()).select_from(Fleet))
+
+    for items in (orders, recharges):
+        attach_names(session, items, 'station_id', 'station_name', Station)
+        attach_names(session, items, 'fleet_id', 'fleet_name', Fleet)
+        format_measures(items)
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'group_by': list(group_by),
+        'totals': totals,
+        'orders': orders if group_by else [],
+        'recharges': recharges if group_by else []
+    }
@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import time
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# 数据库引擎配置，全部由环境变量决定：
+#
+# DATABASE_URL          主库，默认 sqlite:///data_platform.db（相对路径位于 instance 目录）
+# DATABASE_REPLICA_URL  只读副本，可选；标记了 read_replica 的只读接口从副本读取
+#
+# SQLite（单机部署）：每个连接建立时设置 PRAGMA
+#   SQLITE_JOURNAL_MODE   默认 WAL，读写互不阻塞，多个 Gunicorn worker 同时读取不再排队
+#   SQLITE_SYNCHRONOUS    默认 NORMAL，WAL 模式下仍保证崩溃一致性
+#   SQLITE_BUSY_TIMEOUT   写锁被占用时等待的毫秒数，默认 5000，避免立即报 database is locked
+#   SQLITE_MMAP_SIZE      内存映射读取的字节数，默认 256MB
+#
+# MySQL / PostgreSQL：连接池
+#   DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT   常驻连接数、额外连接数、取连接等待秒数
+#   DB_POOL_RECYCLE       连接最长使用秒数，需小于数据库的空闲断开时间（MySQL wait_timeout）
+#   DB_POOL_PRE_PING      取出连接时先探活，默认开启
+
+DEFAULT_DATABASE_URL = 'sqlite:///data_platform.db'
+
+REPLICA_BIND = 'replica'
+
+SQLITE_PRAGMAS = (
+    ('journal_mode', os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')),
+    ('synchronous', os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+    ('busy_timeout', int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))),
+    ('mmap_size', int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)))
+)
+
+
+def env_flag(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def normalize_url(url):
+    # mysql:// 默认使用 mysqlclient，这里改用 requirements.txt 中的 PyMySQL；postgres:// 为部分平台的旧写法
+    if url.startswith('mysql://'):
+        url = 'mysql+pymysql://' + url[len('mysql://'):]
+    elif url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    if url.startswith('mysql') and 'charset=' not in url:
+        url += ('&' if '?' in url else '?') + 'charset=utf8mb4'
+    return url
+
+
+def compact_json(value):
+    # JSON 列（platform_raw_data.raw_data）按 UTF-8 紧凑格式写入，中文列名不转义为 \uXXXX
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def engine_options(url):
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {'json_serializer': compact_json}
+    return {
+        'json_serializer': compact_json,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', True)
+    }
+
+
+def configure_database(app):
+    # 在 db.init_app(app) 之前调用：Flask-SQLAlchemy 在 init_app 时按配置创建引擎
+    url = normalize_url(os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL))
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+
+    replica_url = os.environ.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        replica_url = normalize_url(replica_url)
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: {'url': replica_url, **engine_options(replica_url)}}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+def configure_engines(engines):
+    # 在 db.init_app(app) 之后、首次连接之前调用
+    for engine in engines:
+        if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+            event.listen(engine, 'connect', set_sqlite_pragmas)
+
+    # 以 Gunicorn --preload 等方式 fork 时，子进程不能沿用父进程连接池中的连接
+    def reset_pools():
+        for engine in engines:
+            engine.dispose(close=False)
+    os.register_at_fork(after_in_child=reset_pools)
+
+
+def normalize_statement(statement):
+    return re.sub(r'\s+', ' ', statement).strip()[:200]
+
+
+def instrument_engine(engine, metrics):
+    # 记录每条 SQL 语句的耗时；连接上用栈保存开始时间，出错的语句在 handle_error 中出栈
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        metrics.record_call(normalize_statement(statement), time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get('query_started'):
+            context.connection.info['query_started'].pop()
+
+
+class RoutingSession(Session):
+    # 标记为只读的请求（read_replica）在配置了副本时从副本读取；flush 及 UPDATE / DELETE 等写语句始终使用主库
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not getattr(clause, 'is_dml', False)
+            and has_app_context()
+            and g.get('use_replica')
+            and REPLICA_BIND in self._db.engines
+        ):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(f):
+    # 只读接口使用：接口内不写入，可接受副本的复制延迟
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,60 @@
+from sqlalchemy import insert
+
+# 数据库方言相关的写入工具
+
+# 各数据库唯一约束冲突的错误码：PostgreSQL SQLSTATE / MySQL 错误号
+UNIQUE_VIOLATION_CODES = ('23505', 1062)
+
+
+def dialect_insert(session, table):
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table)
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table)
+    if dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        return mysql_insert(table)
+    return insert(table)
+
+
+def upsert(session, table, rows, key_columns, increment_columns=(), update_columns=(), extra_set=None):
+    # 多行 INSERT ... ON CONFLICT：冲突时 increment_columns 累加、update_columns 覆盖，一条语句批量执行；
+    # extra_set(new) 可返回额外的 {列: 表达式}，new 为待插入行的值（excluded / VALUES()）
+    if not rows:
+        return
+    stmt = dialect_insert(session, table)
+    dialect = session.get_bind().dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        new = stmt.excluded
+    elif dialect in ('mysql', 'mariadb'):
+        new = stmt.inserted
+    else:
+        raise NotImplementedError(f'不支持的数据库: {dialect}')
+
+    set_ = {column: table.c[column] + new[column] for column in increment_columns}
+    set_.update({column: new[column] for column in update_columns})
+    if extra_set is not None:
+        set_.update(extra_set(new))
+
+    if dialect in ('postgresql', 'sqlite'):
+        if set_:
+            stmt = stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(key_columns))
+    else:
+        stmt = stmt.on_duplicate_key_update(set_ or {key_columns[0]: table.c[key_columns[0]]})
+
+    session.execute(stmt, rows)
+
+
+def is_unique_violation(error, column=None):
+    # error 为 IntegrityError；column 给出时还要求冲突发生在该列上
+    orig = error.orig
+    code = getattr(orig, 'pgcode', None) or (orig.args[0] if getattr(orig, 'args', None) else None)
+    message = str(orig)
+    unique = code in UNIQUE_VIOLATION_CODES or 'UNIQUE constraint failed' in message
+    return unique and (column is None or column in message)
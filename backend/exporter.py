@@ -0,0 +1,274 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from models import Fleet, FleetBalance, Order, RechargeRecord, Station, Vehicle
+
+# 数据导出：按主键游标分批读取，逐批写出 CSV / XLSX，内存占用与导出行数无关
+
+DEFAULT_BATCH_SIZE = 5000
+
+# 读取 XLSX 临时文件时每次返回的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 每张表可导出的列：{列名: (表头, 表达式)}；filters 为允许按等值过滤的条件；time_column 用于 start_date / end_date
+EXPORT_TABLES = {
+    'orders': {
+        'model': Order,
+        'time_column': Order.order_time,
+        'joins': (
+            (Vehicle, Order.vehicle_id == Vehicle.id),
+            (Fleet, Order.fleet_id == Fleet.id),
+            (Station, Order.station_id == Station.id)
+        ),
+        'columns': {
+            'order_no': ('订单号', Order.order_no),
+            'platform_id': ('平台ID', Order.platform_id),
+            'plate_number': ('车牌号', Vehicle.plate_number),
+            'fleet_name': ('车队', Fleet.name),
+            'station_name': ('充电站', Station.name),
+            'charge_kwh': ('充电量(kWh)', Order.charge_kwh),
+            'amount': ('订单金额', Order.amount),
+            'settlement_amount': ('结算金额', Order.settlement_amount),
+            'order_time': ('订单时间', Order.order_time),
+            'status': ('状态', Order.status)
+        },
+        'filters': {
+            'fleet_id': Order.fleet_id,
+            'vehicle_id': Order.vehicle_id,
+            'station_id': Order.station_id,
+            'platform_id': Order.platform_id,
+            'status': Order.status
+        }
+    },
+    'vehicles': {
+        'model': Vehicle,
+        'time_column': Vehicle.created_at,
+        'joins': (
+            (Fleet, Vehicle.fleet_id == Fleet.id),
+        ),
+        'columns': {
+            'plate_number': ('车牌号', Vehicle.plate_number),
+            'vehicle_type': ('车辆类型', Vehicle.vehicle_type),
+            'fleet_name': ('车队', Fleet.name),
+            'driver_name': ('司机', Vehicle.driver_name),
+            'driver_phone': ('司机电话', Vehicle.driver_phone),
+            'status': ('状态', Vehicle.status),
+            'remark': ('备注', Vehicle.remark),
+            'created_at': ('创建时间', Vehicle.created_at)
+        },
+        'filters': {
+            'fleet_id': Vehicle.fleet_id,
+            'status': Vehicle.status
+        }
+    },
+    'fleets': {
+        'model': Fleet,
+        'time_column': Fleet.created_at,
+        'joins': (),
+        'columns': {
+            'name': ('车队名称', Fleet.name),
+            'description': ('描述', Fleet.description),
+            'contact_person': ('联系人', Fleet.contact_person),
+            'contact_phone': ('联系电话', Fleet.contact_phone),
+            'status': ('状态', Fleet.status),
+            'created_at': ('创建时间', Fleet.created_at)
+        },
+        'filters': {
+            'status': Fleet.status
+        }
+    },
+    'recharge_records': {
+        'model': RechargeRecord,
+        'time_column': RechargeRecord.recharge_time,
+        'joins': (
+            (Fleet, RechargeRecord.fleet_id == Fleet.id),
+        ),
+        'columns': {
+            'fleet_name': ('车队', Fleet.name),
+            'amount': ('充值金额', RechargeRecord.amount),
+            'payment_method': ('支付方式', RechargeRecord.payment_method),
+            'recharge_time': ('充值时间', RechargeRecord.recharge_time),
+            'status': ('状态', RechargeRecord.status),
+            'remark': ('备注', RechargeRecord.remark)
+        },
+        'filters': {
+            'fleet_id': RechargeRecord.fleet_id,
+            'status': RechargeRecord.status
+        }
+    },
+    'fleet_balance': {
+        'model': FleetBalance,
+        'time_column': None,
+        'joins': (
+            (Fleet, FleetBalance.fleet_id == Fleet.id),
+        ),
+        'columns': {
+            'fleet_name': ('车队', Fleet.name),
+            'year': ('年', FleetBalance.year),
+            'month': ('月', FleetBalance.month),
+            'previous_balance': ('期初余额', FleetBalance.previous_balance),
+            'monthly_consumption': ('本月消费', FleetBalance.monthly_consumption),
+            'monthly_recharge': ('本月充值', FleetBalance.monthly_recharge),
+            'current_balance': ('期末余额', FleetBalance.current_balance)
+        },
+        'filters': {
+            'fleet_id': FleetBalance.fleet_id,
+            'year': FleetBalance.year,
+            'month': FleetBalance.month
+        }
+    }
+}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'excel': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+class ExportPlan:
+    def __init__(self, table_name, model, headers, query):
+        self.table_name = table_name
+        self.model = model
+        self.headers = headers
+        self.query = query
+
+    def iter_rows(self, session, batch_size=DEFAULT_BATCH_SIZE):
+        # 按主键游标分批读取，每批一条 LIMIT 查询，已读出的批次不再持有
+        key = self.model.id
+        last_id = None
+        while True:
+            query = self.query
+            if last_id is not None:
+                query = query.where(key > last_id)
+            rows = session.execute(query.order_by(key).limit(batch_size)).all()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for row in rows:
+                yield row[1:]
+            if len(rows) < batch_size:
+                return
+
+
+def parse_date(value, field):
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d')
+    except ValueError:
+        raise ExportError(f'{field} 格式应为 YYYY-MM-DD')
+
+
+def plan_export(table_name, columns=None, conditions=None):
+    # 校验表名、列名与过滤条件并构造查询；在开始输出响应之前调用，参数错误可直接返回 400
+    spec = EXPORT_TABLES.get(table_name)
+    if spec is None:
+        raise ExportError(f'不支持导出的数据表: {table_name}')
+
+    columns = columns or list(spec['columns'])
+    unknown = [column for column in columns if column not in spec['columns']]
+    if unknown:
+        raise ExportError(f'未知的导出列: {", ".join(unknown)}')
+
+    model = spec['model']
+    query = select(model.id, *[spec['columns'][column][1] for column in columns]).select_from(model)
+    for target, onclause in spec['joins']:
+        query = query.outerjoin(target, onclause)
+
+    conditions = dict(conditions or {})
+    start_date = conditions.pop('start_date', None)
+    end_date = conditions.pop('end_date', None)
+    if start_date or end_date:
+        time_column = spec['time_column']
+        if time_column is None:
+            raise ExportError(f'{table_name} 不支持按日期过滤')
+        if start_date:
+            query = query.where(time_column >= parse_date(start_date, 'start_date'))
+        if end_date:
+            # 结束日期包含当天
+            query = query.where(time_column < parse_date(end_date, 'end_date') + timedelta(days=1))
+
+    for field, value in conditions.items():
+        if value in (None, ''):
+            continue
+        if field not in spec['filters']:
+            raise ExportError(f'不支持的过滤条件: {field}')
+        column = spec['filters'][field]
+        if isinstance(value, list):
+            query = query.where(column.in_(value))
+        else:
+            query = query.where(column == value)
+
+    headers = [spec['columns'][column][0] for column in columns]
+    return ExportPlan(table_name, model, headers, query)
+
+
+def format_csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def stream_csv(headers, rows, batch_size=DEFAULT_BATCH_SIZE):
+    # 带 BOM 的 UTF-8，Excel 直接打开中文不乱码；每累计 batch_size 行输出一次
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in rows:
+        writer.writerow([format_csv_value(value) for value in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_xlsx(headers, rows, sheet_title='导出数据'):
+    # openpyxl 只写模式逐行落盘到临时文件，保存完成后分块读出；XLSX 是 zip 格式，须整体写完才能开始输出
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(list(row))
+
+    fd, path = tempfile.mkstemp(prefix='export_', suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as file:
+            while True:
+                chunk = file.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def stream_export(session, plan, export_format, batch_size=DEFAULT_BATCH_SIZE):
+    rows = plan.iter_rows(session, batch_size)
+    if EXPORT_FORMATS[export_format][1] == 'csv':
+        return stream_csv(plan.headers, rows, batch_size)
+    return stream_xlsx(plan.headers, rows)
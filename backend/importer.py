@@ -0,0 +1,692 @@
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import uuid
+import zlib
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from balance import apply_changes, consumption_changes
+from batching import iter_chunks
+from dashboard import apply_order_changes, order_changes
+from db_utils import upsert
+from models import Order, PlatformRawData, Station, Vehicle
+from settlement import settle_rows
+
+# 平台订单导入引擎：流式读取文件 -> 平台适配器解析 -> 分批写入 orders / platform_raw_data
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# 返回给前端的错误明细上限
+MAX_REPORTED_ERRORS = 100
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+
+# 原始记录序列化后不小于该字节数时压缩存储，0 表示不压缩
+RAW_COMPRESS_MIN_BYTES = int(os.environ.get('RAW_DATA_COMPRESS_MIN_BYTES', 2048))
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+# 文件读取器：逐行产出 {列名: 值}，内存占用与文件大小无关
+def iter_csv_records(stream, encoding='utf-8-sig'):
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    try:
+        for row in csv.DictReader(text):
+            yield row
+    finally:
+        # 不关闭底层文件流，由调用方负责
+        text.detach()
+
+
+def iter_xlsx_records(stream):
+    from openpyxl import load_workbook
+
+    # 只读模式按需解析工作表 XML，不会一次性载入整个文件
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(name).strip() if name is not None else '' for name in header]
+        for values in rows:
+            if all(value is None or value == '' for value in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_records(stream, filename, encoding='utf-8-sig'):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return iter_csv_records(stream, encoding)
+    if extension == '.xlsx':
+        return iter_xlsx_records(stream)
+    raise ImportFormatError('仅支持 CSV 或 XLSX 文件')
+
+
+def to_json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def normalize_raw(raw):
+    return {str(key): to_json_value(value) for key, value in raw.items()}
+
+
+def encode_raw(raw):
+    # 规范化序列化：键排序、紧凑分隔符，内容相同的行得到相同的字节
+    return json.dumps(raw, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def content_hash(platform_id, encoded):
+    # SHA-256 取前 128 位（32 位十六进制），唯一索引体积减半
+    return hashlib.sha256(b'%d:' % platform_id + encoded).hexdigest()[:32]
+
+
+# 平台适配器：把各平台导出文件的列映射为统一的订单字段
+class PlatformAdapter:
+    # 统一字段 -> 候选列名，按顺序取第一个存在的列
+    columns = {
+        'order_no': ['订单号', '订单编号', '交易流水号', '流水号', 'order_no'],
+        'amount': ['订单金额', '消费金额', '实付金额', '金额', 'amount'],
+        'order_time': ['充电开始时间', '订单时间', '交易时间', '下单时间', '开始时间', 'order_time'],
+        'plate_number': ['车牌号', '车牌号码', '车牌', 'plate_number'],
+        'station_name': ['站点名称', '电站名称', '充电站', '站点', 'station_name'],
+        'charge_kwh': ['充电量', '充电电量', '电量(kWh)', '电量', 'charge_kwh']
+    }
+    required = ('order_no', 'amount', 'order_time')
+    time_formats = (
+        '%Y-%m-%d %H:%M:%S',
+        '%Y/%m/%d %H:%M:%S',
+        '%Y-%m-%d %H:%M',
+        '%Y/%m/%d %H:%M',
+        '%Y%m%d%H%M%S',
+        '%Y-%m-%d'
+    )
+    order_status = 'completed'
+
+    def __init__(self, platform_id):
+        self.platform_id = platform_id
+
+    def resolve_columns(self, header):
+        header = set(header)
+        mapping = {}
+        for field, candidates in self.columns.items():
+            for column in candidates:
+                if column in header:
+                    mapping[field] = column
+                    break
+        missing = [field for field in self.required if field not in mapping]
+        if missing:
+            raise ImportFormatError(f'平台{self.platform_id}文件缺少必要列: {", ".join(missing)}')
+        return mapping
+
+    def parse_amount(self, value):
+        if isinstance(value, (int, float, Decimal)):
+            return Decimal(str(value)).quantize(Decimal('0.01'))
+        try:
+            return Decimal(str(value).replace(',', '').replace('¥', '').strip()).quantize(Decimal('0.01'))
+        except (InvalidOperation, AttributeError):
+            raise ImportRowError(f'金额格式错误: {value}')
+
+    def parse_kwh(self, value):
+        if value is None or str(value).strip() == '':
+            return None
+        try:
+            return Decimal(str(value).replace(',', '').strip()).quantize(Decimal('0.001'))
+        except InvalidOperation:
+            raise ImportRowError(f'电量格式错误: {value}')
+
+    def parse_time(self, value):
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        text = str(value).strip()
+        for time_format in self.time_formats:
+            try:
+                return datetime.strptime(text, time_format)
+            except ValueError:
+                continue
+        raise ImportRowError(f'时间格式错误: {value}')
+
+    def clean_text(self, value):
+        if value is None:
+            return None
+        text = str(value).strip()
+        return text or None
+
+    def parse(self, raw, mapping):
+        order_no = self.clean_text(raw.get(mapping['order_no']))
+        if not order_no:
+            raise ImportRowError('订单号为空')
+        return {
+            'order_no': order_no,
+            'amount': self.parse_amount(raw.get(mapping['amount'])),
+            'order_time': self.parse_time(raw.get(mapping['order_time'])),
+            'plate_number': self.clean_text(raw.get(mapping['plate_number'])) if 'plate_number' in mapping else None,
+            'station_name': self.clean_text(raw.get(mapping['station_name'])) if 'station_name' in mapping else None,
+            'charge_kwh': self.parse_kwh(raw.get(mapping['charge_kwh'])) if 'charge_kwh' in mapping else None,
+            'status': self.order_status
+        }
+
+
+# 平台ID -> 适配器类；未注册的平台使用通用列名映射
+ADAPTERS = {}
+
+
+def register_adapter(platform_id):
+    def decorator(cls):
+        ADAPTERS[platform_id] = cls
+        return cls
+    return decorator
+
+
+def get_adapter(platform_id):
+    return ADAPTERS.get(platform_id, PlatformAdapter)(platform_id)
+
+
+def parse_chunks(records, adapter, chunk_size=DEFAULT_CHUNK_SIZE, known_hashes=None):
+    # 产出 (解析成功的订单, 行错误列表, 跳过的已导入行数)，行号从数据首行 2 开始计（第 1 行为表头）；
+    # 每行先计算内容哈希，known_hashes(哈希集合) 返回其中已导入的部分，命中的行不再解析
+    mapping = None
+    row_number = 1
+    for chunk in iter_chunks(records, chunk_size):
+        if mapping is None:
+            mapping = adapter.resolve_columns(chunk[0].keys())
+        hashed = []
+        for raw in chunk:
+            normalized = normalize_raw(raw)
+            encoded = encode_raw(normalized)
+            hashed.append((raw, normalized, encoded, content_hash(adapter.platform_id, encoded)))
+        known = known_hashes({item[3] for item in hashed}) if known_hashes is not None else set()
+
+        parsed = []
+        errors = []
+        skipped = 0
+        for raw, normalized, encoded, value in hashed:
+            row_number += 1
+            if value in known:
+                skipped += 1
+                continue
+            try:
+                row = adapter.parse(raw, mapping)
+            except ImportRowError as e:
+                errors.append({'row': row_number, 'message': str(e)})
+                continue
+            row['raw'] = normalized
+            row['raw_bytes'] = encoded
+            row['content_hash'] = value
+            parsed.append(row)
+        yield parsed, errors, skipped
+
+
+def raw_columns(raw, encoded, compress_min_bytes=None):
+    # 较大的记录压缩存入 raw_compressed，其余按 JSON 存入 raw_data
+    if compress_min_bytes is None:
+        compress_min_bytes = RAW_COMPRESS_MIN_BYTES
+    if compress_min_bytes and len(encoded) >= compress_min_bytes:
+        return {'raw_data': None, 'raw_compressed': zlib.compress(encoded)}
+    return {'raw_data': raw, 'raw_compressed': None}
+
+
+# 批量写入：每批只做固定次数的查询与多行插入，并在批末提交；
+# 传入 rulebook 时在入库前整批计算结算金额
+class OrderBatchWriter:
+    def __init__(self, session, platform_id, rulebook=None):
+        self.session = session
+        self.platform_id = platform_id
+        self.rulebook = rulebook
+
+    def lookup_ids(self, columns, key_column, keys):
+        # columns 为单列时返回 {键: 值}，为元组时返回 {键: (值, ...)}
+        keys = {key for key in keys if key}
+        if not keys:
+            return {}
+        if isinstance(columns, tuple):
+            rows = self.session.execute(select(key_column, *columns).where(key_column.in_(keys)))
+            return {row[0]: tuple(row[1:]) for row in rows}
+        rows = self.session.execute(select(key_column, columns).where(key_column.in_(keys)))
+        return {key: value for key, value in rows}
+
+    def known_hashes(self, hashes):
+        return set(self.lookup_ids(PlatformRawData.id, PlatformRawData.content_hash, hashes))
+
+    def write(self, rows, checked=False):
+        # 内容哈希已存在的原始记录（重复上传的行）直接跳过，不再查询订单号、车辆和站点；
+        # checked 表示解析前已按 known_hashes 过滤过
+        hashed_rows = {}
+        for row in rows:
+            hashed_rows.setdefault(row['content_hash'], row)
+        known = set() if checked else self.known_hashes(hashed_rows.keys())
+
+        # 去掉本批内重复以及库中已存在的订单号
+        unique_rows = {}
+        for value, row in hashed_rows.items():
+            if value not in known:
+                unique_rows.setdefault(row['order_no'], row)
+        existing = self.lookup_ids(Order.id, Order.order_no, unique_rows.keys())
+        new_rows = [row for order_no, row in unique_rows.items() if order_no not in existing]
+        skipped = len(rows) - len(new_rows)
+        if not new_rows:
+            return 0, skipped
+
+        vehicles = self.lookup_ids(
+            (Vehicle.id, Vehicle.fleet_id), Vehicle.plate_number, (row['plate_number'] for row in new_rows)
+        )
+        station_ids = self.lookup_ids(Station.id, Station.name, (row['station_name'] for row in new_rows))
+
+        for row in new_rows:
+            row['vehicle_id'], row['fleet_id'] = vehicles.get(row['plate_number'], (None, None))
+            row['station_id'] = station_ids.get(row['station_name'])
+            row['platform_id'] = self.platform_id
+        if self.rulebook is not None:
+            for row, amount in zip(new_rows, settle_rows(self.rulebook, new_rows)):
+                row['settlement_amount'] = amount
+
+        self.session.execute(insert(Order.__table__), [
+            {
+                'order_no': row['order_no'],
+                'vehicle_id': row['vehicle_id'],
+                'station_id': row['station_id'],
+                'platform_id': self.platform_id,
+                'fleet_id': row['fleet_id'],
+                'amount': row['amount'],
+                'settlement_amount': row.get('settlement_amount'),
+                'charge_kwh': row['charge_kwh'],
+                'order_time': row['order_time'],
+                'status': row['status'],
+                'created_at': datetime.utcnow()
+            }
+            for row in new_rows
+        ])
+
+        order_ids = self.lookup_ids(Order.id, Order.order_no, (row['order_no'] for row in new_rows))
+        # 并发导入同一文件时以内容哈希唯一约束兜底，冲突的行不写入
+        upsert(
+            self.session,
+            PlatformRawData.__table__,
+            [
+                {
+                    'platform_id': self.platform_id,
+                    'content_hash': row['content_hash'],
+                    **raw_columns(row['raw'], row['raw_bytes']),
+                    'order_id': order_ids[row['order_no']],
+                    'imported_at': datetime.utcnow()
+                }
+                for row in new_rows
+            ],
+            key_columns=('content_hash',)
+        )
+
+        # 车队当月消费与仪表盘日汇总随订单同一事务累加
+        apply_changes(self.session, consumption_changes(new_rows))
+        apply_order_changes(self.session, order_changes(new_rows))
+
+        self.session.commit()
+        return len(new_rows), skipped
+
+
+def import_order_file(session, stream, filename, platform_id, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8-sig',
+                      rulebook=None):
+    adapter = get_adapter(platform_id)
+    writer = OrderBatchWriter(session, platform_id, rulebook)
+    summary = {'total_rows': 0, 'imported': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+
+    records = iter_records(stream, filename, encoding)
+    for parsed, errors, known in parse_chunks(records, adapter, chunk_size, known_hashes=writer.known_hashes):
+        imported, skipped = writer.write(parsed, checked=True)
+        summary['total_rows'] += len(parsed) + len(errors) + known
+        summary['imported'] += imported
+        summary['skipped'] += skipped + known
+        summary['failed'] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(summary['errors'])
+        if room > 0:
+            summary['errors'].extend(errors[:room])
+
+    return summary
+
+
+def precheck_order_file(session, stream, filename, platform_id, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8-sig'):
+    # 导入前预检：只读取并哈希原始行，不做字段解析与结算，统计已导入过的行（known）、
+    # 文件内重复的行（duplicates）和待导入的行（new，其中格式错误的行在导入时计入 failed）
+    summary = {'total_rows': 0, 'known': 0, 'duplicates': 0, 'new': 0}
+    # 文件内去重只保留哈希前 64 位，百万行级文件的内存占用也可控
+    seen = set()
+    for chunk in iter_chunks(iter_records(stream, filename, encoding), chunk_size):
+        hashes = [content_hash(platform_id, encode_raw(normalize_raw(raw))) for raw in chunk]
+        known = set(session.execute(
+            select(PlatformRawData.content_hash).where(PlatformRawData.content_hash.in_(set(hashes)))
+        ).scalars())
+        for value in hashes:
+            key = int(value[:16], 16)
+            if key in seen:
+                summary['duplicates'] += 1
+                continue
+            seen.add(key)
+            summary['known' if value in known else 'new'] += 1
+        summary['total_rows'] += len(chunk)
+    return summary
+
+
+def backfill_raw_data(session, batch_size=1000):
+    # 为启用内容哈希之前导入的原始记录补齐哈希并按阈值压缩，内容重复的记录只保留最早的一条；按主键游标分批提交
+    summary = {'hashed': 0, 'compressed': 0, 'removed': 0}
+    table = PlatformRawData.__table__
+    update_stmt = update(table).where(table.c.id == bindparam('row_id')).values(
+        content_hash=bindparam('new_hash'),
+        raw_data=bindparam('new_raw_data'),
+        raw_compressed=bindparam('new_raw_compressed')
+    )
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(PlatformRawData.id, PlatformRawData.platform_id, PlatformRawData.raw_data).where(
+                PlatformRawData.content_hash.is_(None),
+                PlatformRawData.id > last_id
+            ).order_by(PlatformRawData.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        hashed = {}
+        for row in rows:
+            encoded = encode_raw(row.raw_data)
+            hashed.setdefault(content_hash(row.platform_id, encoded), []).append((row, encoded))
+        known = set(session.execute(select(table.c.content_hash).where(table.c.content_hash.in_(hashed.keys()))).scalars())
+
+        updates = []
+        removed = []
+        for value, entries in hashed.items():
+            if value not in known:
+                (row, encoded), entries = entries[0], entries[1:]
+                columns = raw_columns(row.raw_data, encoded)
+                updates.append({
+                    'row_id': row.id,
+                    'new_hash': value,
+                    'new_raw_data': columns['raw_data'],
+                    'new_raw_compressed': columns['raw_compressed']
+                })
+                summary['compressed'] += columns['raw_compressed'] is not None
+            removed.extend(row.id for row, _ in entries)
+
+        if removed:
+            session.execute(delete(table).where(table.c.id.in_(removed)))
+        if updates:
+            session.execute(update_stmt, updates)
+        session.commit()
+        summary['hashed'] += len(updates)
+        summary['removed'] += len(removed)
+    return summary
+
+
+# 多文件并行解析：每个文件在独立进程中解析（XLSX 解析受 CPU 限制），
+# 解析结果经有界队列流回主进程，由单一写入方分批入库。
+# spawn 出的解析进程要重新导入 pandas / numpy 等模块，启动耗时数秒，因此进程池在进程内复用（fork 后在子进程中重建）；
+# 多个文件且总大小不小于 IMPORT_POOL_MIN_BYTES（或进程池已启动）时才使用进程池，其余情况在当前线程内依次解析
+
+POOL_MIN_BYTES = int(os.environ.get('IMPORT_POOL_MIN_BYTES', 4 * 1024 * 1024))
+
+_pool = None
+_pool_workers = 0
+_pool_queue = None
+_pool_cancel = None
+# 进程池的消息队列共用，同一时间只有一次导入使用进程池，其他并发导入在各自线程内解析
+_pool_lock = threading.Lock()
+
+_worker_queue = None
+_worker_cancel = None
+
+
+def _reset_pool():
+    global _pool, _pool_workers, _pool_queue, _pool_cancel
+    _pool, _pool_workers, _pool_queue, _pool_cancel = None, 0, None, None
+
+
+def _reset_pool_in_child():
+    # fork 出的子进程不能使用父进程的进程池和队列，锁也可能处于被持有状态
+    global _pool_lock
+    _reset_pool()
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pool_in_child)
+
+
+def _discard_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _reset_pool()
+
+
+def _get_pool(workers, mp_context):
+    # 调用方持有 _pool_lock；已有进程池的进程数不足时重建
+    global _pool, _pool_workers, _pool_queue, _pool_cancel
+    if _pool is not None and _pool_workers >= workers:
+        return _pool
+    _discard_pool()
+    context = multiprocessing.get_context(mp_context)
+    # 有界队列：写入跟不上时解析进程阻塞，主进程内存占用有上限
+    _pool_queue = context.Queue(maxsize=workers * 2)
+    _pool_cancel = context.Event()
+    _pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_parse_worker,
+        initargs=(_pool_queue, _pool_cancel)
+    )
+    _pool_workers = workers
+    return _pool
+
+
+def _init_parse_worker(result_queue, cancel_event):
+    global _worker_queue, _worker_cancel
+    _worker_queue = result_queue
+    _worker_cancel = cancel_event
+
+
+def _parse_file_worker(token, file_index, path, filename, platform_id, chunk_size, encoding):
+    # 消息带本次导入的 token，主进程忽略此前中断的导入残留在队列中的消息
+    try:
+        adapter = get_adapter(platform_id)
+        with open(path, 'rb') as stream:
+            for parsed, errors, _ in parse_chunks(iter_records(stream, filename, encoding), adapter, chunk_size):
+                if _worker_cancel.is_set():
+                    _worker_queue.put((token, 'cancelled', file_index, None))
+                    return
+                _worker_queue.put((token, 'chunk', file_index, (parsed, errors)))
+        _worker_queue.put((token, 'done', file_index, None))
+    except Exception as e:
+        _worker_queue.put((token, 'error', file_index, str(e)))
+
+
+def total_file_size(files):
+    return sum(os.path.getsize(path) for path, _, _ in files if os.path.exists(path))
+
+
+def import_order_files(session, files, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8-sig',
+                       progress=None, cancel_event=None, mp_context='spawn', rulebook=None):
+    # files: [(本地路径, 原始文件名, 平台ID)]；progress(file_summary) 在每批写入及状态变化时回调
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files)))
+    summaries = [
+        {
+            'filename': filename,
+            'platform_id': platform_id,
+            'status': 'pending',
+            'total_rows': 0,
+            'imported': 0,
+            'skipped': 0,
+            'failed': 0,
+            'errors': [],
+            'message': None
+        }
+        for _, filename, platform_id in files
+    ]
+    writers = [OrderBatchWriter(session, platform_id, rulebook) for _, _, platform_id in files]
+
+    def report(index, status=None, message=None):
+        if status:
+            summaries[index]['status'] = status
+        if message:
+            summaries[index]['message'] = message
+        if progress:
+            progress(summaries[index])
+
+    def write(index, parsed, errors, known=0, checked=False):
+        # checked 表示解析前已按内容哈希过滤，known 为过滤掉的已导入行数
+        imported, skipped = writers[index].write(parsed, checked=checked)
+        summary = summaries[index]
+        summary['total_rows'] += len(parsed) + len(errors) + known
+        summary['imported'] += imported
+        summary['skipped'] += skipped + known
+        summary['failed'] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(summary['errors'])
+        if room > 0:
+            summary['errors'].extend(errors[:room])
+        report(index)
+
+    use_pool = workers > 1 and (_pool is not None or total_file_size(files) >= POOL_MIN_BYTES)
+    if use_pool and _pool_lock.acquire(blocking=False):
+        try:
+            cancelled = _import_with_pool(files, workers, chunk_size, encoding, mp_context, cancel_event, report, write)
+        finally:
+            _pool_lock.release()
+    else:
+        cancelled = _import_inline(files, chunk_size, encoding, cancel_event, writers, report, write)
+
+    return {
+        'files': summaries,
+        'total_rows': sum(summary['total_rows'] for summary in summaries),
+        'imported': sum(summary['imported'] for summary in summaries),
+        'skipped': sum(summary['skipped'] for summary in summaries),
+        'failed': sum(summary['failed'] for summary in summaries),
+        'cancelled': cancelled
+    }
+
+
+
+def _import_inline(files, chunk_size, encoding, cancel_event, writers, report, write):
+    # 当前线程内逐个文件解析与写入，解析前按内容哈希过滤已导入的行；返回是否被取消
+    cancelled = False
+    for index, (path, filename, platform_id) in enumerate(files):
+        if cancelled:
+            report(index, 'cancelled')
+            continue
+        report(index, 'parsing')
+        with open(path, 'rb') as stream:
+            try:
+                chunks = parse_chunks(
+                    iter_records(stream, filename, encoding), get_adapter(platform_id), chunk_size,
+                    known_hashes=writers[index].known_hashes
+                )
+            except Exception as e:
+                report(index, 'error', str(e))
+                continue
+            while True:
+                try:
+                    parsed, errors, known = next(chunks)
+                except StopIteration:
+                    report(index, 'done')
+                    break
+                except SQLAlchemyError:
+                    raise
+                except Exception as e:
+                    # 与解析进程一致：文件解析失败只影响该文件，写入失败向上抛出
+                    report(index, 'error', str(e))
+                    break
+                write(index, parsed, errors, known, checked=True)
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    report(index, 'cancelled')
+                    break
+    return cancelled
+
+
+def _import_with_pool(files, workers, chunk_size, encoding, mp_context, cancel_event, report, write):
+    # 调用方持有 _pool_lock；返回是否被取消
+    token = uuid.uuid4().hex
+    pool = _get_pool(workers, mp_context)
+    _pool_cancel.clear()
+
+    def submit_all(pool):
+        return [
+            pool.submit(_parse_file_worker, token, index, path, filename, platform_id, chunk_size, encoding)
+            for index, (path, filename, platform_id) in enumerate(files)
+        ]
+
+    try:
+        futures = submit_all(pool)
+    except RuntimeError:
+        # 进程池已关闭或有工作进程异常退出（BrokenProcessPool），重建一次
+        _discard_pool()
+        pool = _get_pool(workers, mp_context)
+        futures = submit_all(pool)
+    result_queue = _pool_queue
+    for index in range(len(files)):
+        report(index, 'parsing')
+
+    finished = set()
+    cancelled = False
+    try:
+        while len(finished) < len(files):
+            if not cancelled and cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                _pool_cancel.set()
+                for index, future in enumerate(futures):
+                    if future.cancel():
+                        finished.add(index)
+                        report(index, 'cancelled')
+
+            try:
+                message_token, kind, index, payload = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                # 工作进程异常退出时不会回传消息，通过 future 感知
+                for index, future in enumerate(futures):
+                    if index not in finished and future.done() and not future.cancelled() and future.exception():
+                        finished.add(index)
+                        report(index, 'error', str(future.exception()))
+                continue
+            if message_token != token:
+                continue
+
+            if kind == 'chunk':
+                if not cancelled:
+                    write(index, *payload)
+            else:
+                finished.add(index)
+                report(index, kind, payload)
+    finally:
+        if len(finished) < len(files):
+            # 写入出错等提前退出：通知解析进程停止并排空队列，进程池留给下次导入
+            _pool_cancel.set()
+            while not all(future.done() for future in futures):
+                try:
+                    result_queue.get(timeout=0.5)
+                except queue.Empty:
+                    pass
+        if any(not future.cancelled() and isinstance(future.exception(), BrokenExecutor) for future in futures):
+            _discard_pool()
+
+    return cancelled
@@ -0,0 +1,345 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import g, has_app_context
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import OperationalError
+
+from models import Job, db
+
+# 后台任务：提交接口写入 jobs 表并立即返回任务ID，任务由工作线程或 Celery worker 执行；
+# 状态、进度、取消标记和重试计划都保存在 jobs 表中，各后端共用同一套认领与执行逻辑。
+#
+#   JOB_BACKEND=thread   默认：Web 进程内的工作线程轮询 jobs 表（单机部署），也可用 flask run-jobs 单独运行
+#   JOB_BACKEND=celery   经 Redis 分发给 Celery worker：celery -A worker:celery worker
+#   JOB_BACKEND=inline   提交时在当前请求内同步执行（测试用）
+#
+# 运行中的任务定期刷新心跳；进程退出导致心跳超时的任务重新排队，未超过 max_attempts 时再次执行
+
+JOB_HANDLERS = {}
+
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+# 进度写库的最小间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+HEARTBEAT_INTERVAL = 30
+
+# 清理过期任务文件的间隔（秒）
+PURGE_INTERVAL = 3600
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    # 处理函数在取消点抛出，args[0] 可给出已完成部分的结果
+    pass
+
+
+def job_handler(kind, max_attempts=1):
+    # 注册处理函数 handler(context, **params) -> 结果 dict；max_attempts > 1 的任务必须可以安全重跑
+    def decorator(f):
+        JOB_HANDLERS[kind] = (f, max_attempts)
+        return f
+    return decorator
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+class JobContext:
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+        self.values = {}
+        self.last_written = 0.0
+
+    def storage_dir(self, name):
+        return self.runner.storage_dir(self.job_id, name)
+
+    def progress(self, force=False, **values):
+        # 合并进度、刷新心跳并读取取消标记；使用独立连接写入，调用时处理函数自身的事务应已提交
+        self.values.update(values)
+        now = time.monotonic()
+        if not force and now - self.last_written < PROGRESS_INTERVAL:
+            return
+        self.last_written = now
+        table = Job.__table__
+        with db.engine.begin() as connection:
+            connection.execute(update(table).where(table.c.id == self.job_id).values(
+                progress=dict(self.values),
+                heartbeat_at=datetime.utcnow()
+            ))
+            if connection.execute(select(table.c.cancel_requested).where(table.c.id == self.job_id)).scalar():
+                self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobRunner:
+    def __init__(self, app=None):
+        self.app = None
+        self.celery = None
+        self.celery_task = None
+        self.wakeup = threading.Event()
+        self.active = set()
+        self.lock = threading.Lock()
+        self.workers_pid = None
+        self.heartbeat_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if app.config['JOB_BACKEND'] == 'celery':
+            self.celery = self.make_celery()
+        elif app.config['JOB_BACKEND'] == 'thread' and app.config['JOB_WORKERS'] > 0:
+            app.before_request(self.ensure_started)
+
+    def make_celery(self):
+        from celery import Celery
+
+        celery = Celery(self.app.import_name, broker=self.app.config['CELERY_BROKER_URL'])
+        # worker 异常退出时消息重新投递，由心跳超时判断是否可以重新认领
+        celery.conf.task_acks_late = True
+        celery.conf.worker_prefetch_multiplier = 1
+        runner = self
+
+        @celery.task(name='jobs.run_job')
+        def run_job(job_id):
+            runner.ensure_heartbeat()
+            with runner.app.app_context():
+                if runner.claim(job_id):
+                    runner.execute(job_id)
+
+        self.celery_task = run_job
+        return celery
+
+    # ---- 提交与查询 ----
+
+    def storage_dir(self, job_id, name):
+        path = os.path.join(self.app.config['JOB_STORAGE_DIR'], job_id, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def submit(self, kind, params, created_by=None, job_id=None):
+        _, max_attempts = JOB_HANDLERS[kind]
+        # 只读接口（read_replica）也可提交任务：提交后本请求的读写（返回任务状态、inline 模式下的认领与执行）
+        # 都须使用主库，副本可能尚未复制到新任务
+        if has_app_context():
+            g.use_replica = False
+        job = Job(
+            id=job_id or new_job_id(),
+            kind=kind,
+            status='queued',
+            params=params,
+            max_attempts=max_attempts,
+            created_by=created_by,
+            run_after=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.commit()
+        self.dispatch(job.id)
+        return job
+
+    def dispatch(self, job_id, delay=0):
+        backend = self.app.config['JOB_BACKEND']
+        if backend == 'celery':
+            self.celery_task.apply_async((job_id,), countdown=delay)
+        elif backend == 'inline':
+            if not delay and self.claim(job_id):
+                self.execute(job_id)
+        else:
+            self.wakeup.set()
+
+    def cancel(self, job_id):
+        # 排队中的任务直接取消；运行中的任务设置取消标记，由处理函数在下一个取消点结束
+        now = datetime.utcnow()
+        queued = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+                status='cancelled', cancel_requested=True, finished_at=now
+            )
+        ).rowcount
+        db.session.execute(update(Job).where(Job.id == job_id, Job.status == 'running').values(cancel_requested=True))
+        db.session.commit()
+        if queued:
+            shutil.rmtree(os.path.join(self.app.config['JOB_STORAGE_DIR'], job_id, 'input'), ignore_errors=True)
+
+    # ---- 认领与执行 ----
+
+    def claimable(self, now):
+        stale = now - timedelta(seconds=self.app.config['JOB_STALE_SECONDS'])
+        return or_(
+            and_(Job.status == 'queued', Job.run_after <= now),
+            and_(Job.status == 'running', Job.heartbeat_at < stale)
+        )
+
+    def claim(self, job_id):
+        # 条件更新保证同一任务只被一个工作线程 / worker 认领
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, self.claimable(now)).values(
+                status='running', attempts=Job.attempts + 1, started_at=now, heartbeat_at=now
+            )
+        ).rowcount
+        db.session.commit()
+        return claimed == 1
+
+    def claim_next(self):
+        candidates = db.session.execute(
+            select(Job.id).where(self.claimable(datetime.utcnow())).order_by(Job.run_after).limit(10)
+        ).scalars().all()
+        db.session.commit()
+        for job_id in candidates:
+            if self.claim(job_id):
+                return job_id
+        return None
+
+    def execute(self, job_id):
+        job = db.session.get(Job, job_id)
+        handler, _ = JOB_HANDLERS.get(job.kind, (None, None))
+        if job.cancel_requested:
+            return self.finish(job_id, 'cancelled')
+        if handler is None:
+            return self.finish(job_id, 'failed', error=f'未知的任务类型: {job.kind}')
+        if job.attempts > job.max_attempts:
+            return self.finish(job_id, 'failed', error=job.error or '任务进程退出，已达到最大执行次数')
+        params = dict(job.params or {})
+        db.session.commit()
+
+        context = JobContext(self, job_id)
+        with self.lock:
+            self.active.add(job_id)
+        try:
+            result = handler(context, **params)
+        except JobCancelled as e:
+            db.session.rollback()
+            self.finish(job_id, 'cancelled', result=e.args[0] if e.args else None, progress=context.values)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('任务 %s (%s) 执行失败', job_id, job.kind)
+            self.retry_or_fail(job_id, e, context)
+        else:
+            self.finish(job_id, 'succeeded', result=result, progress=context.values)
+        finally:
+            with self.lock:
+                self.active.discard(job_id)
+
+    def retry_or_fail(self, job_id, error, context):
+        job = db.session.get(Job, job_id)
+        if job.attempts < job.max_attempts and not job.cancel_requested:
+            delay = self.app.config['JOB_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            job.error = str(error)
+            if context.values:
+                job.progress = dict(context.values)
+            db.session.commit()
+            self.dispatch(job_id, delay)
+        else:
+            self.finish(job_id, 'failed', error=str(error), progress=context.values)
+
+    def finish(self, job_id, status, result=None, error=None, progress=None):
+        values = {'status': status, 'result': result, 'error': error, 'finished_at': datetime.utcnow()}
+        if progress:
+            values['progress'] = dict(progress)
+        db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.session.commit()
+        # 上传的导入文件在任务结束后删除，导出结果保留 JOB_RESULT_TTL 秒供下载
+        shutil.rmtree(os.path.join(self.app.config['JOB_STORAGE_DIR'], job_id, 'input'), ignore_errors=True)
+
+    # ---- 工作线程 ----
+
+    def ensure_started(self):
+        # 在当前进程首个请求时启动工作线程；Gunicorn fork 出的每个 worker 进程各自启动
+        if self.workers_pid == os.getpid():
+            return
+        with self.lock:
+            if self.workers_pid == os.getpid():
+                return
+            self.workers_pid = os.getpid()
+        self.start(self.app.config['JOB_WORKERS'])
+
+    def ensure_heartbeat(self):
+        if self.heartbeat_pid == os.getpid():
+            return
+        with self.lock:
+            if self.heartbeat_pid == os.getpid():
+                return
+            self.heartbeat_pid = os.getpid()
+        threading.Thread(target=self.heartbeat, name='job-heartbeat', daemon=True).start()
+
+    def start(self, workers, stop_event=None):
+        self.ensure_heartbeat()
+        threads = [
+            threading.Thread(target=self.work, args=(stop_event,), name=f'job-worker-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def work(self, stop_event=None):
+        while stop_event is None or not stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    job_id = self.claim_next()
+                    if job_id is not None:
+                        self.execute(job_id)
+                        continue
+            except Exception:
+                logger.exception('任务轮询失败')
+            self.wakeup.wait(self.app.config['JOB_POLL_INTERVAL'])
+            self.wakeup.clear()
+
+    def heartbeat(self):
+        # 执行中的任务定期刷新心跳，长时间没有进度回调的任务也不会被判定为进程退出
+        table = Job.__table__
+        last_purge = 0.0
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self.lock:
+                job_ids = list(self.active)
+            try:
+                with self.app.app_context():
+                    if job_ids:
+                        with db.engine.begin() as connection:
+                            connection.execute(update(table).where(
+                                table.c.id.in_(job_ids), table.c.status == 'running'
+                            ).values(heartbeat_at=datetime.utcnow()))
+                    if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                        last_purge = time.monotonic()
+                        self.purge_files()
+            except OperationalError:
+                # SQLite 写锁被任务事务占用时跳过本次，下一轮再写
+                pass
+            except Exception:
+                logger.exception('任务心跳失败')
+
+    def purge_files(self):
+        root = self.app.config['JOB_STORAGE_DIR']
+        if not os.path.isdir(root):
+            return
+        names = os.listdir(root)
+        if not names:
+            return
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['JOB_RESULT_TTL'])
+        expired = db.session.execute(
+            select(Job.id).where(Job.id.in_(names), Job.status.in_(FINISHED_STATUSES), Job.finished_at < cutoff)
+        ).scalars().all()
+        db.session.commit()
+        for job_id in expired:
+            shutil.rmtree(os.path.join(root, job_id), ignore_errors=True)
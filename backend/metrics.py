@@ -0,0 +1,180 @@
+import hmac
+import os
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request
+
+# 请求埋点：各路由的耗时直方图、进行中请求数、每个请求的下游调用（SQL 语句 / Supabase 请求）数与耗时；
+# 慢请求和 5xx 响应写日志并附带调用明细；registry.render() 输出 Prometheus 文本格式（/api/metrics）。
+# 本模块不依赖 SQLAlchemy，Vercel 函数（deploy/vercel/api/index.py）同样使用；SQL 语句埋点见 database.instrument_engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CALL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+# 超过该耗时（毫秒）的请求写 warning 日志
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+
+# 慢请求日志中列出的语句数
+SLOW_LOG_STATEMENTS = 5
+
+
+def check_metrics_token(authorization):
+    # /api/metrics 的访问控制，两个后端共用：未设置 METRICS_TOKEN 时接口关闭，返回 (404, 提示)；
+    # 令牌不符返回 (401, 提示)；通过时返回 None。令牌按常量时间比较
+    token = os.environ.get('METRICS_TOKEN')
+    if not token:
+        return 404, '指标接口未启用'
+    if not hmac.compare_digest((authorization or '').encode(), f'Bearer {token}'.encode()):
+        return 401, '无权访问指标'
+    return None
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in pairs) + '}'
+
+
+class MetricsRegistry:
+    # 进程内指标：counter / gauge / histogram，标签为 ((名称, 值), ...) 元组
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text, buckets=None):
+        with self._lock:
+            self._metrics.setdefault(name, {'kind': kind, 'help': help_text, 'buckets': buckets, 'samples': {}})
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            samples = self._metrics[name]['samples']
+            samples[labels] = samples.get(labels, 0) + value
+
+    def set(self, name, labels, value):
+        # gauge 直接取值；也用于按累计值导出的外部计数（如缓存命中次数）
+        with self._lock:
+            self._metrics[name]['samples'][labels] = value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            metric = self._metrics[name]
+            sample = metric['samples'].get(labels)
+            if sample is None:
+                sample = metric['samples'][labels] = {'buckets': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    sample['buckets'][index] += 1
+            sample['sum'] += value
+            sample['count'] += 1
+
+    def total(self, name, **labels):
+        # 标签匹配的样本之和（直方图取观测次数），供基准脚本等读取
+        with self._lock:
+            result = 0
+            for sample_labels, sample in self._metrics[name]['samples'].items():
+                if all(dict(sample_labels).get(key) == value for key, value in labels.items()):
+                    result += sample['count'] if isinstance(sample, dict) else sample
+            return result
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                lines.append(f'# HELP {name} {metric["help"]}')
+                lines.append(f'# TYPE {name} {metric["kind"]}')
+                for labels, sample in sorted(metric['samples'].items()):
+                    if metric['kind'] != 'histogram':
+                        lines.append(f'{name}{format_labels(labels)} {sample}')
+                        continue
+                    for bound, count in zip(metric['buckets'], sample['buckets']):
+                        lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {count}')
+                    lines.append(f'{name}_bucket{format_labels(labels, [("le", "+Inf")])} {sample["count"]}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {sample["sum"]}')
+                    lines.append(f'{name}_count{format_labels(labels)} {sample["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def current_route():
+    # 路由模板（如 /api/vehicles/<int:vehicle_id>）作为标签，避免按具体URL产生大量序列；请求之外记为 none
+    if not has_app_context() or g.get('request_started') is None:
+        return 'none'
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+class RequestMetrics:
+    # call_metric：每个请求内下游调用的指标名前缀，如 db_queries（SQL 语句）
+    def __init__(self, call_metric='db_queries', call_help='SQL语句', slow_request_ms=SLOW_REQUEST_MS):
+        self.call_metric = call_metric
+        self.slow_request_ms = slow_request_ms
+        self.registry = MetricsRegistry()
+        self.registry.describe('http_requests_total', 'counter', '请求数')
+        self.registry.describe('http_request_duration_seconds', 'histogram', '请求耗时（秒）', LATENCY_BUCKETS)
+        self.registry.describe('http_requests_in_flight', 'gauge', '正在处理的请求数')
+        self.registry.describe(f'{call_metric}_total', 'counter', f'{call_help}数')
+        self.registry.describe(f'{call_metric}_duration_seconds', 'histogram', f'{call_help}耗时（秒）', LATENCY_BUCKETS)
+        self.registry.describe(f'http_request_{call_metric}', 'histogram', f'每个请求的{call_help}数', CALL_COUNT_BUCKETS)
+        self.registry.inc('http_requests_in_flight', (), 0)
+
+    def init_app(self, app):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def record_call(self, description, seconds, **labels):
+        route = current_route()
+        self.registry.inc(f'{self.call_metric}_total', (('route', route),) + tuple(sorted(labels.items())))
+        self.registry.observe(f'{self.call_metric}_duration_seconds', (('route', route),), seconds)
+        if route != 'none':
+            g.request_calls.append((description, seconds))
+
+    def before_request(self):
+        g.request_started = time.perf_counter()
+        g.request_calls = []
+        self.registry.inc('http_requests_in_flight', (), 1)
+
+    def after_request(self, response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = current_route()
+        calls = g.request_calls
+        self.registry.inc('http_requests_total', (('method', request.method), ('route', route), ('status', response.status_code)))
+        self.registry.observe('http_request_duration_seconds', (('method', request.method), ('route', route)), elapsed)
+        self.registry.observe(f'http_request_{self.call_metric}', (('route', route),), len(calls))
+
+        if elapsed * 1000 >= self.slow_request_ms or response.status_code >= 500:
+            self.log_request(response, route, elapsed, calls)
+        return response
+
+    def teardown_request(self, exc=None):
+        if g.pop('request_started', None) is not None:
+            self.registry.inc('http_requests_in_flight', (), -1)
+
+    def log_request(self, response, route, elapsed, calls):
+        # 按语句归并：次数、累计耗时，耗时最多的排在前面
+        grouped = {}
+        for description, seconds in calls:
+            count, total = grouped.get(description, (0, 0.0))
+            grouped[description] = (count + 1, total + seconds)
+        breakdown = '; '.join(
+            f'{count}x {total * 1000:.1f}ms {description}'
+            for description, (count, total) in sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:SLOW_LOG_STATEMENTS]
+        )
+        message = ''
+        if response.status_code >= 500 and not response.is_streamed:
+            body = response.get_json(silent=True)
+            message = f' message={body.get("message")!r}' if isinstance(body, dict) else ''
+        current_app.logger.warning(
+            '%s %s %s %.1fms status=%s %s=%d (%.1fms)%s | %s',
+            '慢请求' if elapsed * 1000 >= self.slow_request_ms else '请求失败',
+            request.method, route, elapsed * 1000, response.status_code, self.call_metric,
+            len(calls), sum(seconds for _, seconds in calls) * 1000, message, breakdown
+        )
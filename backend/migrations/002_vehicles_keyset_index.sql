@@ -0,0 +1,5 @@
+-- 数据整合平台 - 车辆列表游标分页索引
+-- 创建时间: 2025-08-08
+
+-- 游标分页按 (created_at, id) 倒序扫描，复合索引使每页查询只读取 limit+1 行
+CREATE INDEX IF NOT EXISTS idx_vehicles_created_at_id ON vehicles(created_at DESC, id DESC);
@@ -0,0 +1,59 @@
+-- 数据整合平台 - 车辆关键词 trigram 检索
+-- 创建时间: 2025-08-08
+
+-- 启用 pg_trgm 扩展
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- GIN trigram 索引：ILIKE '%kw%' 子串匹配可走索引，不再全表扫描
+CREATE INDEX IF NOT EXISTS idx_vehicles_license_plate_trgm ON vehicles USING gin (license_plate gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_vehicles_vehicle_type_trgm ON vehicles USING gin (vehicle_type gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_vehicles_driver_name_trgm ON vehicles USING gin (driver_name gin_trgm_ops);
+
+-- 车辆检索函数：按相似度排序，并通过窗口函数在同一次查询中返回总数
+CREATE OR REPLACE FUNCTION search_vehicles(keyword TEXT, result_limit INTEGER DEFAULT 20, result_offset INTEGER DEFAULT 0)
+RETURNS TABLE (
+    id UUID,
+    license_plate VARCHAR,
+    vehicle_type VARCHAR,
+    fleet_id UUID,
+    fleet_name VARCHAR,
+    driver_name VARCHAR,
+    driver_phone VARCHAR,
+    status VARCHAR,
+    remark TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    rank REAL,
+    total_count BIGINT
+)
+LANGUAGE sql STABLE AS $$
+    WITH pattern AS (
+        SELECT '%' || replace(replace(replace(keyword, '\', '\\'), '%', '\%'), '_', '\_') || '%' AS value
+    )
+    SELECT
+        v.id,
+        v.license_plate,
+        v.vehicle_type,
+        v.fleet_id,
+        f.name AS fleet_name,
+        v.driver_name,
+        v.driver_phone,
+        v.status,
+        v.remark,
+        v.created_at,
+        greatest(
+            similarity(v.license_plate, keyword),
+            similarity(coalesce(v.vehicle_type, ''), keyword),
+            similarity(coalesce(v.driver_name, ''), keyword)
+        ) AS rank,
+        count(*) OVER () AS total_count
+    FROM vehicles v
+    CROSS JOIN pattern p
+    LEFT JOIN fleets f ON f.id = v.fleet_id
+    WHERE v.license_plate ILIKE p.value
+       OR v.vehicle_type ILIKE p.value
+       OR v.driver_name ILIKE p.value
+    ORDER BY rank DESC, v.created_at DESC, v.id DESC
+    LIMIT result_limit OFFSET result_offset;
+$$;
+
+COMMENT ON FUNCTION search_vehicles(TEXT, INTEGER, INTEGER) IS '车辆关键词检索 - trigram 索引匹配并按相似度排序';
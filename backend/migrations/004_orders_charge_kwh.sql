@@ -0,0 +1,7 @@
+-- 数据整合平台 - 订单充电量
+-- 创建时间: 2025-08-08
+
+-- 结算金额按 充电量 * 计价规则单价 计算，平台导出的充电量随订单入库
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS charge_kwh DECIMAL(10,3);
+
+COMMENT ON COLUMN orders.charge_kwh IS '充电量 (kWh)';
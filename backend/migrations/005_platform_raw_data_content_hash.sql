@@ -0,0 +1,26 @@
+-- 数据整合平台 - 平台原始数据内容哈希去重与压缩
+-- 创建时间: 2025-08-08
+
+-- 导入程序按内容哈希（平台ID + 规范化 JSON 的 SHA-256 前 128 位）写入，重复上传的行直接跳过；
+-- 较大的记录 zlib 压缩后存入 raw_compressed，此时 raw_data 为空
+ALTER TABLE platform_raw_data ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32);
+ALTER TABLE platform_raw_data ADD COLUMN IF NOT EXISTS raw_compressed BYTEA;
+ALTER TABLE platform_raw_data ALTER COLUMN raw_data DROP NOT NULL;
+
+-- 已有的重复记录（同一平台、内容相同）只保留最早导入的一条
+DELETE FROM platform_raw_data
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY platform_id, md5(raw_data::text) ORDER BY imported_at, id
+        ) AS rn
+        FROM platform_raw_data
+        WHERE raw_data IS NOT NULL
+    ) ranked
+    WHERE rn > 1
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_platform_raw_data_content_hash ON platform_raw_data(content_hash);
+
+COMMENT ON COLUMN platform_raw_data.content_hash IS '原始记录内容哈希';
+COMMENT ON COLUMN platform_raw_data.raw_compressed IS 'zlib 压缩的原始记录 (UTF-8 JSON)';
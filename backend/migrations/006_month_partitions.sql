@@ -0,0 +1,271 @@
+-- 数据整合平台 - 订单与平台原始数据按月分区
+-- 创建时间: 2025-08-08
+
+-- orders 按 order_time、platform_raw_data 按 imported_at 做月度范围分区：
+-- 带时间范围的查询（订单列表、月结、对账）只扫描涉及的月份分区，耗时与保留多少年历史无关；
+-- 历史月份可整块分离后归档或删除，不需要大批量 DELETE。
+-- 分区边界按数据库时区（Supabase 默认 UTC）的自然月划分。
+--
+-- 分区表的主键和唯一约束必须包含分区键：
+--   orders 主键改为 (id, order_time)，订单号唯一约束改为 (order_no, order_time)，
+--     同一订单重复导入时订单时间相同，仍会冲突；
+--   platform_raw_data 的内容哈希去重改由未分区的 platform_raw_data_keys 表保证；
+--   platform_raw_data.order_id 不再是外键（引用分区表须包含其分区键），按索引关联。
+
+BEGIN;
+
+-- 分区键列名
+CREATE OR REPLACE FUNCTION partition_key_column(parent REGCLASS)
+RETURNS TEXT
+LANGUAGE sql STABLE AS $$
+    SELECT a.attname::text
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = parent;
+$$;
+
+-- 创建 from_month 起连续 months 个月的分区 <表名>_YYYYMM，已存在的跳过，返回新建数量。
+-- 默认分区中已有该月数据时，先建独立表并把数据移入，再挂载为分区
+CREATE OR REPLACE FUNCTION create_month_partitions(parent REGCLASS, from_month DATE, months INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    default_partition REGCLASS := to_regclass(parent::text || '_default');
+    key_column TEXT := partition_key_column(parent);
+    month_start DATE := date_trunc('month', from_month)::date;
+    month_end DATE;
+    partition_name TEXT;
+    has_rows BOOLEAN;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 1 .. months LOOP
+        month_end := (month_start + INTERVAL '1 month')::date;
+        partition_name := parent::text || '_' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            has_rows := FALSE;
+            IF default_partition IS NOT NULL THEN
+                EXECUTE format(
+                    'SELECT EXISTS (SELECT 1 FROM %s WHERE %I >= %L AND %I < %L)',
+                    default_partition, key_column, month_start, key_column, month_end
+                ) INTO has_rows;
+            END IF;
+
+            IF has_rows THEN
+                EXECUTE format('CREATE TABLE %I (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name, parent);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %s WHERE %I >= %L AND %I < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                    default_partition, key_column, month_start, key_column, month_end, partition_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE %s ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    parent, partition_name, month_start, month_end
+                );
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, parent, month_start, month_end
+                );
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- 预建当月及之后 months_ahead 个月的分区，并把默认分区中的数据（导入了预建范围之外的订单）拆到各自月份；
+-- 由 pg_cron 每日执行，或由后端 flask ensure-partitions 执行
+CREATE OR REPLACE FUNCTION ensure_month_partitions(parent REGCLASS, months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    default_partition REGCLASS := to_regclass(parent::text || '_default');
+    pending DATE;
+    created INTEGER := 0;
+BEGIN
+    IF default_partition IS NOT NULL THEN
+        FOR pending IN EXECUTE format(
+            'SELECT DISTINCT date_trunc(''month'', %I)::date FROM %s',
+            partition_key_column(parent), default_partition
+        ) LOOP
+            created := created + create_month_partitions(parent, pending, 1);
+        END LOOP;
+    END IF;
+    RETURN created + create_month_partitions(parent, date_trunc('month', now())::date, months_ahead + 1);
+END;
+$$;
+
+-- 分离 before_month 之前的月分区（默认分区除外），返回分离的分区名；
+-- 分离后的表可 pg_dump 归档，drop_detached 为真时直接删除
+CREATE OR REPLACE FUNCTION detach_month_partitions(parent REGCLASS, before_month DATE, drop_detached BOOLEAN DEFAULT FALSE)
+RETURNS SETOF TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    child REGCLASS;
+BEGIN
+    FOR child IN
+        SELECT c.oid::regclass
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent
+          AND c.relname ~ '_[0-9]{6}$'
+          AND to_date(right(c.relname, 6), 'YYYYMM') < date_trunc('month', before_month)
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %s DETACH PARTITION %s', parent, child);
+        IF drop_detached THEN
+            EXECUTE format('DROP TABLE %s', child);
+        END IF;
+        RETURN NEXT child::text;
+    END LOOP;
+END;
+$$;
+
+-- ---- orders ----
+
+ALTER TABLE platform_raw_data DROP CONSTRAINT IF EXISTS platform_raw_data_order_id_fkey;
+ALTER TABLE orders RENAME TO orders_unpartitioned;
+ALTER TABLE orders_unpartitioned DROP CONSTRAINT IF EXISTS orders_pkey;
+ALTER TABLE orders_unpartitioned DROP CONSTRAINT IF EXISTS orders_order_no_key;
+DROP INDEX IF EXISTS idx_orders_order_no, idx_orders_vehicle_id, idx_orders_station_id,
+    idx_orders_platform_id, idx_orders_order_time, idx_orders_status;
+
+CREATE TABLE orders (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    order_no VARCHAR(50) NOT NULL,
+    vehicle_id UUID REFERENCES vehicles(id) ON DELETE SET NULL,
+    station_id UUID REFERENCES stations(id) ON DELETE SET NULL,
+    platform_id INTEGER NOT NULL CHECK (platform_id BETWEEN 1 AND 11),
+    amount DECIMAL(10,2) NOT NULL,
+    settlement_amount DECIMAL(10,2),
+    charge_kwh DECIMAL(10,3),
+    order_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'completed', 'cancelled')),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, order_time),
+    UNIQUE (order_no, order_time)
+) PARTITION BY RANGE (order_time);
+
+-- 默认分区只承接预建范围之外的订单，ensure_month_partitions 会将其拆到各自月份
+CREATE TABLE orders_default PARTITION OF orders DEFAULT;
+
+SELECT create_month_partitions('orders', month_start, 1)
+FROM (SELECT DISTINCT date_trunc('month', order_time)::date AS month_start FROM orders_unpartitioned) months;
+SELECT ensure_month_partitions('orders', 3);
+
+INSERT INTO orders (id, order_no, vehicle_id, station_id, platform_id, amount, settlement_amount, charge_kwh, order_time, status, created_at)
+SELECT id, order_no, vehicle_id, station_id, platform_id, amount, settlement_amount, charge_kwh, order_time, status, created_at
+FROM orders_unpartitioned;
+
+DROP TABLE orders_unpartitioned;
+
+-- 索引建在父表上，自动应用到每个分区；(platform_id, order_time) 覆盖按平台的月度查询，不再单独索引 platform_id
+CREATE INDEX idx_orders_platform_id_order_time ON orders(platform_id, order_time);
+CREATE INDEX idx_orders_order_time ON orders(order_time);
+CREATE INDEX idx_orders_order_no ON orders(order_no);
+CREATE INDEX idx_orders_vehicle_id ON orders(vehicle_id);
+CREATE INDEX idx_orders_station_id ON orders(station_id);
+CREATE INDEX idx_orders_status ON orders(status);
+
+ALTER TABLE orders ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow authenticated users to view all data" ON orders FOR SELECT USING (auth.role() = 'authenticated');
+CREATE POLICY "Allow authenticated users to insert" ON orders FOR INSERT WITH CHECK (auth.role() = 'authenticated');
+CREATE POLICY "Allow authenticated users to update" ON orders FOR UPDATE USING (auth.role() = 'authenticated');
+CREATE POLICY "Allow authenticated users to delete" ON orders FOR DELETE USING (auth.role() = 'authenticated');
+
+-- ---- platform_raw_data ----
+
+ALTER TABLE platform_raw_data RENAME TO platform_raw_data_unpartitioned;
+ALTER TABLE platform_raw_data_unpartitioned DROP CONSTRAINT IF EXISTS platform_raw_data_pkey;
+DROP INDEX IF EXISTS idx_platform_raw_data_platform_id, idx_platform_raw_data_order_id, idx_platform_raw_data_content_hash;
+
+CREATE TABLE platform_raw_data (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    platform_id INTEGER NOT NULL CHECK (platform_id BETWEEN 1 AND 11),
+    content_hash VARCHAR(32),
+    raw_data JSONB,
+    raw_compressed BYTEA,
+    order_id UUID,
+    imported_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, imported_at)
+) PARTITION BY RANGE (imported_at);
+
+CREATE TABLE platform_raw_data_default PARTITION OF platform_raw_data DEFAULT;
+
+SELECT create_month_partitions('platform_raw_data', month_start, 1)
+FROM (
+    SELECT DISTINCT date_trunc('month', coalesce(imported_at, now()))::date AS month_start
+    FROM platform_raw_data_unpartitioned
+) months;
+SELECT ensure_month_partitions('platform_raw_data', 3);
+
+INSERT INTO platform_raw_data (id, platform_id, content_hash, raw_data, raw_compressed, order_id, imported_at)
+SELECT id, platform_id, content_hash, raw_data, raw_compressed, order_id, coalesce(imported_at, now())
+FROM platform_raw_data_unpartitioned;
+
+DROP TABLE platform_raw_data_unpartitioned;
+
+CREATE INDEX idx_platform_raw_data_platform_id ON platform_raw_data(platform_id);
+CREATE INDEX idx_platform_raw_data_order_id ON platform_raw_data(order_id);
+
+-- 内容哈希全局唯一：分区表的唯一索引须包含 imported_at，无法跨月去重，改由键表保证。
+-- 分离或删除历史分区时键保留，已归档月份的数据重复上传仍会被跳过；
+-- 需要允许重新导入时删除对应的键：DELETE FROM platform_raw_data_keys WHERE imported_at < '...'
+CREATE TABLE platform_raw_data_keys (
+    content_hash VARCHAR(32) PRIMARY KEY,
+    imported_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+CREATE INDEX idx_platform_raw_data_keys_imported_at ON platform_raw_data_keys(imported_at);
+
+INSERT INTO platform_raw_data_keys (content_hash, imported_at)
+SELECT content_hash, min(imported_at)
+FROM platform_raw_data
+WHERE content_hash IS NOT NULL
+GROUP BY content_hash;
+
+-- 写入前登记内容哈希，已登记的行直接跳过（与 ON CONFLICT DO NOTHING 等效）
+CREATE OR REPLACE FUNCTION platform_raw_data_dedupe()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.content_hash IS NULL THEN
+        RETURN NEW;
+    END IF;
+    INSERT INTO platform_raw_data_keys (content_hash, imported_at)
+    VALUES (NEW.content_hash, NEW.imported_at)
+    ON CONFLICT (content_hash) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER platform_raw_data_dedupe BEFORE INSERT ON platform_raw_data
+    FOR EACH ROW EXECUTE FUNCTION platform_raw_data_dedupe();
+
+ALTER TABLE platform_raw_data ENABLE ROW LEVEL SECURITY;
+ALTER TABLE platform_raw_data_keys ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow authenticated users to view all data" ON platform_raw_data FOR SELECT USING (auth.role() = 'authenticated');
+
+COMMIT;
+
+-- 自动预建分区：安装了 pg_cron 时每天 03:00 执行，否则由后端定时执行 flask ensure-partitions
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'ensure-month-partitions',
+            '0 3 * * *',
+            $cron$SELECT ensure_month_partitions('orders', 3); SELECT ensure_month_partitions('platform_raw_data', 3);$cron$
+        );
+    END IF;
+END;
+$$;
+
+COMMENT ON TABLE orders IS '订单表 - 存储充电订单信息（按 order_time 月分区）';
+COMMENT ON TABLE platform_raw_data IS '平台原始数据表 - 存储各平台的原始数据（按 imported_at 月分区）';
+COMMENT ON TABLE platform_raw_data_keys IS '平台原始数据内容哈希 - 跨分区去重';
+COMMENT ON FUNCTION ensure_month_partitions(REGCLASS, INTEGER) IS '预建后续月份分区并拆分默认分区';
+COMMENT ON FUNCTION detach_month_partitions(REGCLASS, DATE, BOOLEAN) IS '分离历史月份分区供归档';
@@ -0,0 +1,16 @@
+-- 数据整合平台 - 订单记录车队归属
+-- 创建时间: 2025-08-08
+
+-- 导入时写入车辆当时所属的车队，车队余额、仪表盘汇总、重新结算和余额校验都按此归属，
+-- 车辆之后改派车队或被删除不影响已导入订单的归属
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS fleet_id UUID REFERENCES fleets(id);
+
+-- 已有订单按车辆当前所属车队回填（导入时的归属未记录）
+UPDATE orders o
+SET fleet_id = v.fleet_id
+FROM vehicles v
+WHERE v.id = o.vehicle_id AND o.fleet_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_orders_fleet_id_order_time ON orders(fleet_id, order_time);
+
+COMMENT ON COLUMN orders.fleet_id IS '导入时车辆所属车队';
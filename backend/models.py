@@ -0,0 +1,363 @@
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime
+import json
+import unicodedata
+import zlib
+
+from database import RoutingSession
+from passwords import PASSWORD_HASH_METHOD
+
+# 数据库实例（在 app.py 中通过 init_app 绑定应用）；只读接口可路由到副本，见 database.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# 用户模型
+class User(db.Model):
+    __tablename__ = 'users'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    role = db.Column(db.String(20), default='user')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+    
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'role': self.role,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# 车队模型
+class Fleet(db.Model):
+    __tablename__ = 'fleets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    contact_person = db.Column(db.String(50))
+    contact_phone = db.Column(db.String(20))
+    status = db.Column(db.String(20), default='active')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'contact_person': self.contact_person,
+            'contact_phone': self.contact_phone,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# 车牌中常见的分隔符，如 京A·12345、京A-12345
+PLATE_SEPARATORS = str.maketrans('', '', ' \t·•・.-_')
+
+def normalize_plate(value):
+    # 车牌规范化：全角转半角、字母大写、去掉空格和分隔点，用于前缀联想
+    return unicodedata.normalize('NFKC', value).translate(PLATE_SEPARATORS).upper()
+
+def plate_key_default(context):
+    return normalize_plate(context.get_current_parameters()['plate_number'])
+
+# 车辆模型
+class Vehicle(db.Model):
+    __tablename__ = 'vehicles'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    plate_number = db.Column(db.String(20), unique=True, nullable=False)
+    # 规范化车牌（normalize_plate），写入时按 plate_number 自动生成，车牌联想按此列前缀查询
+    plate_key = db.Column(db.String(20), default=plate_key_default)
+    vehicle_type = db.Column(db.String(50), nullable=False)
+    fleet_id = db.Column(db.Integer, db.ForeignKey('fleets.id'), nullable=False)
+    driver_name = db.Column(db.String(50))
+    driver_phone = db.Column(db.String(20))
+    status = db.Column(db.String(20), default='normal')
+    remark = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 关联关系
+    fleet = db.relationship('Fleet', backref=db.backref('vehicles', lazy=True))
+    
+    # 游标分页使用的复合索引
+    __table_args__ = (
+        db.Index('idx_vehicles_created_at_id', 'created_at', 'id'),
+        db.Index('idx_vehicles_plate_key', 'plate_key'),
+        # 车牌联想索引按 updated_at 增量同步
+        db.Index('idx_vehicles_updated_at', 'updated_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'plate_number': self.plate_number,
+            'vehicle_type': self.vehicle_type,
+            'fleet_id': self.fleet_id,
+            'fleet_name': self.fleet.name if self.fleet else None,
+            'driver_name': self.driver_name,
+            'driver_phone': self.driver_phone,
+            'status': self.status,
+            'remark': self.remark,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# 站点模型
+class Station(db.Model):
+    __tablename__ = 'stations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, index=True)
+    address = db.Column(db.Text)
+    region = db.Column(db.String(50))
+    status = db.Column(db.String(20), default='active')
+    charging_piles = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'address': self.address,
+            'region': self.region,
+            'status': self.status,
+            'charging_piles': self.charging_piles,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# 订单模型
+class Order(db.Model):
+    __tablename__ = 'orders'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_no = db.Column(db.String(50), unique=True, nullable=False)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='SET NULL'), index=True)
+    station_id = db.Column(db.Integer, db.ForeignKey('stations.id', ondelete='SET NULL'), index=True)
+    platform_id = db.Column(db.Integer, nullable=False)
+    # 导入时车辆所属的车队：余额、仪表盘汇总和重新结算都按此归属，车辆改派车队或删除后不变
+    fleet_id = db.Column(db.Integer, db.ForeignKey('fleets.id'))
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    settlement_amount = db.Column(db.Numeric(10, 2))
+    charge_kwh = db.Column(db.Numeric(10, 3))
+    order_time = db.Column(db.DateTime, nullable=False, index=True)
+    status = db.Column(db.String(20), default='pending')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 按平台的时间范围查询（订单列表、对账）走复合索引，前缀同时覆盖只按平台过滤
+    __table_args__ = (
+        db.Index('idx_orders_platform_id_order_time', 'platform_id', 'order_time'),
+        db.Index('idx_orders_fleet_id_order_time', 'fleet_id', 'order_time'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_no': self.order_no,
+            'vehicle_id': self.vehicle_id,
+            'station_id': self.station_id,
+            'platform_id': self.platform_id,
+            'fleet_id': self.fleet_id,
+            'amount': str(self.amount) if self.amount is not None else None,
+            'settlement_amount': str(self.settlement_amount) if self.settlement_amount is not None else None,
+            'charge_kwh': str(self.charge_kwh) if self.charge_kwh is not None else None,
+            'order_time': self.order_time.isoformat() if self.order_time else None,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# 平台原始数据模型
+# 每行原始记录以内容哈希（平台ID + 规范化 JSON 的 SHA-256 前 128 位）唯一存储，重复导入直接跳过；
+# 较大的记录以 zlib 压缩后存入 raw_compressed，此时 raw_data 为空
+class PlatformRawData(db.Model):
+    __tablename__ = 'platform_raw_data'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    platform_id = db.Column(db.Integer, nullable=False, index=True)
+    content_hash = db.Column(db.String(32), unique=True)
+    raw_data = db.Column(db.JSON(none_as_null=True))
+    raw_compressed = db.Column(db.LargeBinary)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), index=True)
+    imported_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def payload(self):
+        if self.raw_compressed is not None:
+            return json.loads(zlib.decompress(self.raw_compressed))
+        return self.raw_data
+
+# 计价规则模型
+class PricingRule(db.Model):
+    __tablename__ = 'pricing_rules'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fleet_id = db.Column(db.Integer, db.ForeignKey('fleets.id', ondelete='CASCADE'), index=True)
+    time_period = db.Column(db.String(50), nullable=False)
+    price_per_kwh = db.Column(db.Numeric(8, 4), nullable=False)
+    effective_date = db.Column(db.Date, nullable=False, index=True)
+    expiry_date = db.Column(db.Date)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# 优惠规则模型
+class DiscountRule(db.Model):
+    __tablename__ = 'discount_rules'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fleet_id = db.Column(db.Integer, db.ForeignKey('fleets.id', ondelete='CASCADE'), index=True)
+    rule_type = db.Column(db.String(50), nullable=False)
+    discount_rate = db.Column(db.Numeric(5, 4), nullable=False)
+    min_amount = db.Column(db.Numeric(10, 2), default=0)
+    effective_date = db.Column(db.Date, nullable=False, index=True)
+    expiry_date = db.Column(db.Date)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# 充值记录模型
+class RechargeRecord(db.Model):
+    __tablename__ = 'recharge_records'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fleet_id = db.Column(db.Integer, db.ForeignKey('fleets.id', ondelete='CASCADE'), index=True)
+    amount = db.Column(db.Numeric(12, 2), nullable=False)
+    payment_method = db.Column(db.String(50))
+    recharge_time = db.Column(db.DateTime, nullable=False, index=True)
+    status = db.Column(db.String(20), default='completed', index=True)
+    remark = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'fleet_id': self.fleet_id,
+            'amount': str(self.amount) if self.amount is not None else None,
+            'payment_method': self.payment_method,
+            'recharge_time': self.recharge_time.isoformat() if self.recharge_time else None,
+            'status': self.status,
+            'remark': self.remark,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# 车队余额模型（按月累计，订单导入与充值时增量维护）
+class FleetBalance(db.Model):
+    __tablename__ = 'fleet_balance'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fleet_id = db.Column(db.Integer, db.ForeignKey('fleets.id', ondelete='CASCADE'), index=True)
+    previous_balance = db.Column(db.Numeric(12, 2), default=0)
+    monthly_consumption = db.Column(db.Numeric(12, 2), default=0)
+    monthly_recharge = db.Column(db.Numeric(12, 2), default=0)
+    current_balance = db.Column(db.Numeric(12, 2), default=0)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('fleet_id', 'year', 'month', name='uq_fleet_balance_fleet_year_month'),
+        db.Index('idx_fleet_balance_year_month', 'year', 'month'),
+    )
+
+# 车队余额历史模型（月结快照）
+class FleetBalanceHistory(db.Model):
+    __tablename__ = 'fleet_balance_history'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fleet_id = db.Column(db.Integer, db.ForeignKey('fleets.id', ondelete='CASCADE'), index=True)
+    previous_balance = db.Column(db.Numeric(12, 2), default=0)
+    monthly_consumption = db.Column(db.Numeric(12, 2), default=0)
+    monthly_recharge = db.Column(db.Numeric(12, 2), default=0)
+    current_balance = db.Column(db.Numeric(12, 2), default=0)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    settled_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_fleet_balance_history_year_month', 'year', 'month'),
+    )
+
+# 订单日汇总（日期 × 平台 × 站点 × 车队，订单导入与重新结算时增量维护，仪表盘统计只读汇总表）
+# 未关联站点或车队的订单记在 0 下，保证唯一键不含 NULL
+class OrderDailyStat(db.Model):
+    __tablename__ = 'order_daily_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    stat_date = db.Column(db.Date, nullable=False)
+    platform_id = db.Column(db.Integer, nullable=False)
+    station_id = db.Column(db.Integer, nullable=False, default=0)
+    fleet_id = db.Column(db.Integer, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    charge_kwh = db.Column(db.Numeric(14, 3), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'platform_id', 'station_id', 'fleet_id', name='uq_order_daily_stats_key'),
+    )
+
+# 充值日汇总（日期 × 车队，只计 completed 状态）
+class RechargeDailyStat(db.Model):
+    __tablename__ = 'recharge_daily_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    stat_date = db.Column(db.Date, nullable=False)
+    fleet_id = db.Column(db.Integer, nullable=False)
+    recharge_count = db.Column(db.Integer, nullable=False, default=0)
+    recharge_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'fleet_id', name='uq_recharge_daily_stats_key'),
+    )
+
+# 后台任务模型（导入、重新结算、月结、导出），状态与进度供 /api/jobs/<id> 轮询
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    # queued / running / succeeded / failed / cancelled
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    params = db.Column(db.JSON)
+    progress = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), index=True)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('idx_jobs_status_run_after', 'status', 'run_after'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
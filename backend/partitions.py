@@ -0,0 +1,54 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import text
+
+# 订单与平台原始数据的月度分区（PostgreSQL，由 migrations/006_month_partitions.sql 建立）：
+# 带时间范围的查询统一使用 order_time_bounds 生成的左闭右开边界，规划器只扫描涉及的月份分区；
+# SQLite / MySQL 不分区，同样的条件走 (platform_id, order_time) 复合索引。
+# 维护：ensure_partitions 预建后续月份分区并拆分默认分区，detach_partitions 分离历史月份供归档
+
+PARTITIONED_TABLES = ('orders', 'platform_raw_data')
+
+
+def order_time_bounds(start_date, end_date):
+    # [start_date, end_date]（含结束当天）-> [开始日 00:00, 结束次日 00:00)
+    return datetime.combine(start_date, time.min), datetime.combine(end_date + timedelta(days=1), time.min)
+
+
+def partitioned_tables(session):
+    # 已完成分区的表；非 PostgreSQL 或未执行迁移时为空
+    if session.get_bind().dialect.name != 'postgresql':
+        return []
+    return sorted(session.execute(
+        text(
+            'SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = ANY(:names)'
+        ),
+        {'names': list(PARTITIONED_TABLES)}
+    ).scalars())
+
+
+def ensure_partitions(session, months_ahead=3):
+    # 返回 {表名: 新建分区数}；应每天执行（未安装 pg_cron 时由 flask ensure-partitions 定时执行）
+    created = {
+        table: session.execute(
+            text('SELECT ensure_month_partitions(CAST(:table AS regclass), :months)'),
+            {'table': table, 'months': months_ahead}
+        ).scalar()
+        for table in partitioned_tables(session)
+    }
+    session.commit()
+    return created
+
+
+def detach_partitions(session, before_month, drop=False):
+    # 分离 before_month 所在月之前的分区，返回 {表名: [分区名]}；不删除时分离的表保留在库中，可 pg_dump 后再删除
+    detached = {
+        table: list(session.execute(
+            text('SELECT * FROM detach_month_partitions(CAST(:table AS regclass), :before, :drop)'),
+            {'table': table, 'before': before_month, 'drop': drop}
+        ).scalars())
+        for table in partitioned_tables(session)
+    }
+    session.commit()
+    return detached
@@ -0,0 +1,62 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# 密码哈希：在有界线程池中计算，限制同时占用的CPU核数；排队已满时直接拒绝，由路由返回 429
+#
+# PASSWORD_HASH_METHOD  werkzeug 哈希参数，如 scrypt:32768:8:1、pbkdf2:sha256:600000
+# PASSWORD_HASH_WORKERS 同时计算哈希的线程数，0 表示在请求线程内直接计算（不限流）
+# PASSWORD_HASH_QUEUE   线程全忙时允许排队的请求数
+# PASSWORD_HASH_TIMEOUT 等待结果的最长秒数
+
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=2, max_pending=16, timeout=10.0):
+        self.method = method
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password') if workers else None
+        self._slots = threading.BoundedSemaphore(workers + max_pending) if workers else None
+        self._prefix = None
+
+    def run(self, function, *args):
+        if self._executor is None:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(function, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy()
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self.run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # 存量哈希的算法或参数与当前配置不同（如旧的 pbkdf2）时，登录成功后按新参数重算
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+
+password_hasher = PasswordHasher(
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))),
+    max_pending=int(os.environ.get('PASSWORD_HASH_QUEUE', 16)),
+    timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+)
@@ -0,0 +1,256 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from array import array
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from models import Vehicle, db, normalize_plate
+
+# 车牌号前缀联想：每个进程在内存中维护按车牌排序的列表，前缀查询为二分查找 + 顺序截取，不访问数据库。
+#   keys      规范化后的车牌（normalize_plate），与车辆ID一起按 (key, id) 升序；规范化后相同的不同车牌各占一项
+#   plates    原始车牌，与规范化结果相同时引用同一对象
+#   ids       车辆ID / 车队ID，array 紧凑存储
+# 每辆车约占 120 字节，超过 VEHICLE_INDEX_MAX_SIZE 时不建索引，改为数据库前缀查询。
+# 索引在应用初始化时建好（Gunicorn --preload 时 fork 出的 worker 直接共享），本进程的车辆写入在提交后立即更新索引；
+# 其他进程的写入由后台线程每 VEHICLE_INDEX_REFRESH 秒增量同步：按 updated_at 读取新增和修改的车辆，
+# 车辆总数与索引不一致（其他进程删除了车辆）时才整体重建
+
+DEFAULT_LIMIT = 10
+
+MAX_LIMIT = 50
+
+# 一次删除的车辆数不超过该值时逐个原地删除，更多时一次遍历重建各列表
+REMOVE_IN_PLACE_MAX = 64
+
+# 增量同步回看的时长：updated_at 在写入时取值，提交较晚的事务在下一次同步时仍能读到
+SYNC_OVERLAP = timedelta(minutes=5)
+
+# 省份简称：前缀不以汉字开头时（如 A123）同时匹配以这些简称开头的车牌（京A123、粤A123）
+PROVINCES = '京津沪渝冀豫云辽黑湘皖鲁新苏浙赣鄂桂甘晋蒙陕吉闽贵粤青藏川宁琼'
+
+logger = logging.getLogger(__name__)
+
+
+def is_cjk(char):
+    return '\u4e00' <= char <= '\u9fff'
+
+
+def expand_prefix(key):
+    # 规范化前缀对应的查询前缀，内存索引与数据库查询共用
+    if not key or is_cjk(key[0]):
+        return [key]
+    return [key] + [province + key for province in PROVINCES]
+
+
+class PlateIndex:
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = threading.Lock()
+        self.ready = False
+        self.clear()
+        # 重建或同步期间本进程的写入，完成后重放，避免被期间读到的旧数据覆盖
+        self.pending = None
+        # 上次同步时数据库中最大的 updated_at
+        self.synced_at = None
+        self.syncer_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if app.config['VEHICLE_INDEX_MAX_SIZE'] <= 0:
+            return
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception as e:
+            # 如尚未建表：联想先查询数据库，由同步线程重试
+            logger.warning('车牌索引加载失败: %s', e)
+        app.before_request(self.ensure_syncing)
+
+    def clear(self):
+        self.keys = []
+        self.plates = []
+        self.vehicle_ids = array('q')
+        self.fleet_ids = array('q')
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ---- 加载与同步 ----
+
+    def ensure_syncing(self):
+        # 线程不随 fork 复制：每个进程首个请求时启动自己的同步线程
+        if self.syncer_pid == os.getpid():
+            return
+        with self.lock:
+            if self.syncer_pid == os.getpid():
+                return
+            self.syncer_pid = os.getpid()
+        threading.Thread(target=self.sync_loop, name='plate-index', daemon=True).start()
+
+    def sync_loop(self):
+        while True:
+            time.sleep(self.app.config['VEHICLE_INDEX_REFRESH'])
+            try:
+                with self.app.app_context():
+                    self.sync()
+            except Exception:
+                logger.exception('车牌索引同步失败')
+
+    def sync(self):
+        if not self.ready:
+            return self.rebuild()
+        with self.lock:
+            self.pending = []
+        try:
+            total, latest = db.session.execute(select(func.count(Vehicle.id), func.max(Vehicle.updated_at))).one()
+            query = select(Vehicle.id, Vehicle.plate_number, Vehicle.fleet_id)
+            if self.synced_at is not None:
+                query = query.where(Vehicle.updated_at >= self.synced_at - SYNC_OVERLAP)
+            rows = db.session.execute(query).all() if total <= self.app.config['VEHICLE_INDEX_MAX_SIZE'] else None
+            db.session.commit()
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+
+        with self.lock:
+            if rows is not None:
+                self._add(rows)
+            pending, self.pending = self.pending, None
+            for method, args in pending:
+                method(*args)
+            consistent = rows is not None and len(self.keys) == total
+            if consistent:
+                self.synced_at = latest or self.synced_at
+        return True if consistent else self.rebuild()
+
+    def rebuild(self):
+        with self.lock:
+            self.pending = []
+        try:
+            total, latest = db.session.execute(select(func.count(Vehicle.id), func.max(Vehicle.updated_at))).one()
+            if total > self.app.config['VEHICLE_INDEX_MAX_SIZE']:
+                with self.lock:
+                    self.ready = False
+                    self.pending = None
+                    self.clear()
+                return False
+            rows = sorted(
+                (normalize_plate(row.plate_number), row.id, row.plate_number, row.fleet_id)
+                for row in db.session.execute(
+                    select(Vehicle.plate_number, Vehicle.id, Vehicle.fleet_id).execution_options(yield_per=10000)
+                )
+            )
+            db.session.commit()
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+
+        keys, plates, vehicle_ids, fleet_ids = [], [], array('q'), array('q')
+        for key, vehicle_id, plate, fleet_id in rows:
+            keys.append(key)
+            plates.append(key if key == plate else plate)
+            vehicle_ids.append(vehicle_id)
+            fleet_ids.append(fleet_id)
+        del rows
+
+        with self.lock:
+            self.keys, self.plates, self.vehicle_ids, self.fleet_ids = keys, plates, vehicle_ids, fleet_ids
+            pending, self.pending = self.pending, None
+            for method, args in pending:
+                method(*args)
+            self.synced_at = latest
+            self.ready = True
+        return True
+
+    # ---- 写入同步 ----
+
+    def add(self, vehicles):
+        # vehicles: [(车辆ID, 车牌号, 车队ID)]，按车辆新增或覆盖
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((self._add, (vehicles,)))
+            if self.ready:
+                self._add(vehicles)
+
+    def remove(self, vehicles):
+        # vehicles: [(车辆ID, 车牌号)]
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((self._remove, (vehicles,)))
+            if self.ready:
+                self._remove(vehicles)
+
+    def _find(self, key, vehicle_id):
+        # (key, 车辆ID) 所在位置及是否存在；不存在时为插入位置
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_right(self.keys, key, start)
+        position = bisect.bisect_left(self.vehicle_ids, vehicle_id, start, end)
+        return position, position < end and self.vehicle_ids[position] == vehicle_id
+
+    def _add(self, vehicles):
+        for vehicle_id, plate, fleet_id in vehicles:
+            key = normalize_plate(plate)
+            position, found = self._find(key, vehicle_id)
+            if found:
+                self.plates[position] = key if key == plate else plate
+                self.fleet_ids[position] = fleet_id
+                continue
+            self.keys.insert(position, key)
+            self.plates.insert(position, key if key == plate else plate)
+            self.vehicle_ids.insert(position, vehicle_id)
+            self.fleet_ids.insert(position, fleet_id)
+
+    def _remove(self, vehicles):
+        positions = set()
+        for vehicle_id, plate in vehicles:
+            position, found = self._find(normalize_plate(plate), vehicle_id)
+            if found:
+                positions.add(position)
+        if len(positions) <= REMOVE_IN_PLACE_MAX:
+            for position in sorted(positions, reverse=True):
+                del self.keys[position]
+                del self.plates[position]
+                del self.vehicle_ids[position]
+                del self.fleet_ids[position]
+            return
+        keep = [position for position in range(len(self.keys)) if position not in positions]
+        self.keys = [self.keys[position] for position in keep]
+        self.plates = [self.plates[position] for position in keep]
+        self.vehicle_ids = array('q', (self.vehicle_ids[position] for position in keep))
+        self.fleet_ids = array('q', (self.fleet_ids[position] for position in keep))
+
+    # ---- 查询 ----
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        # 返回按车牌排序的 [{id, plate_number, fleet_id}]；索引未就绪时返回 None，由调用方查询数据库。
+        # 前缀不以汉字开头时同时匹配各省份简称开头的车牌，见 expand_prefix
+        key = normalize_plate(prefix)
+        with self.lock:
+            if not self.ready:
+                return None
+            if not key:
+                return []
+            positions = []
+            for value in expand_prefix(key):
+                position = bisect.bisect_left(self.keys, value)
+                end = min(position + limit, len(self.keys))
+                while position < end and self.keys[position].startswith(value):
+                    positions.append(position)
+                    position += 1
+            positions.sort()
+            return [
+                {
+                    'id': self.vehicle_ids[position],
+                    'plate_number': self.plates[position],
+                    'fleet_id': self.fleet_ids[position]
+                }
+                for position in positions[:limit]
+            ]
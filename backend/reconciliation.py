@@ -0,0 +1,324 @@
+import csv
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from batching import iter_chunks
+from importer import ImportRowError, get_adapter, iter_records
+from models import Order
+
+# 平台对账单与内部订单核对：
+# 1. 对账单按批流式解析，每批按 (平台, 订单号) 一次查出对应订单，在批内以订单号建哈希表完成连接，
+#    同一时间只持有一批数据；已匹配的只保留订单ID与行号（numpy 数组，每行 16 字节）；
+# 2. 对账期内未被匹配的内部订单与订单号未匹配的对账单行，按 (平台, 金额) 在时间窗口内就近配对，
+#    视为订单号不一致的同一笔订单；
+# 3. 差异分类：对账单有内部无、内部有对账单无、对账单重复、金额不一致、结算金额不一致、模糊匹配。
+# 内存占用取决于批大小与未匹配的行数，与对账单和订单总量无关
+
+DEFAULT_CHUNK_SIZE = 20000
+
+# 每条 IN 查询的订单号数
+LOOKUP_BATCH_SIZE = 5000
+
+# 扫描内部订单时每次取回的行数
+INTERNAL_BATCH_SIZE = 50000
+
+# 模糊匹配的默认时间窗口
+DEFAULT_WINDOW = timedelta(minutes=5)
+
+# 按订单号查找时，内部订单时间允许超出对账期的范围（跨月、时区差异）
+LOOKUP_MARGIN = timedelta(days=1)
+
+# 每类差异在返回结果中保留的明细数，完整明细写入报告文件
+MAX_REPORTED_ITEMS = 200
+
+MAX_REPORTED_ERRORS = 100
+
+# 对账单中的结算金额列（可选）
+SETTLEMENT_COLUMNS = ('结算金额', '应结金额', '结算价', 'settlement_amount')
+
+CATEGORIES = (
+    'missing_internal',
+    'missing_statement',
+    'duplicated',
+    'amount_mismatch',
+    'settlement_mismatch',
+    'fuzzy_matched'
+)
+
+REPORT_FIELDS = (
+    'category', 'platform_id', 'statement_row', 'statement_order_no', 'order_id', 'order_no',
+    'statement_amount', 'amount', 'statement_settlement_amount', 'settlement_amount',
+    'statement_time', 'order_time'
+)
+
+
+def to_cents(value):
+    return None if value is None else int((Decimal(value) * 100).to_integral_value())
+
+
+def optional_cents(value):
+    # DataFrame 中缺失的金额为 NaN
+    return None if value is None or pd.isna(value) else int(value)
+
+
+def format_cents(value):
+    return None if value is None or pd.isna(value) else str(Decimal(int(value)).scaleb(-2))
+
+
+def format_time(value):
+    return None if value is None or pd.isna(value) else value.isoformat()
+
+
+def iter_statement_chunks(stream, filename, platform_id, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8-sig'):
+    # 产出 (行列表, 行错误列表)；行为 (行号, 订单号, 金额(分), 结算金额(分)|None, 订单时间)，列映射沿用导入适配器
+    adapter = get_adapter(platform_id)
+    mapping = None
+    settlement_column = None
+    row_number = 1
+    for chunk in iter_chunks(iter_records(stream, filename, encoding), chunk_size):
+        if mapping is None:
+            header = chunk[0].keys()
+            mapping = adapter.resolve_columns(header)
+            settlement_column = next((column for column in SETTLEMENT_COLUMNS if column in header), None)
+        rows = []
+        errors = []
+        for raw in chunk:
+            row_number += 1
+            try:
+                order_no = adapter.clean_text(raw.get(mapping['order_no']))
+                if not order_no:
+                    raise ImportRowError('订单号为空')
+                settlement = raw.get(settlement_column) if settlement_column else None
+                rows.append((
+                    row_number,
+                    order_no,
+                    to_cents(adapter.parse_amount(raw.get(mapping['amount']))),
+                    to_cents(adapter.parse_amount(settlement)) if settlement not in (None, '') else None,
+                    adapter.parse_time(raw.get(mapping['order_time']))
+                ))
+            except ImportRowError as e:
+                errors.append({'row': row_number, 'message': str(e)})
+        yield rows, errors
+
+
+class PlatformState:
+    def __init__(self):
+        self.matched_ids = []
+        self.matched_rows = []
+        # 订单号未匹配的对账单行，留待模糊匹配
+        self.unmatched = []
+
+
+class Reconciler:
+    # 用法：add_statement() 逐个加入对账单文件，finish() 完成内部订单侧的核对并返回报告；
+    # report_file 为文本文件对象时写入全部差异明细（CSV）
+    def __init__(self, session, start_time, end_time, window=DEFAULT_WINDOW, chunk_size=DEFAULT_CHUNK_SIZE,
+                 report_file=None):
+        self.session = session
+        self.start_time = start_time
+        self.end_time = end_time
+        self.window = window
+        self.chunk_size = chunk_size
+        self.platforms = {}
+        self.statement_rows = 0
+        self.matched = 0
+        self.failed = 0
+        self.errors = []
+        self.counts = dict.fromkeys(CATEGORIES, 0)
+        self.items = {category: [] for category in CATEGORIES}
+        self.writer = csv.writer(report_file) if report_file is not None else None
+        if self.writer:
+            self.writer.writerow(REPORT_FIELDS)
+
+    def summary(self):
+        return {
+            'statement_rows': self.statement_rows,
+            'matched': self.matched,
+            'failed': self.failed
+        }
+
+    def report(self, category, platform_id, statement=None, order=None):
+        # statement: (行号, 订单号, 金额, 结算金额, 时间)；order: (订单ID, 订单号, 金额, 结算金额, 时间)，金额单位为分
+        statement = statement or (None,) * 5
+        order = order or (None,) * 5
+        item = {
+            'platform_id': platform_id,
+            'statement_row': statement[0],
+            'statement_order_no': statement[1],
+            'order_id': order[0],
+            'order_no': order[1],
+            'statement_amount': format_cents(statement[2]),
+            'amount': format_cents(order[2]),
+            'statement_settlement_amount': format_cents(statement[3]),
+            'settlement_amount': format_cents(order[3]),
+            'statement_time': format_time(statement[4]),
+            'order_time': format_time(order[4])
+        }
+        self.counts[category] += 1
+        if len(self.items[category]) < MAX_REPORTED_ITEMS:
+            self.items[category].append(item)
+        if self.writer:
+            self.writer.writerow([category] + [item[field] for field in REPORT_FIELDS[1:]])
+
+    def compare(self, platform_id, statement, order):
+        # 内部结算金额为空时按订单金额计（与车队余额口径一致）
+        if statement[2] != order[2]:
+            self.report('amount_mismatch', platform_id, statement, order)
+        if statement[3] is not None and statement[3] != (order[3] if order[3] is not None else order[2]):
+            self.report('settlement_mismatch', platform_id, statement, order)
+
+    def add_statement(self, stream, filename, platform_id, encoding='utf-8-sig', progress=None):
+        state = self.platforms.setdefault(platform_id, PlatformState())
+        for rows, errors in iter_statement_chunks(stream, filename, platform_id, self.chunk_size, encoding):
+            self.statement_rows += len(rows) + len(errors)
+            self.failed += len(errors)
+            room = MAX_REPORTED_ERRORS - len(self.errors)
+            if room > 0:
+                self.errors.extend({'filename': filename, **error} for error in errors[:room])
+            self.match_chunk(platform_id, state, rows)
+            if progress is not None:
+                progress(self.summary())
+
+    def match_chunk(self, platform_id, state, rows):
+        found = {}
+        order_nos = list({row[1] for row in rows})
+        for part in iter_chunks(order_nos, LOOKUP_BATCH_SIZE):
+            for order in self.session.execute(
+                select(Order.id, Order.order_no, Order.amount, Order.settlement_amount, Order.order_time).where(
+                    Order.platform_id == platform_id,
+                    Order.order_no.in_(part),
+                    Order.order_time >= self.start_time - LOOKUP_MARGIN,
+                    Order.order_time < self.end_time + LOOKUP_MARGIN
+                )
+            ):
+                found[order.order_no] = (
+                    order.id, order.order_no, to_cents(order.amount), to_cents(order.settlement_amount), order.order_time
+                )
+
+        ids = []
+        row_numbers = []
+        for row in rows:
+            order = found.get(row[1])
+            if order is None:
+                state.unmatched.append(row)
+                continue
+            ids.append(order[0])
+            row_numbers.append(row[0])
+            self.compare(platform_id, row, order)
+        self.matched += len(ids)
+        state.matched_ids.append(np.array(ids, dtype=np.int64))
+        state.matched_rows.append(np.array(row_numbers, dtype=np.int64))
+
+    def orders_by_id(self, order_ids):
+        orders = {}
+        for part in iter_chunks(order_ids, LOOKUP_BATCH_SIZE):
+            for order in self.session.execute(
+                select(Order.id, Order.order_no, Order.amount, Order.settlement_amount, Order.order_time).where(
+                    Order.id.in_(part)
+                )
+            ):
+                orders[order.id] = (
+                    order.id, order.order_no, to_cents(order.amount), to_cents(order.settlement_amount), order.order_time
+                )
+        return orders
+
+    def unmatched_orders(self, platform_id, matched_ids):
+        # 对账期内该平台未被订单号匹配的内部订单，流式读取，只保留未匹配的行
+        unmatched = []
+        result = self.session.execute(
+            select(Order.id, Order.order_no, Order.amount, Order.settlement_amount, Order.order_time).where(
+                Order.platform_id == platform_id,
+                Order.order_time >= self.start_time,
+                Order.order_time < self.end_time
+            ).execution_options(yield_per=INTERNAL_BATCH_SIZE)
+        )
+        for batch in result.partitions():
+            ids = np.fromiter((order.id for order in batch), dtype=np.int64, count=len(batch))
+            for index in np.flatnonzero(~np.isin(ids, matched_ids, assume_unique=True)):
+                order = batch[index]
+                unmatched.append((
+                    order.id, order.order_no, to_cents(order.amount), to_cents(order.settlement_amount), order.order_time
+                ))
+        return unmatched
+
+    def finish(self):
+        for platform_id, state in sorted(self.platforms.items()):
+            matched_ids = np.concatenate(state.matched_ids) if state.matched_ids else np.empty(0, dtype=np.int64)
+            matched_rows = np.concatenate(state.matched_rows) if state.matched_rows else np.empty(0, dtype=np.int64)
+
+            # 同一内部订单在对账单中出现多次：首行计为匹配，其余行计为重复
+            unique_ids, first_index, counts = np.unique(matched_ids, return_index=True, return_counts=True)
+            if (counts > 1).any():
+                duplicated_ids = unique_ids[counts > 1]
+                orders = self.orders_by_id(duplicated_ids.tolist())
+                order = np.argsort(matched_ids, kind='stable')
+                starts = np.searchsorted(matched_ids[order], duplicated_ids)
+                for start, count, order_id in zip(starts, counts[counts > 1], duplicated_ids):
+                    for index in order[start + 1:start + count]:
+                        self.report('duplicated', platform_id, (int(matched_rows[index]), None, None, None, None),
+                                    orders[int(order_id)])
+                self.matched -= int((counts - 1).sum())
+
+            self.fuzzy_match(platform_id, state.unmatched, self.unmatched_orders(platform_id, unique_ids))
+            self.platforms[platform_id] = None
+
+        return {
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'platforms': sorted(self.platforms),
+            **self.summary(),
+            'errors': self.errors,
+            'counts': self.counts,
+            'items': self.items
+        }
+
+    def fuzzy_match(self, platform_id, statements, orders):
+        statement_columns = ['row', 'order_no', 'amount', 'settlement', 'order_time']
+        order_columns = ['order_id', 'internal_order_no', 'internal_amount', 'internal_settlement', 'internal_time']
+        left = pd.DataFrame(statements, columns=statement_columns)
+        right = pd.DataFrame(orders, columns=order_columns)
+
+        # 订单号未匹配且在对账单中重复出现的行
+        duplicated = left.duplicated('order_no')
+        for row in left[duplicated].itertuples(index=False):
+            self.report('duplicated', platform_id, tuple(row))
+        left = left[~duplicated]
+
+        pairs = pd.DataFrame(columns=statement_columns + order_columns)
+        if len(left) and len(right):
+            left['order_time'] = pd.to_datetime(left['order_time'])
+            right['internal_time'] = pd.to_datetime(right['internal_time'])
+            merged = pd.merge_asof(
+                left.sort_values('order_time'),
+                right.sort_values('internal_time'),
+                left_on='order_time',
+                right_on='internal_time',
+                left_by='amount',
+                right_by='internal_amount',
+                tolerance=pd.Timedelta(self.window),
+                direction='nearest'
+            ).dropna(subset=['order_id'])
+            # 一条内部订单只配给时间最接近的对账单行
+            merged['gap'] = (merged['order_time'] - merged['internal_time']).abs()
+            pairs = merged.sort_values('gap', kind='stable').drop_duplicates('order_id')
+
+        for pair in pairs.itertuples(index=False):
+            statement = (pair.row, pair.order_no, int(pair.amount), optional_cents(pair.settlement), pair.order_time)
+            order = (int(pair.order_id), pair.internal_order_no, int(pair.internal_amount),
+                     optional_cents(pair.internal_settlement), pair.internal_time)
+            self.report('fuzzy_matched', platform_id, statement, order)
+            self.compare(platform_id, statement, order)
+        self.matched += len(pairs)
+
+        paired_rows = set(pairs['row'])
+        paired_orders = set(pairs['order_id'].astype('int64')) if len(pairs) else set()
+        for row in left.itertuples(index=False):
+            if row.row not in paired_rows:
+                self.report('missing_internal', platform_id, tuple(row))
+        for order in right.itertuples(index=False):
+            if order.order_id not in paired_orders:
+                self.report('missing_statement', platform_id, order=tuple(order))
@@ -0,0 +1,55 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库 json，输出内容一致
+    orjson = None
+
+# JSON 序列化：orjson 直接输出 UTF-8 字节，不经过中间字符串；列式格式按字段输出数组，减少大列表的键名重复
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # datetime / date 交给 default 处理（HTTP 日期格式），与 Flask 默认输出保持一致
+    def options(self):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        option = self.options() | (orjson.OPT_INDENT_2 if kwargs.get('indent') else 0)
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self.options()
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option | orjson.OPT_APPEND_NEWLINE),
+            mimetype=self.mimetype
+        )
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def to_columns(rows, fields, converters=None):
+    # 行元组（如 SQLAlchemy Row）转为 {字段: [值, ...]}，按列转置，不逐行构造字典
+    converters = converters or {}
+    values = list(zip(*rows)) if rows else [()] * len(fields)
+    columns = {}
+    for field, column in zip(fields, values):
+        convert = converters.get(field)
+        columns[field] = [convert(value) for value in column] if convert else list(column)
+    return columns
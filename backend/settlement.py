@@ -0,0 +1,263 @@
+import re
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, select, update
+
+from models import DiscountRule, Order, PricingRule
+
+# 批量结算引擎：计价/优惠规则一次载入，按车队与有效期索引，整批订单向量化计算结算金额
+#
+# 结算规则：
+#   1. 计价：同车队、订单日期在 [effective_date, expiry_date] 内、订单时刻落在 time_period 内的计价规则，
+#      取生效日期最新的一条，基础金额 = charge_kwh * price_per_kwh；无匹配规则或无电量时取订单金额
+#   2. 优惠：同车队、日期有效且基础金额 >= min_amount 的优惠规则取最大 discount_rate，
+#      结算金额 = 基础金额 * (1 - discount_rate)，四舍五入到分（与 Decimal ROUND_HALF_UP 一致）
+#
+# 金额按定点整数计算：订单金额以分、电量以 0.001 kWh、单价与优惠率以 0.0001 为单位（即各字段的小数位数），
+# 基础金额以 1e-7 元为单位，只在最后舍入一次，不受浮点误差影响（如 1.5 * 0.85 = 1.275 → 1.28）
+
+DEFAULT_BATCH_SIZE = 5000
+
+FULL_DAY_PERIODS = ('', '全天', 'all', 'ALL', '*')
+
+TIME_PERIOD_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*[-~～至]\s*(\d{1,2}):(\d{2})\s*$')
+
+
+def parse_time_period(period):
+    # 返回 [开始分钟, 结束分钟)，开始大于结束表示跨零点；无法识别时返回 None
+    period = (period or '').strip()
+    if period in FULL_DAY_PERIODS:
+        return 0, 24 * 60
+    match = TIME_PERIOD_PATTERN.match(period)
+    if not match:
+        return None
+    start_hour, start_minute, end_hour, end_minute = (int(value) for value in match.groups())
+    return start_hour * 60 + start_minute, end_hour * 60 + end_minute
+
+
+def month_range(year, month):
+    # 返回 [当月1日, 次月1日)
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+BASE_SCALE = 10 ** 7
+
+RATE_SCALE = 10 ** 4
+
+
+def to_units(values, scale):
+    # 浮点数组按给定单位取整为 int64，NaN 记为 0（由调用方另行标记）
+    return np.rint(np.nan_to_num(values * scale)).astype(np.int64)
+
+
+def round_money(base, keep):
+    # base: 基础金额（1e-7 元），keep: 1 - 优惠率（1e-4）；返回 base * keep 四舍五入到分（int64）。
+    # 乘积按分与分以下两部分计算，金额达到 Numeric(10, 2) 上限也不会溢出 int64；负数金额远离零舍入
+    sign = np.sign(base)
+    cents, rest = np.divmod(np.abs(base), BASE_SCALE // 100)
+    carry = (rest * keep + BASE_SCALE * RATE_SCALE // 200) // (BASE_SCALE // 100)
+    return sign * ((cents * keep + carry) // RATE_SCALE)
+
+
+class RuleBook:
+    def __init__(self, pricing, discounts):
+        self.pricing = pricing
+        self.discounts = discounts
+
+    @classmethod
+    def load(cls, session, fleet_ids=None):
+        pricing_query = select(
+            PricingRule.fleet_id,
+            PricingRule.time_period,
+            PricingRule.price_per_kwh,
+            PricingRule.effective_date,
+            PricingRule.expiry_date
+        )
+        discount_query = select(
+            DiscountRule.fleet_id,
+            DiscountRule.discount_rate,
+            DiscountRule.min_amount,
+            DiscountRule.effective_date,
+            DiscountRule.expiry_date
+        )
+        if fleet_ids is not None:
+            pricing_query = pricing_query.where(PricingRule.fleet_id.in_(fleet_ids))
+            discount_query = discount_query.where(DiscountRule.fleet_id.in_(fleet_ids))
+
+        pricing = pd.DataFrame(
+            session.execute(pricing_query).all(),
+            columns=['fleet_id', 'time_period', 'price_per_kwh', 'effective_date', 'expiry_date']
+        )
+        periods = [parse_time_period(period) for period in pricing['time_period']]
+        pricing['period_start'] = [period[0] if period else np.nan for period in periods]
+        pricing['period_end'] = [period[1] if period else np.nan for period in periods]
+        pricing = pricing.dropna(subset=['period_start']).drop(columns=['time_period'])
+        pricing['price_per_kwh'] = pricing['price_per_kwh'].astype(float)
+
+        discounts = pd.DataFrame(
+            session.execute(discount_query).all(),
+            columns=['fleet_id', 'discount_rate', 'min_amount', 'effective_date', 'expiry_date']
+        )
+        discounts['discount_rate'] = discounts['discount_rate'].astype(float)
+        discounts['min_amount'] = discounts['min_amount'].fillna(0).astype(float)
+
+        for frame in (pricing, discounts):
+            frame['fleet_id'] = pd.to_numeric(frame['fleet_id'], errors='coerce').astype(float)
+            # 未关联车队的规则不适用于任何订单（pandas 合并时 NaN 会与未关联车队的订单相互匹配）
+            frame.dropna(subset=['fleet_id'], inplace=True)
+            frame['effective_date'] = pd.to_datetime(frame['effective_date'])
+            frame['expiry_date'] = pd.to_datetime(frame['expiry_date'])
+            frame.sort_values(['fleet_id', 'effective_date'], inplace=True)
+
+        return cls(pricing, discounts)
+
+    @staticmethod
+    def _valid_on(candidates):
+        return (candidates['effective_date'] <= candidates['order_date']) & (
+            candidates['expiry_date'].isna() | (candidates['order_date'] <= candidates['expiry_date'])
+        )
+
+    def settle(self, orders):
+        # orders: DataFrame[fleet_id, order_time, charge_kwh, amount]，返回与之对齐的结算金额（float ndarray）
+        if orders.empty:
+            return np.array([], dtype=float)
+
+        frame = pd.DataFrame({
+            'row': np.arange(len(orders)),
+            'fleet_id': pd.to_numeric(orders['fleet_id'], errors='coerce').to_numpy(dtype=float),
+            'order_time': pd.to_datetime(orders['order_time']).to_numpy(),
+            'charge_kwh': pd.to_numeric(orders['charge_kwh'], errors='coerce').to_numpy(dtype=float),
+            'amount': pd.to_numeric(orders['amount'], errors='coerce').to_numpy(dtype=float)
+        })
+        frame['order_date'] = frame['order_time'].dt.normalize()
+        frame['minute'] = frame['order_time'].dt.hour * 60 + frame['order_time'].dt.minute
+        amounts = frame['amount'].to_numpy()
+        valid = ~np.isnan(amounts)
+        base = to_units(amounts, 100) * (BASE_SCALE // 100)
+
+        if not self.pricing.empty:
+            candidates = frame[['row', 'fleet_id', 'order_date', 'minute']].merge(self.pricing, on='fleet_id')
+            start = candidates['period_start']
+            end = candidates['period_end']
+            minute = candidates['minute']
+            in_period = np.where(
+                start <= end,
+                (minute >= start) & (minute < end),
+                (minute >= start) | (minute < end)
+            )
+            matched = candidates[self._valid_on(candidates) & in_period]
+            matched = matched.sort_values(['row', 'effective_date']).drop_duplicates('row', keep='last')
+
+            prices = np.full(len(frame), np.nan)
+            prices[matched['row'].to_numpy()] = matched['price_per_kwh'].to_numpy()
+            charge_kwh = frame['charge_kwh'].to_numpy()
+            priced = ~np.isnan(prices) & ~np.isnan(charge_kwh)
+            base[priced] = to_units(charge_kwh[priced], 1000) * to_units(prices[priced], RATE_SCALE)
+            valid |= priced
+
+        rates = np.zeros(len(frame))
+        if not self.discounts.empty:
+            frame['base'] = np.where(valid, base / BASE_SCALE, np.nan)
+            candidates = frame[['row', 'fleet_id', 'order_date', 'base']].merge(self.discounts, on='fleet_id')
+            eligible = candidates[self._valid_on(candidates) & (candidates['base'] >= candidates['min_amount'])]
+            best = eligible.groupby('row')['discount_rate'].max()
+            rates[best.index.to_numpy()] = best.to_numpy()
+
+        cents = round_money(base, RATE_SCALE - to_units(rates, RATE_SCALE))
+        return np.where(valid, cents / 100, np.nan)
+
+
+def to_decimal(value):
+    if value is None or np.isnan(value):
+        return None
+    return Decimal(f'{value:.2f}')
+
+
+def settle_rows(rulebook, rows):
+    # rows: [{'fleet_id', 'order_time', 'charge_kwh', 'amount'}]，返回对应的 Decimal 结算金额列表
+    if not rows:
+        return []
+    frame = pd.DataFrame.from_records(rows, columns=['fleet_id', 'order_time', 'charge_kwh', 'amount'])
+    frame['charge_kwh'] = frame['charge_kwh'].astype(float)
+    frame['amount'] = frame['amount'].astype(float)
+    return [to_decimal(value) for value in rulebook.settle(frame)]
+
+
+def resettle_orders(session, rulebook, start_time, end_time, fleet_id=None, batch_size=DEFAULT_BATCH_SIZE,
+                    on_batch=None, progress=None):
+    # 重新结算 [start_time, end_time) 内的订单（规则变更后重算历史月份），按主键游标分批读取和回写；
+    # on_batch(deltas) 在每批提交前调用，deltas 为 {(日期, 平台ID, 站点ID, 车队ID): 结算金额变化}，
+    # 供车队余额和仪表盘汇总在同一事务内增量更新；未关联站点或车队时对应ID为 None。
+    # progress(summary) 在每批提交后调用，可抛出异常中止，已提交的批次保留
+    summary = {'scanned': 0, 'updated': 0}
+    update_stmt = update(Order.__table__).where(
+        Order.__table__.c.id == bindparam('order_id')
+    ).values(settlement_amount=bindparam('new_amount'))
+
+    last_id = 0
+    while True:
+        query = select(
+            Order.id,
+            Order.fleet_id,
+            Order.platform_id,
+            Order.station_id,
+            Order.order_time,
+            Order.charge_kwh,
+            Order.amount,
+            Order.settlement_amount
+        ).where(
+            Order.order_time >= start_time,
+            Order.order_time < end_time,
+            Order.id > last_id
+        ).order_by(Order.id).limit(batch_size)
+        if fleet_id is not None:
+            query = query.where(Order.fleet_id == fleet_id)
+
+        rows = session.execute(query).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        frame = pd.DataFrame(rows, columns=[
+            'id', 'fleet_id', 'platform_id', 'station_id', 'order_time', 'charge_kwh', 'amount', 'settlement_amount'
+        ])
+        frame['charge_kwh'] = frame['charge_kwh'].astype(float)
+        frame['amount'] = frame['amount'].astype(float)
+        new_amounts = rulebook.settle(frame)
+        old_amounts = frame['settlement_amount'].astype(float).to_numpy()
+        changed = np.flatnonzero(~np.isclose(new_amounts, old_amounts, atol=0.001) | np.isnan(old_amounts))
+
+        if len(changed):
+            session.execute(update_stmt, [
+                {'order_id': int(frame['id'].iat[index]), 'new_amount': to_decimal(new_amounts[index])}
+                for index in changed
+            ])
+            if on_batch is not None:
+                # 原结算金额为空时消费按订单金额计入余额
+                previous = np.where(np.isnan(old_amounts), frame['amount'].to_numpy(), old_amounts)
+                changes = frame.iloc[changed]
+                changes = pd.DataFrame({
+                    'day': changes['order_time'].dt.date,
+                    'platform_id': changes['platform_id'],
+                    'station_id': pd.to_numeric(changes['station_id'], errors='coerce').fillna(0),
+                    'fleet_id': pd.to_numeric(changes['fleet_id'], errors='coerce').fillna(0),
+                    'delta': new_amounts[changed] - previous[changed]
+                })
+                on_batch({
+                    (day, int(platform), int(station) or None, int(fleet) or None): float(delta)
+                    for (day, platform, station, fleet), delta
+                    in changes.groupby(['day', 'platform_id', 'station_id', 'fleet_id'])['delta'].sum().items()
+                })
+        session.commit()
+
+        summary['scanned'] += len(rows)
+        summary['updated'] += len(changed)
+        if progress is not None:
+            progress(dict(summary))
+
+    return summary
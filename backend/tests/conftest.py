@@ -0,0 +1,56 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+# app 在导入时读取环境变量创建引擎，须在导入前设置：内存 SQLite、任务在请求内执行、不建车牌联想索引
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+os.environ['JOB_BACKEND'] = 'inline'
+os.environ['VEHICLE_INDEX_MAX_SIZE'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with backend.app.app_context():
+        backend.db.drop_all()
+        backend.create_tables()
+        yield backend.app
+        backend.db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    from flask_jwt_extended import create_access_token
+    return {'Authorization': 'Bearer ' + create_access_token(identity=1)}
+
+
+@pytest.fixture
+def count_statements(app):
+    # 返回上下文管理器，收集其中当前线程（测试客户端在同一线程内处理请求）执行的 SQL 语句
+    @contextmanager
+    def counter():
+        statements = []
+        thread_id = threading.get_ident()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if threading.get_ident() == thread_id:
+                statements.append(statement)
+
+        event.listen(backend.db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(backend.db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counter
@@ -0,0 +1,63 @@
+import io
+
+import pytest
+
+from models import Fleet, Vehicle, db
+
+
+def order_file(rows):
+    lines = ['订单号,订单金额,充电开始时间,车牌号']
+    lines += [f'{order_no},{amount},2025-01-03 10:00:00,{plate}' for order_no, amount, plate in rows]
+    return io.BytesIO('\n'.join(lines).encode('utf-8-sig'))
+
+
+@pytest.fixture
+def imported(client, auth_headers):
+    fleets = db.session.query(Fleet).order_by(Fleet.id).all()
+    db.session.add_all([
+        Vehicle(plate_number='京A00001', vehicle_type='重卡', fleet_id=fleets[0].id),
+        Vehicle(plate_number='京A00002', vehicle_type='重卡', fleet_id=fleets[1].id)
+    ])
+    db.session.commit()
+    response = client.post(
+        '/api/orders/import',
+        headers=auth_headers,
+        data={'platform_id': '1', 'file': (order_file([
+            ('P-1', '100.00', '京A00001'),
+            ('P-2', '125.00', '京A00001'),
+            ('P-3', '80.00', '京A00002')
+        ]), 'orders.csv')},
+        content_type='multipart/form-data'
+    )
+    assert response.get_json()['data']['imported'] == 3
+    return fleets
+
+
+def verify(client, auth_headers):
+    response = client.get('/api/reconciliation/verify?year=2025&month=1', headers=auth_headers)
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def test_verify_after_vehicle_delete(client, auth_headers, imported):
+    vehicle_id = db.session.query(Vehicle.id).filter_by(plate_number='京A00001').scalar()
+    response = client.delete('/api/vehicles/bulk', headers=auth_headers, json={'ids': [vehicle_id]})
+    assert response.status_code == 200
+
+    data = verify(client, auth_headers)
+    assert data['mismatches'] == []
+    assert data['checked'] == 2
+
+
+def test_verify_after_vehicle_reassignment(client, auth_headers, imported):
+    response = client.post('/api/vehicles/bulk', headers=auth_headers, json={'vehicles': [
+        {'plate_number': '京A00001', 'vehicle_type': '重卡', 'fleet_id': imported[2].id}
+    ]})
+    assert response.status_code == 200
+
+    assert verify(client, auth_headers)['mismatches'] == []
+    # 改派后重新结算仍按订单导入时的车队归属
+    response = client.post('/api/settlement/resettle', headers=auth_headers, json={
+        'year': 2025, 'month': 1, 'fleet_id': imported[0].id
+    })
+    assert response.get_json()['data']['scanned'] == 2
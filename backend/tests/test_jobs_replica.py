@@ -0,0 +1,47 @@
+import io
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from database import REPLICA_BIND
+from models import Job, db
+
+
+@pytest.fixture
+def lagging_replica(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'JOB_STORAGE_DIR', str(tmp_path))
+    # 结构相同、没有任何数据的副本，模拟复制延迟：落到副本上的读取看不到刚写入的行
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    db.metadata.create_all(engine)
+    db.engines[REPLICA_BIND] = engine
+    yield engine
+    del db.engines[REPLICA_BIND]
+    engine.dispose()
+
+
+def test_async_export_under_replica_bind(client, auth_headers, lagging_replica):
+    response = client.post(
+        '/api/export/data', headers=auth_headers, json={'table_name': 'fleets', 'format': 'csv', 'async': True}
+    )
+    assert response.status_code == 202
+    data = response.get_json()['data']
+    # JOB_BACKEND=inline：认领、执行和结束都在主库完成
+    assert data['status'] == 'succeeded'
+    assert db.session.get(Job, data['id']).status == 'succeeded'
+    with lagging_replica.connect() as connection:
+        assert connection.execute(db.select(Job.id)).first() is None
+
+
+def test_async_reconcile_under_replica_bind(client, auth_headers, lagging_replica):
+    statement = '订单号,订单金额,订单时间\nNO-1,12.50,2024-03-05 08:00:00\n'.encode('utf-8')
+    response = client.post(
+        '/api/reconciliation/match',
+        headers=auth_headers,
+        data={'file': (io.BytesIO(statement), 'statement.csv'), 'platform_id': '1', 'year': '2024', 'month': '3', 'async': '1'},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 202
+    data = response.get_json()['data']
+    assert data['status'] == 'succeeded'
+    assert db.session.get(Job, data['id']).status == 'succeeded'
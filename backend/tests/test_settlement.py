@@ -0,0 +1,196 @@
+import io
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+
+from models import DiscountRule, Fleet, Order, PricingRule, Vehicle, db
+from settlement import RuleBook, settle_rows
+
+
+@pytest.fixture
+def fleet_ids(app):
+    return [fleet.id for fleet in db.session.query(Fleet).order_by(Fleet.id)]
+
+
+def add_pricing(fleet_id, time_period, price, effective, expiry=None):
+    db.session.add(PricingRule(
+        fleet_id=fleet_id,
+        time_period=time_period,
+        price_per_kwh=Decimal(price),
+        effective_date=effective,
+        expiry_date=expiry
+    ))
+
+
+def add_discount(fleet_id, rate, min_amount, effective, expiry=None):
+    db.session.add(DiscountRule(
+        fleet_id=fleet_id,
+        rule_type='满减',
+        discount_rate=Decimal(rate),
+        min_amount=Decimal(min_amount),
+        effective_date=effective,
+        expiry_date=expiry
+    ))
+
+
+def settle(orders):
+    # orders: [(车队ID, 订单时间, 电量, 订单金额)]，返回结算金额字符串，None 表示无法结算
+    db.session.commit()
+    rows = [
+        {
+            'fleet_id': fleet_id,
+            'order_time': datetime.fromisoformat(order_time),
+            'charge_kwh': Decimal(charge_kwh) if charge_kwh is not None else None,
+            'amount': Decimal(amount) if amount is not None else None
+        }
+        for fleet_id, order_time, charge_kwh, amount in orders
+    ]
+    return [str(value) if value is not None else None for value in settle_rows(RuleBook.load(db.session), rows)]
+
+
+def test_pricing_validity_window(fleet_ids):
+    fleet = fleet_ids[0]
+    add_pricing(fleet, '全天', '1.0000', date(2025, 1, 1), date(2025, 1, 31))
+    add_pricing(fleet, '08:00-20:00', '2.0000', date(2025, 1, 15))
+    assert settle([
+        (fleet, '2024-12-31 10:00:00', '10', '50.00'),
+        (fleet, '2025-01-10 10:00:00', '10', '50.00'),
+        # 多条规则有效时取生效日期最新且时段匹配的一条
+        (fleet, '2025-01-20 10:00:00', '10', '50.00'),
+        (fleet, '2025-01-20 22:00:00', '10', '50.00'),
+        # 失效日期当天仍有效
+        (fleet, '2025-01-31 23:59:00', '10', '50.00'),
+        (fleet, '2025-02-01 00:00:00', '10', '50.00'),
+        (fleet, '2025-02-01 10:00:00', '10', '50.00'),
+        # 其他车队的规则不适用
+        (fleet_ids[1], '2025-01-20 10:00:00', '10', '50.00')
+    ]) == ['50.00', '10.00', '20.00', '10.00', '10.00', '50.00', '20.00', '50.00']
+
+
+def test_overnight_time_period(fleet_ids):
+    fleet = fleet_ids[0]
+    add_pricing(fleet, '22:00-06:00', '0.5000', date(2025, 1, 1))
+    add_pricing(fleet, '06:00~22:00', '1.0000', date(2025, 1, 1))
+    add_pricing(fleet, '夜间', '9.0000', date(2025, 1, 1))
+    times = ['2025-01-10 23:30:00', '2025-01-10 00:00:00', '2025-01-10 05:59:00', '2025-01-10 06:00:00',
+             '2025-01-10 21:59:00', '2025-01-10 22:00:00']
+    assert settle([(fleet, time, '10', '50.00') for time in times]) == [
+        '5.00', '5.00', '5.00', '10.00', '10.00', '5.00'
+    ]
+
+
+def test_best_discount(fleet_ids):
+    fleet = fleet_ids[0]
+    add_discount(fleet, '0.0500', '0', date(2025, 1, 1))
+    add_discount(fleet, '0.1000', '100.00', date(2025, 1, 1))
+    add_discount(fleet, '0.2000', '100.00', date(2024, 1, 1), date(2024, 12, 31))
+    add_discount(fleet_ids[1], '0.5000', '0', date(2025, 1, 1))
+    assert settle([
+        (fleet, '2025-01-10 10:00:00', None, '50.00'),
+        (fleet, '2025-01-10 10:00:00', None, '99.99'),
+        (fleet, '2025-01-10 10:00:00', None, '100.00'),
+        (fleet, '2024-06-10 10:00:00', None, '100.00')
+    ]) == ['47.50', '94.99', '90.00', '80.00']
+
+
+def test_discount_applies_to_priced_amount(fleet_ids):
+    fleet = fleet_ids[0]
+    add_pricing(fleet, '全天', '1.2000', date(2025, 1, 1))
+    add_discount(fleet, '0.1000', '100.00', date(2025, 1, 1))
+    # 满减门槛按计价后的基础金额判断
+    assert settle([
+        (fleet, '2025-01-10 10:00:00', '100', '50.00'),
+        (fleet, '2025-01-10 10:00:00', '50', '500.00')
+    ]) == ['108.00', '60.00']
+
+
+def test_null_fleet_and_missing_values(fleet_ids):
+    fleet = fleet_ids[0]
+    add_pricing(fleet, '全天', '1.0000', date(2025, 1, 1))
+    add_discount(fleet, '0.1000', '0', date(2025, 1, 1))
+    # 未关联车队的规则不适用于未关联车队的订单
+    add_pricing(None, '全天', '3.0000', date(2025, 1, 1))
+    add_discount(None, '0.5000', '0', date(2025, 1, 1))
+    assert settle([
+        (None, '2025-01-10 10:00:00', '10', '50.00'),
+        # 无电量时按订单金额计算优惠
+        (fleet, '2025-01-10 10:00:00', None, '50.00'),
+        # 有计价规则时不依赖订单金额
+        (fleet, '2025-01-10 10:00:00', '10', None),
+        (fleet, '2024-01-10 10:00:00', None, None),
+        (None, '2025-01-10 10:00:00', None, None)
+    ]) == ['50.00', '45.00', '9.00', None, None]
+
+
+def test_rounding_matches_decimal_half_up(fleet_ids):
+    fleet = fleet_ids[0]
+    add_discount(fleet, '0.1500', '0', date(2025, 1, 1))
+    add_pricing(fleet_ids[1], '全天', '1.2345', date(2025, 1, 1))
+    add_discount(fleet_ids[1], '0.0125', '0', date(2025, 1, 1))
+    cent = Decimal('0.01')
+
+    # 订单金额 * 0.85：1.50 * 0.85 = 1.275 等 .xx5 的情况须进位
+    amounts = [Decimal(value) / 100 for value in range(1, 5001)]
+    expected = [(amount * Decimal('0.85')).quantize(cent, ROUND_HALF_UP) for amount in amounts]
+    assert settle([(fleet, '2025-01-10 10:00:00', None, str(amount)) for amount in amounts]) == [
+        str(value) for value in expected
+    ]
+    assert str(expected[149]) == '1.28'
+
+    # 电量 * 单价 * (1 - 优惠率)，乘积有 11 位小数
+    kwhs = [Decimal(value) / 1000 for value in range(1, 200001, 97)]
+    expected = [
+        (kwh * Decimal('1.2345') * Decimal('0.9875')).quantize(cent, ROUND_HALF_UP) for kwh in kwhs
+    ]
+    assert settle([(fleet_ids[1], '2025-01-10 10:00:00', str(kwh), '0.00') for kwh in kwhs]) == [
+        str(value) for value in expected
+    ]
+
+
+def order_file(rows):
+    lines = ['订单号,订单金额,充电量,充电开始时间,车牌号']
+    lines += [','.join(row) for row in rows]
+    return io.BytesIO('\n'.join(lines).encode('utf-8-sig'))
+
+
+def test_resettle_month(client, auth_headers, fleet_ids):
+    db.session.add_all([
+        Vehicle(plate_number='京A00001', vehicle_type='重卡', fleet_id=fleet_ids[0]),
+        Vehicle(plate_number='京A00002', vehicle_type='重卡', fleet_id=fleet_ids[1])
+    ])
+    db.session.commit()
+    response = client.post(
+        '/api/orders/import',
+        headers=auth_headers,
+        data={'platform_id': '1', 'file': (order_file([
+            ('P-1', '100.00', '40.000', '2025-01-03 10:00:00', '京A00001'),
+            ('P-2', '125.00', '', '2025-01-31 23:00:00', '京A00001'),
+            ('P-3', '80.00', '20.000', '2025-02-01 00:30:00', '京A00001'),
+            ('P-4', '60.00', '30.000', '2025-01-05 10:00:00', '京A00002')
+        ]), 'orders.csv')},
+        content_type='multipart/form-data'
+    )
+    assert response.get_json()['data']['imported'] == 4
+
+    # 规则变更后重算一月：只更新一月内本车队规则影响的订单，二月订单不变
+    add_pricing(fleet_ids[0], '全天', '1.5000', date(2025, 1, 1))
+    add_discount(fleet_ids[0], '0.1500', '100.00', date(2025, 1, 1))
+    db.session.commit()
+
+    def resettle():
+        response = client.post('/api/settlement/resettle', headers=auth_headers, json={'year': 2025, 'month': 1})
+        assert response.status_code == 200
+        return response.get_json()['data']
+
+    assert resettle() == {'scanned': 3, 'updated': 2}
+    amounts = dict(db.session.execute(db.select(Order.order_no, Order.settlement_amount)).all())
+    assert {order_no: str(amount) for order_no, amount in amounts.items()} == {
+        'P-1': '60.00', 'P-2': '106.25', 'P-3': '80.00', 'P-4': '60.00'
+    }
+    # 重复执行不再改动
+    assert resettle() == {'scanned': 3, 'updated': 0}
+
+    # 车队余额随结算金额变化同步更新
+    response = client.get('/api/reconciliation/verify?year=2025&month=1', headers=auth_headers)
+    assert response.get_json()['data']['mismatches'] == []
@@ -0,0 +1,41 @@
+from models import Fleet, db
+
+
+def test_create_vehicle_is_one_statement(client, auth_headers, count_statements):
+    fleet = db.session.query(Fleet).order_by(Fleet.id).first()
+    payload = {'plate_number': '京A00001', 'vehicle_type': '重卡', 'fleet_id': fleet.id, 'driver_name': '张三'}
+
+    with count_statements() as statements:
+        response = client.post('/api/vehicles', headers=auth_headers, json=payload)
+    data = response.get_json()['data']
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert data['fleet_name'] == fleet.name
+    assert data['driver_name'] == '张三'
+    assert data['status'] == 'normal'
+    assert data['id'] and data['created_at']
+
+
+def test_create_vehicle_duplicate_plate(client, auth_headers):
+    payload = {'plate_number': '京A00001', 'vehicle_type': '重卡', 'fleet_id': 1}
+    assert client.post('/api/vehicles', headers=auth_headers, json=payload).status_code == 200
+
+    response = client.post('/api/vehicles', headers=auth_headers, json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '车牌号已存在'
+
+
+def test_bulk_upsert_rejects_non_string_fields(client, auth_headers):
+    items = [
+        {'plate_number': ['京A00001'], 'vehicle_type': '重卡', 'fleet_id': 1},
+        {'plate_number': '京A00002', 'vehicle_type': {'name': '重卡'}, 'fleet_id': 1},
+        {'plate_number': '京A00003', 'vehicle_type': '重卡', 'fleet_id': 1}
+    ]
+    response = client.post('/api/vehicles/bulk', headers=auth_headers, json={'vehicles': items, 'on_error': 'skip'})
+    assert response.status_code == 200
+    results = response.get_json()['data']['results']
+    assert [(result['status'], result.get('message')) for result in results] == [
+        ('error', '字段须为字符串: plate_number'),
+        ('error', '字段须为字符串: vehicle_type'),
+        ('created', None)
+    ]
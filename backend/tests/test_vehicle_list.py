@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Fleet, Vehicle, db
+
+PAGE_SIZES = (5, 20, 100)
+
+
+@pytest.fixture
+def vehicles(app):
+    fleets = [Fleet(name=f'车队{index}') for index in range(5)]
+    db.session.add_all(fleets)
+    db.session.flush()
+    base = datetime(2025, 1, 1)
+    db.session.add_all(
+        Vehicle(
+            plate_number=f'京A{index:05d}',
+            vehicle_type='重卡',
+            fleet_id=fleets[index % len(fleets)].id,
+            created_at=base + timedelta(minutes=index // 2)
+        )
+        for index in range(240)
+    )
+    db.session.commit()
+
+
+def statement_count(client, headers, url, count_statements):
+    with count_statements() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return len(statements), response.get_json()['data']
+
+
+def test_offset_page_statement_count_is_constant(client, auth_headers, vehicles, count_statements):
+    counts = set()
+    for per_page in PAGE_SIZES:
+        count, data = statement_count(
+            client, auth_headers, f'/api/vehicles?page=2&per_page={per_page}', count_statements
+        )
+        assert len(data['items']) == per_page
+        assert {item['fleet_name'] for item in data['items']} <= {f'车队{index}' for index in range(5)}
+        counts.add(count)
+    # 当前页 + 总数
+    assert counts == {2}
+
+
+def test_cursor_page_statement_count_is_constant(client, auth_headers, vehicles, count_statements):
+    counts = set()
+    for limit in PAGE_SIZES:
+        _, first = statement_count(client, auth_headers, f'/api/vehicles?limit={limit}', count_statements)
+        count, data = statement_count(
+            client, auth_headers, f'/api/vehicles?after={first["next_cursor"]}&limit={limit}', count_statements
+        )
+        assert len(data['items']) == limit
+        assert all(item['fleet_name'] for item in data['items'])
+        counts.add(count)
+    assert counts == {1}
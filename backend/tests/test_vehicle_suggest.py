@@ -0,0 +1,89 @@
+import pytest
+
+import app as backend
+
+PLATES = ['粤B12345', '京A·12345', '京a 12399', '沪A1234X', 'A12000', '粤Ｂ１２８Ｋ０']
+
+
+@pytest.fixture
+def vehicles(client, auth_headers):
+    items = [{'plate_number': plate, 'vehicle_type': '重卡', 'fleet_id': 1} for plate in PLATES]
+    response = client.post('/api/vehicles/bulk', headers=auth_headers, json={'vehicles': items})
+    assert response.status_code == 200
+    return items
+
+
+@pytest.fixture
+def plate_index(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'VEHICLE_INDEX_MAX_SIZE', 1000)
+    yield backend.vehicle_plates
+    with backend.vehicle_plates.lock:
+        backend.vehicle_plates.ready = False
+        backend.vehicle_plates.clear()
+
+
+def suggest(client, auth_headers, prefix):
+    response = client.get('/api/vehicles/suggest', headers=auth_headers, query_string={'prefix': prefix})
+    assert response.status_code == 200
+    return [item['plate_number'] for item in response.get_json()['data']]
+
+
+@pytest.mark.parametrize('prefix, expected', [
+    ('粤b·12', ['粤B12345', '粤Ｂ１２８Ｋ０']),
+    ('a 123', ['京A·12345', '京a 12399', '沪A1234X']),
+    ('A12', ['A12000', '京A·12345', '京a 12399', '沪A1234X']),
+    ('  ', []),
+])
+def test_suggest_database_matches_index(client, auth_headers, vehicles, plate_index, prefix, expected):
+    from_database = suggest(client, auth_headers, prefix)
+    assert plate_index.rebuild()
+    from_index = suggest(client, auth_headers, prefix)
+    assert from_database == from_index == expected
+
+
+def test_index_keeps_plates_with_the_same_key(app, plate_index):
+    plate_index.rebuild()
+    plate_index.add([(2, '京A·12345', 1), (1, '京A12345', 1)])
+    assert [item['id'] for item in plate_index.suggest('京A12345')] == [1, 2]
+
+    # 覆盖按车辆进行，不影响规范化后相同的其他车辆
+    plate_index.add([(2, '京A·12345', 3)])
+    assert [(item['id'], item['fleet_id']) for item in plate_index.suggest('京A12345')] == [(1, 1), (2, 3)]
+
+    plate_index.remove([(1, '京A12345')])
+    assert [item['plate_number'] for item in plate_index.suggest('京A12345')] == ['京A·12345']
+
+
+def test_index_removes_many(app, plate_index):
+    plate_index.rebuild()
+    plate_index.add([(vehicle_id, f'京A{vehicle_id:05d}', 1) for vehicle_id in range(100)])
+    plate_index.remove([(vehicle_id, f'京A{vehicle_id:05d}') for vehicle_id in range(0, 100, 3)] + [(500, '京A00001')])
+    assert list(plate_index.vehicle_ids) == [vehicle_id for vehicle_id in range(100) if vehicle_id % 3]
+    assert plate_index.keys == [f'京A{vehicle_id:05d}' for vehicle_id in range(100) if vehicle_id % 3]
+
+
+def test_index_syncs_writes_from_other_processes(client, auth_headers, vehicles, plate_index):
+    assert plate_index.rebuild()
+    # 直接写库，模拟其他进程的写入
+    db = backend.db
+    db.session.execute(db.insert(backend.Vehicle).values(plate_number='粤B12999', vehicle_type='重卡', fleet_id=2))
+    db.session.execute(db.update(backend.Vehicle).where(backend.Vehicle.plate_number == '粤B12345').values(fleet_id=3))
+    db.session.commit()
+    assert plate_index.sync()
+    assert [(item['plate_number'], item['fleet_id']) for item in plate_index.suggest('粤B12')] == [
+        ('粤B12345', 3), ('粤Ｂ１２８Ｋ０', 1), ('粤B12999', 2)
+    ]
+
+    db.session.execute(db.delete(backend.Vehicle).where(backend.Vehicle.plate_number == '粤B12999'))
+    db.session.commit()
+    assert plate_index.sync()
+    assert len(plate_index) == len(PLATES)
+    assert [item['plate_number'] for item in plate_index.suggest('粤B12')] == ['粤B12345', '粤Ｂ１２８Ｋ０']
+
+
+def test_bulk_delete_updates_index(client, auth_headers, vehicles, plate_index):
+    assert plate_index.rebuild()
+    vehicle_id = plate_index.suggest('沪A')[0]['id']
+    response = client.delete('/api/vehicles/bulk', headers=auth_headers, json={'ids': [vehicle_id]})
+    assert response.get_json()['data']['results'][0]['plate_number'] == '沪A1234X'
+    assert plate_index.suggest('沪A') == []
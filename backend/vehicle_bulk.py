@@ -0,0 +1,179 @@
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from batching import iter_chunks
+from db_utils import upsert
+from models import Fleet, Vehicle
+
+# 车辆批量写入：整体校验 -> 按批多行 upsert / delete，同一事务内执行，逐行返回结果
+
+DEFAULT_BATCH_SIZE = 500
+
+MAX_BULK_ROWS = 5000
+
+# 失败处理方式：rollback 任一行失败则整体不写入；skip 跳过失败行，其余照常写入
+ON_ERROR_MODES = ('rollback', 'skip')
+
+# 可写入的字段及长度上限（None 表示不限制）
+VEHICLE_FIELDS = {
+    'plate_number': 20,
+    'vehicle_type': 50,
+    'fleet_id': None,
+    'driver_name': 50,
+    'driver_phone': 20,
+    'status': 20,
+    'remark': None
+}
+
+REQUIRED_FIELDS = ('plate_number', 'vehicle_type', 'fleet_id')
+
+
+class BulkRequestError(ValueError):
+    pass
+
+
+def check_payload(items, on_error):
+    if on_error not in ON_ERROR_MODES:
+        raise BulkRequestError(f'on_error 仅支持: {", ".join(ON_ERROR_MODES)}')
+    if not isinstance(items, list) or not items:
+        raise BulkRequestError('请提供非空的数组')
+    if len(items) > MAX_BULK_ROWS:
+        raise BulkRequestError(f'单次最多提交 {MAX_BULK_ROWS} 条')
+
+
+def row_error(index, message, **extra):
+    return {'index': index, 'status': 'error', 'message': message, **extra}
+
+
+def validate_vehicles(session, items):
+    # 返回 (通过校验的 [(序号, 字段)], 错误结果)；车队是否存在一次查询完成
+    valid, errors, seen = [], [], {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append(row_error(index, '数据格式错误'))
+            continue
+        values = {field: item[field] for field in VEHICLE_FIELDS if field in item}
+        if isinstance(values.get('plate_number'), str):
+            values['plate_number'] = values['plate_number'].strip()
+        missing = [field for field in REQUIRED_FIELDS if values.get(field) in (None, '')]
+        if missing:
+            errors.append(row_error(index, f'缺少必填字段: {", ".join(missing)}', plate_number=values.get('plate_number')))
+            continue
+        not_text = [
+            field for field in VEHICLE_FIELDS
+            if field != 'fleet_id' and values.get(field) is not None and not isinstance(values[field], str)
+        ]
+        if not_text:
+            errors.append(row_error(index, f'字段须为字符串: {", ".join(not_text)}', plate_number=values['plate_number']))
+            continue
+        if not isinstance(values['fleet_id'], int) or isinstance(values['fleet_id'], bool):
+            errors.append(row_error(index, 'fleet_id 必须为整数', plate_number=values['plate_number']))
+            continue
+        too_long = [
+            field for field, limit in VEHICLE_FIELDS.items()
+            if limit and values.get(field) is not None and len(str(values[field])) > limit
+        ]
+        if too_long:
+            errors.append(row_error(index, f'字段超长: {", ".join(too_long)}', plate_number=values['plate_number']))
+            continue
+        if values['plate_number'] in seen:
+            errors.append(row_error(
+                index, f'车牌号与第 {seen[values["plate_number"]] + 1} 条重复', plate_number=values['plate_number']
+            ))
+            continue
+        seen[values['plate_number']] = index
+        valid.append((index, values))
+
+    fleet_ids = {values['fleet_id'] for _, values in valid}
+    existing_fleets = set(session.execute(select(Fleet.id).where(Fleet.id.in_(fleet_ids))).scalars()) if fleet_ids else set()
+    checked = []
+    for index, values in valid:
+        if values['fleet_id'] in existing_fleets:
+            checked.append((index, values))
+        else:
+            errors.append(row_error(index, '车队不存在', plate_number=values['plate_number']))
+    return checked, errors
+
+
+def upsert_vehicle_batch(session, batch):
+    plates = [values['plate_number'] for _, values in batch]
+    existing = set(session.execute(select(Vehicle.plate_number).where(Vehicle.plate_number.in_(plates))).scalars())
+
+    # 提交字段相同的行合成一条多行语句，冲突时只覆盖本次提交的字段
+    groups = {}
+    for _, values in batch:
+        groups.setdefault(tuple(sorted(values)), []).append(values)
+    now = datetime.utcnow()
+    for columns, rows in groups.items():
+        upsert(
+            session,
+            Vehicle.__table__,
+            [{**values, 'created_at': now, 'updated_at': now} for values in rows],
+            key_columns=('plate_number',),
+            update_columns=[column for column in columns if column != 'plate_number'] + ['updated_at']
+        )
+
+    ids = dict(session.execute(select(Vehicle.plate_number, Vehicle.id).where(Vehicle.plate_number.in_(plates))).all())
+    return [
+        {
+            'index': index,
+            'status': 'updated' if values['plate_number'] in existing else 'created',
+            'id': ids[values['plate_number']],
+            'plate_number': values['plate_number']
+        }
+        for index, values in batch
+    ]
+
+
+def upsert_vehicles(session, items, on_error='rollback', batch_size=DEFAULT_BATCH_SIZE):
+    # 按车牌号新增或更新；返回 (是否已写入, 按提交顺序排列的逐行结果)，由调用方提交或回滚事务
+    check_payload(items, on_error)
+    valid, results = validate_vehicles(session, items)
+    if results and on_error == 'rollback':
+        return False, sorted(results, key=lambda result: result['index'])
+
+    for batch in iter_chunks(valid, batch_size):
+        if on_error == 'rollback':
+            results.extend(upsert_vehicle_batch(session, batch))
+            continue
+        # skip 模式下每批使用保存点，单批失败不影响其他批次
+        try:
+            with session.begin_nested():
+                results.extend(upsert_vehicle_batch(session, batch))
+        except IntegrityError as e:
+            results.extend(
+                row_error(index, f'写入失败: {e.orig}', plate_number=values['plate_number']) for index, values in batch
+            )
+    return True, sorted(results, key=lambda result: result['index'])
+
+
+def delete_vehicles(session, ids, on_error='rollback', batch_size=DEFAULT_BATCH_SIZE):
+    # 按ID批量删除；rollback 模式下有任一车辆不存在时不删除，返回 (是否已删除, 逐行结果)
+    check_payload(ids, on_error)
+    results = []
+    targets = []
+    for index, vehicle_id in enumerate(ids):
+        if not isinstance(vehicle_id, int) or isinstance(vehicle_id, bool):
+            results.append(row_error(index, 'ID 必须为整数', id=vehicle_id))
+        else:
+            targets.append((index, vehicle_id))
+
+    existing = {}
+    for batch in iter_chunks([vehicle_id for _, vehicle_id in targets], batch_size):
+        existing.update(session.execute(select(Vehicle.id, Vehicle.plate_number).where(Vehicle.id.in_(batch))).all())
+    for index, vehicle_id in targets:
+        if vehicle_id not in existing:
+            results.append({'index': index, 'status': 'not_found', 'id': vehicle_id})
+
+    if results and on_error == 'rollback':
+        return False, sorted(results, key=lambda result: result['index'])
+
+    for batch in iter_chunks(sorted(existing), batch_size):
+        session.execute(delete(Vehicle.__table__).where(Vehicle.__table__.c.id.in_(batch)))
+    results.extend(
+        {'index': index, 'status': 'deleted', 'id': vehicle_id, 'plate_number': existing[vehicle_id]}
+        for index, vehicle_id in targets if vehicle_id in existing
+    )
+    return True, sorted(results, key=lambda result: result['index'])
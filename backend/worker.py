@@ -0,0 +1,4 @@
+# Celery worker 入口（JOB_BACKEND=celery）：cd backend && celery -A worker:celery worker --concurrency 4
+from app import job_runner
+
+celery = job_runner.celery
@@ -1,19 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response
 from flask_cors import CORS
-from supabase import create_client, Client
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import contextvars
+import hashlib
+import json
 import os
-import jwt
+import sys
+import threading
+import time
 import uuid
 from functools import wraps
-from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+# 冷启动：supabase / postgrest / httpx / jwt 在首次使用时才导入，不计入函数实例的启动时间
+# （冷启动耗时可用 scripts/check_cold_start.py 检查）
+
+# 加载环境变量（本地开发读取 .env，Vercel 上环境变量由平台注入）
+if not os.environ.get('VERCEL'):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# 与 backend 共用的模块直接从 backend/ 导入，vercel.json 的 includeFiles 将其打包进函数
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'backend'))
+
+from metrics import RequestMetrics, check_metrics_token
+from passwords import HashingBusy, password_hasher
+from serializers import FastJSONProvider
 
 # 创建Flask应用
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # 配置
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
@@ -27,8 +45,219 @@ SUPABASE_URL = os.environ.get('SUPABASE_URL', 'https://your-project.supabase.co'
 SUPABASE_KEY = os.environ.get('SUPABASE_ANON_KEY', 'your-anon-key')
 SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_KEY', 'your-service-key')
 
-# 创建Supabase客户端
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+# Supabase HTTP连接池：热实例内的请求复用同一组长连接，连接数与超时可通过环境变量调整
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.environ.get('SUPABASE_HTTP_MAX_CONNECTIONS', 20))
+SUPABASE_HTTP_MAX_KEEPALIVE = int(os.environ.get('SUPABASE_HTTP_MAX_KEEPALIVE', 10))
+SUPABASE_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('SUPABASE_HTTP_KEEPALIVE_EXPIRY', 30))
+SUPABASE_HTTP_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_TIMEOUT', 10))
+SUPABASE_HTTP_CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_CONNECT_TIMEOUT', 5))
+# 单个请求内并发执行的Supabase查询上限
+SUPABASE_MAX_CONCURRENCY = int(os.environ.get('SUPABASE_MAX_CONCURRENCY', 8))
+
+# Supabase客户端在首次使用时创建，热实例内复用
+_supabase = None
+_supabase_lock = threading.Lock()
+
+# 占位：postgrest 的 APIError 随客户端一起载入，在此之前不会发出 Supabase 请求，占位类不会被抛出
+class APIError(Exception):
+    code = None
+
+def get_supabase():
+    global _supabase
+    if _supabase is None:
+        with _supabase_lock:
+            if _supabase is None:
+                _supabase = create_supabase_client()
+    return _supabase
+
+def create_supabase_client():
+    global APIError
+    from supabase import create_client
+    from postgrest.exceptions import APIError
+    
+    client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    configure_postgrest_session(client)
+    return client
+
+def configure_postgrest_session(client, transport=None):
+    # 用配置好连接池和超时的会话替换 PostgREST 默认会话
+    import httpx
+    from postgrest.utils import SyncClient
+    
+    postgrest = client.postgrest
+    previous = postgrest.session
+    postgrest.session = SyncClient(
+        base_url=previous.base_url,
+        headers=previous.headers,
+        timeout=httpx.Timeout(SUPABASE_HTTP_TIMEOUT, connect=SUPABASE_HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_HTTP_KEEPALIVE_EXPIRY
+        ),
+        follow_redirects=True,
+        http2=transport is None,
+        transport=transport,
+        event_hooks={'request': [supabase_request_hook], 'response': [supabase_response_hook]}
+    )
+    previous.close()
+
+def configure_supabase_http(transport=None):
+    # transport 可指向本地桩服务（见 scripts/postgrest_stub.py）
+    configure_postgrest_session(get_supabase(), transport)
+
+supabase_executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_CONCURRENCY, thread_name_prefix='supabase')
+
+def execute_concurrently(*queries):
+    # 相互独立的查询并发执行，按传入顺序返回结果；任一查询出错时抛出该异常
+    if len(queries) <= 1:
+        return [query.execute() for query in queries]
+    # 每个任务复制当前上下文，工作线程内仍可访问本请求的 g（用于请求埋点）
+    futures = [supabase_executor.submit(contextvars.copy_context().run, query.execute) for query in queries]
+    return [future.result() for future in futures]
+
+# 带过期时间的LRU缓存（进程内，热实例之间不共享）
+class TTLCache:
+    def __init__(self, maxsize=256, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+            }
+
+# 车辆总数缓存：按 (关键词, 统计方式) 缓存，车辆写入时清空
+vehicle_count_cache = TTLCache(
+    maxsize=int(os.environ.get('VEHICLE_COUNT_CACHE_SIZE', 256)),
+    ttl=float(os.environ.get('VEHICLE_COUNT_CACHE_TTL', 30))
+)
+
+# 已验证token缓存：按token摘要缓存用户ID，有效期不超过token自身的exp
+token_cache = TTLCache(
+    maxsize=int(os.environ.get('TOKEN_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('TOKEN_CACHE_TTL', 300))
+)
+
+# 当前用户信息缓存：按用户ID缓存 /api/auth/me 的查询结果，本应用更新 users 行后调用 invalidate_user；
+# 在 Supabase 控制台等其他途径修改的用户信息（如角色）最多延迟 USER_CACHE_TTL 秒可见
+user_cache = TTLCache(
+    maxsize=int(os.environ.get('USER_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('USER_CACHE_TTL', 60))
+)
+
+def invalidate_user(user_id):
+    user_cache.delete(str(user_id))
+
+# 读接口响应缓存：按 (路径, 查询参数, 角色, 依赖表版本) 缓存响应体；表有写入时调用 invalidate_tables，
+# 版本号变化后旧条目不再命中，随LRU淘汰。其他实例或其他系统写入的数据最多延迟 RESPONSE_CACHE_TTL 秒可见
+response_cache = TTLCache(
+    maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 512)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 30))
+)
+table_versions = {}
+table_versions_lock = threading.Lock()
+
+# 各缓存的命中情况见 /api/health 的 caches 字段与 /api/metrics 的 cache_* 指标
+CACHES = {
+    'token': token_cache,
+    'user': user_cache,
+    'vehicle_count': vehicle_count_cache,
+    'response': response_cache
+}
+
+def invalidate_tables(*tables):
+    with table_versions_lock:
+        for table in tables:
+            table_versions[table] = table_versions.get(table, 0) + 1
+
+def get_table_versions(tables):
+    with table_versions_lock:
+        return tuple(table_versions.get(table, 0) for table in tables)
+
+# 请求埋点：各路由的耗时、每个请求的 Supabase 请求数与耗时，指标见 /api/metrics
+request_metrics = RequestMetrics(call_metric='supabase_requests', call_help='Supabase请求')
+request_metrics.init_app(app)
+request_metrics.registry.describe('cache_hits_total', 'counter', '缓存命中次数')
+request_metrics.registry.describe('cache_misses_total', 'counter', '缓存未命中次数')
+request_metrics.registry.describe('cache_hit_ratio', 'gauge', '缓存命中率（尚无查询时不输出）')
+request_metrics.registry.describe('cache_entries', 'gauge', '缓存条目数')
+
+def collect_cache_metrics():
+    # 抓取时从各缓存读取累计值
+    registry = request_metrics.registry
+    for name, cache in CACHES.items():
+        stats = cache.stats()
+        labels = (('cache', name),)
+        registry.set('cache_hits_total', labels, stats['hits'])
+        registry.set('cache_misses_total', labels, stats['misses'])
+        registry.set('cache_entries', labels, stats['size'])
+        if stats['hit_ratio'] is not None:
+            registry.set('cache_hit_ratio', labels, stats['hit_ratio'])
+
+# PostgREST 会话的 httpx 事件钩子：按表统计请求数与耗时（至收到响应头）
+def supabase_request_hook(http_request):
+    http_request.extensions['metrics_started'] = time.perf_counter()
+
+def supabase_response_hook(response):
+    http_request = response.request
+    started = http_request.extensions.get('metrics_started')
+    if started is None:
+        return
+    target = http_request.url.path.split('/rest/v1/', 1)[-1]
+    request_metrics.record_call(
+        f'{http_request.method} {target}',
+        time.perf_counter() - started,
+        method=http_request.method,
+        table=target,
+        status=response.status_code
+    )
+
+def too_many_requests():
+    return jsonify({
+        'code': 429,
+        'message': '请求过多，请稍后重试'
+    }), 429, {'Retry-After': '1'}
 
 # JWT工具函数
 def create_access_token(user_id):
@@ -36,18 +265,48 @@ def create_access_token(user_id):
         'user_id': str(user_id),
         'exp': datetime.utcnow() + timedelta(hours=24)
     }
+    import jwt
+    
     # 明确指定算法参数以兼容新版本PyJWT
     return jwt.encode(payload, app.config['JWT_SECRET_KEY'], algorithm='HS256')
 
 def decode_token(token):
+    cache_key = hashlib.sha256(token.encode('utf-8')).digest()
+    user_id = token_cache.get(cache_key)
+    if user_id is not None:
+        return user_id
+    
+    import jwt
+    
     try:
         # 明确指定算法列表以兼容新版本PyJWT
         payload = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        return payload['user_id']
+        user_id = payload['user_id']
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    
+    # 只缓存验证通过的token，缓存时间不超过剩余有效期
+    remaining = payload['exp'] - time.time() if 'exp' in payload else token_cache.ttl
+    if remaining > 0:
+        token_cache.set(cache_key, user_id, ttl=min(token_cache.ttl, remaining))
+    return user_id
+
+# 游标工具函数
+def encode_cursor(created_at, record_id):
+    payload = json.dumps([created_at, record_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        # 校验时间格式与UUID，防止拼接进过滤表达式
+        datetime.fromisoformat(created_at)
+        return created_at, str(uuid.UUID(record_id))
+    except (ValueError, TypeError):
+        raise ValueError('无效的游标')
 
 # JWT装饰器
 def jwt_required(f):
@@ -75,6 +334,51 @@ def jwt_required(f):
     
     return decorated_function
 
+# 响应缓存装饰器：放在 jwt_required 之后；只缓存 200 响应，带 ETag / Last-Modified，
+# 客户端携带 If-None-Match / If-Modified-Since 且缓存命中时直接返回 304，不访问数据库
+def cached_response(*tables):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                role = current_user_role()
+            except Exception:
+                # 无法确定角色时不使用缓存，由路由自行查询和处理错误
+                return f(*args, **kwargs)
+            # 版本号在查询之前读取：查询期间发生的写入会使本次结果在下次请求时失效
+            key = (
+                request.path,
+                tuple(sorted(request.args.items(multi=True))),
+                role,
+                get_table_versions(tables)
+            )
+            entry = response_cache.get(key)
+            cache_status = 'HIT'
+            if entry is None:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'last_modified': datetime.utcnow().replace(microsecond=0)
+                }
+                response_cache.set(key, entry)
+                cache_status = 'MISS'
+            
+            response = Response(entry['body'], mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            response.last_modified = entry['last_modified']
+            # 需要登录的数据：浏览器可保存，但每次使用前须向服务端校验
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.headers['X-Cache'] = cache_status
+            return response.make_conditional(request)
+        
+        return decorated_function
+    return decorator
+
 # 认证路由
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -91,16 +395,17 @@ def register():
                 'message': '用户名、邮箱和密码不能为空'
             }), 400
         
-        # 检查用户名是否已存在
-        existing_user = supabase.table('users').select('id').eq('username', username).execute()
+        # 并发检查用户名、邮箱是否已存在
+        existing_user, existing_email = execute_concurrently(
+            get_supabase().table('users').select('id').eq('username', username).limit(1),
+            get_supabase().table('users').select('id').eq('email', email).limit(1)
+        )
         if existing_user.data:
             return jsonify({
                 'code': 400,
                 'message': '用户名已存在'
             }), 400
         
-        # 检查邮箱是否已存在
-        existing_email = supabase.table('users').select('id').eq('email', email).execute()
         if existing_email.data:
             return jsonify({
                 'code': 400,
@@ -112,11 +417,11 @@ def register():
             'id': str(uuid.uuid4()),
             'username': username,
             'email': email,
-            'password_hash': generate_password_hash(password, method='scrypt'),
+            'password_hash': password_hasher.hash(password),
             'role': role
         }
         
-        result = supabase.table('users').insert(user_data).execute()
+        result = get_supabase().table('users').insert(user_data).execute()
         
         if result.data:
             user = result.data[0]
@@ -141,6 +446,8 @@ def register():
                 'message': '注册失败'
             }), 500
             
+    except HashingBusy:
+        return too_many_requests()
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -161,7 +468,7 @@ def login():
             }), 400
         
         # 从Supabase查询用户
-        result = supabase.table('users').select('*').eq('username', username).execute()
+        result = get_supabase().table('users').select('*').eq('username', username).execute()
         
         if not result.data:
             return jsonify({
@@ -171,8 +478,17 @@ def login():
         
         user = result.data[0]
         
-        # 验证密码
-        if check_password_hash(user['password_hash'], password):
+        # 验证密码（有界线程池，繁忙时返回 429）
+        if password_hasher.verify(user['password_hash'], password):
+            # 存量哈希参数与当前配置不同时顺带重算；线程池繁忙或写入失败则留到下次登录
+            if password_hasher.needs_rehash(user['password_hash']):
+                try:
+                    get_supabase().table('users').update(
+                        {'password_hash': password_hasher.hash(password)}
+                    ).eq('id', user['id']).execute()
+                    invalidate_user(user['id'])
+                except (HashingBusy, APIError):
+                    pass
             access_token = create_access_token(user['id'])
             return jsonify({
                 'code': 200,
@@ -194,25 +510,38 @@ def login():
                 'message': '用户名或密码错误'
             }), 401
             
+    except HashingBusy:
+        return too_many_requests()
     except Exception as e:
         return jsonify({
             'code': 500,
             'message': f'服务器错误: {str(e)}'
         }), 500
 
+def get_user_profile(user_id):
+    user = user_cache.get(str(user_id))
+    if user is None:
+        # 从Supabase查询用户信息
+        result = get_supabase().table('users').select('id, username, email, role, created_at').eq('id', user_id).execute()
+        if result.data:
+            user = result.data[0]
+            user_cache.set(str(user_id), user)
+    return user
+
+def current_user_role():
+    user = get_user_profile(request.current_user_id)
+    return user['role'] if user else None
+
 @app.route('/api/auth/me', methods=['GET'])
 @jwt_required
 def get_current_user():
     try:
-        user_id = request.current_user_id
-        
-        # 从Supabase查询用户信息
-        result = supabase.table('users').select('id, username, email, role, created_at').eq('id', user_id).execute()
+        user = get_user_profile(request.current_user_id)
         
-        if result.data:
+        if user:
             return jsonify({
                 'code': 200,
-                'data': result.data[0]
+                'data': user
             })
         else:
             return jsonify({
@@ -227,50 +556,175 @@ def get_current_user():
         }), 500
 
 # 车辆管理路由
+VEHICLE_LIST_FIELDS = (
+    'id', 'license_plate', 'vehicle_type', 'fleet_id', 'fleet_name',
+    'driver_name', 'driver_phone', 'status', 'remark', 'created_at'
+)
+
+# 列表响应格式：默认每行一个对象；?format=columnar 时每个字段一个数组，适合大列表
+def wants_columnar():
+    return request.args.get('format') == 'columnar'
+
+def vehicle_items(rows):
+    if not wants_columnar():
+        return [format_vehicle(vehicle) for vehicle in rows]
+    # 直接从查询结果按列取值，不逐行构造中间字典
+    columns = {field: [row.get(field) for row in rows] for field in VEHICLE_LIST_FIELDS}
+    if rows and 'fleets' in rows[0]:
+        columns['fleet_name'] = [row['fleets']['name'] if row['fleets'] else None for row in rows]
+    return columns
+
+def format_vehicle(vehicle):
+    return {
+        'id': vehicle['id'],
+        'license_plate': vehicle['license_plate'],
+        'vehicle_type': vehicle['vehicle_type'],
+        'fleet_id': vehicle['fleet_id'],
+        'fleet_name': vehicle['fleets']['name'] if vehicle['fleets'] else None,
+        'driver_name': vehicle['driver_name'],
+        'driver_phone': vehicle['driver_phone'],
+        'status': vehicle['status'],
+        'remark': vehicle['remark'],
+        'created_at': vehicle['created_at']
+    }
+
+def vehicle_keyword_filter(keyword):
+    return f'license_plate.ilike.%{keyword}%,vehicle_type.ilike.%{keyword}%,driver_name.ilike.%{keyword}%'
+
+# search_vehicles 检索函数（见 003_vehicle_trigram_search.sql）未部署时回退到 ilike 查询
+_vehicle_search_rpc_available = True
+
+def search_vehicles_ranked(keyword, offset, per_page):
+    global _vehicle_search_rpc_available
+    if not _vehicle_search_rpc_available:
+        return None
+    try:
+        result = get_supabase().rpc('search_vehicles', {
+            'keyword': keyword,
+            'result_limit': per_page,
+            'result_offset': offset
+        }).execute()
+    except APIError as e:
+        if e.code not in ('PGRST202', '42883'):
+            raise
+        _vehicle_search_rpc_available = False
+        return None
+    return result.data
+
 @app.route('/api/vehicles', methods=['GET'])
 @jwt_required
+@cached_response('vehicles', 'fleets')
 def get_vehicles():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         keyword = request.args.get('keyword', '')
+        after = request.args.get('after')
+        limit = request.args.get('limit', type=int)
+        
+        # 游标模式：?after=<cursor>&limit=，按 (created_at, id) 倒序，不使用 OFFSET
+        if after is not None or limit is not None:
+            limit = min(max(limit or 20, 1), 200)
+            with_total = request.args.get('with_total', 'false').lower() in ('1', 'true')
+            
+            total = vehicle_count_cache.get((keyword, 'exact')) if with_total else None
+            count_method = 'exact' if with_total and total is None else None
+            
+            query = get_supabase().table('vehicles').select('*, fleets(name)', count=count_method)
+            if keyword:
+                query = query.or_(vehicle_keyword_filter(keyword))
+            if after:
+                try:
+                    cursor_time, cursor_id = decode_cursor(after)
+                except ValueError as e:
+                    return jsonify({
+                        'code': 400,
+                        'message': str(e)
+                    }), 400
+                query = query.or_(f'created_at.lt."{cursor_time}",and(created_at.eq."{cursor_time}",id.lt.{cursor_id})')
+            
+            # 多取一条用于判断是否还有下一页
+            result = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1).execute()
+            rows = result.data[:limit]
+            has_more = len(result.data) > limit
+            
+            data = {
+                'items': vehicle_items(rows),
+                'limit': limit,
+                'has_more': has_more,
+                'next_cursor': encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+            }
+            if with_total:
+                if total is None:
+                    total = result.count
+                    vehicle_count_cache.set((keyword, 'exact'), total)
+                data['total'] = total
+            
+            return jsonify({
+                'code': 200,
+                'data': data
+            })
+        
+        # 统计方式：exact 精确计数；planned/estimated 使用执行计划估算，适用于超大表
+        count_method = request.args.get('count', 'exact')
+        if count_method not in ('exact', 'planned', 'estimated'):
+            count_method = 'exact'
         
         # 计算偏移量
         offset = (page - 1) * per_page
         
-        # 构建查询
-        query = supabase.table('vehicles').select('*, fleets(name)')
-        
+        # 关键词检索优先走 trigram 索引并按相似度排序，总数随结果一并返回
         if keyword:
-            # Supabase使用ilike进行模糊搜索
-            query = query.or_(f'license_plate.ilike.%{keyword}%,vehicle_type.ilike.%{keyword}%,driver_name.ilike.%{keyword}%')
+            ranked = search_vehicles_ranked(keyword, offset, per_page)
+            if ranked:
+                total = ranked[0]['total_count']
+                if wants_columnar():
+                    vehicles = vehicle_items(ranked)
+                else:
+                    vehicles = [
+                        {key: value for key, value in row.items() if key not in ('rank', 'total_count')}
+                        for row in ranked
+                    ]
+                return jsonify({
+                    'code': 200,
+                    'data': {
+                        'items': vehicles,
+                        'total': total,
+                        'page': page,
+                        'per_page': per_page,
+                        'pages': (total + per_page - 1) // per_page
+                    }
+                })
         
-        # 获取总数
-        count_result = supabase.table('vehicles').select('id', count='exact')
-        if keyword:
-            count_result = count_result.or_(f'license_plate.ilike.%{keyword}%,vehicle_type.ilike.%{keyword}%,driver_name.ilike.%{keyword}%')
-        count_data = count_result.execute()
-        total = count_data.count
+        # 相同关键词的总数在短时间内复用缓存，命中时不再请求计数
+        cache_key = (keyword, count_method)
+        total = vehicle_count_cache.get(cache_key)
+        
+        def build_query(count):
+            # 按 (created_at, id) 倒序，保证翻页顺序稳定
+            query = get_supabase().table('vehicles').select('*, fleets(name)', count=count).order('created_at', desc=True).order('id', desc=True)
+            if keyword:
+                # Supabase使用ilike进行模糊搜索
+                query = query.or_(vehicle_keyword_filter(keyword))
+            return query
         
-        # 获取分页数据
-        result = query.range(offset, offset + per_page - 1).execute()
+        # 分页数据与总数在同一次请求中返回（总数取自 Content-Range 响应头）
+        try:
+            result = build_query(count_method if total is None else None).range(offset, offset + per_page - 1).execute()
+            rows = result.data
+            if total is None:
+                total = result.count or 0
+        except APIError as e:
+            # 偏移量超出总数时 PostgREST 返回 416，此时按空页处理
+            if e.code != 'PGRST103':
+                raise
+            rows = []
+            if total is None:
+                total = build_query(count_method).limit(1).execute().count or 0
+        vehicle_count_cache.set(cache_key, total)
         
         # 处理数据格式
-        vehicles = []
-        for vehicle in result.data:
-            vehicle_data = {
-                'id': vehicle['id'],
-                'license_plate': vehicle['license_plate'],
-                'vehicle_type': vehicle['vehicle_type'],
-                'fleet_id': vehicle['fleet_id'],
-                'fleet_name': vehicle['fleets']['name'] if vehicle['fleets'] else None,
-                'driver_name': vehicle['driver_name'],
-                'driver_phone': vehicle['driver_phone'],
-                'status': vehicle['status'],
-                'remark': vehicle['remark'],
-                'created_at': vehicle['created_at']
-            }
-            vehicles.append(vehicle_data)
+        vehicles = vehicle_items(rows)
         
         return jsonify({
             'code': 200,
@@ -289,21 +743,40 @@ def get_vehicles():
             'message': f'服务器错误: {str(e)}'
         }), 500
 
+# 车辆写入直接依赖数据库约束，不预先查询；约束错误码映射为 400 响应
+VEHICLE_CONSTRAINT_MESSAGES = {
+    '23505': '车牌号已存在',
+    '23503': '车队不存在',
+    '23502': '缺少必填字段',
+    '22P02': '数据格式错误'
+}
+
+def vehicle_write_error(error):
+    message = VEHICLE_CONSTRAINT_MESSAGES.get(error.code)
+    if message is None:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(error)}'
+        }), 500
+    return jsonify({
+        'code': 400,
+        'message': message
+    }), 400
+
+def is_valid_uuid(value):
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
 @app.route('/api/vehicles', methods=['POST'])
 @jwt_required
 def create_vehicle():
     try:
         data = request.get_json()
         
-        # 检查车牌号是否已存在
-        existing = supabase.table('vehicles').select('id').eq('license_plate', data['license_plate']).execute()
-        if existing.data:
-            return jsonify({
-                'code': 400,
-                'message': '车牌号已存在'
-            }), 400
-        
-        # 创建车辆记录
+        # 创建车辆记录，车牌号重复由 UNIQUE(license_plate) 拦截
         vehicle_data = {
             'license_plate': data['license_plate'],
             'vehicle_type': data['vehicle_type'],
@@ -314,7 +787,9 @@ def create_vehicle():
             'remark': data.get('remark')
         }
         
-        result = supabase.table('vehicles').insert(vehicle_data).execute()
+        result = get_supabase().table('vehicles').insert(vehicle_data).execute()
+        vehicle_count_cache.clear()
+        invalidate_tables('vehicles')
         
         return jsonify({
             'code': 200,
@@ -322,6 +797,8 @@ def create_vehicle():
             'data': result.data[0]
         })
         
+    except APIError as e:
+        return vehicle_write_error(e)
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -334,30 +811,27 @@ def update_vehicle(vehicle_id):
     try:
         data = request.get_json()
         
-        # 检查车辆是否存在
-        existing = supabase.table('vehicles').select('id').eq('id', vehicle_id).execute()
-        if not existing.data:
+        if not is_valid_uuid(vehicle_id):
             return jsonify({
                 'code': 404,
                 'message': '车辆不存在'
             }), 404
         
-        # 如果更新车牌号，检查是否重复
-        if 'license_plate' in data:
-            duplicate = supabase.table('vehicles').select('id').eq('license_plate', data['license_plate']).neq('id', vehicle_id).execute()
-            if duplicate.data:
-                return jsonify({
-                    'code': 400,
-                    'message': '车牌号已存在'
-                }), 400
-        
         # 更新车辆信息
         update_data = {}
         for key in ['license_plate', 'vehicle_type', 'fleet_id', 'driver_name', 'driver_phone', 'status', 'remark']:
             if key in data:
                 update_data[key] = data[key]
         
-        result = supabase.table('vehicles').update(update_data).eq('id', vehicle_id).execute()
+        # 单条 UPDATE ... RETURNING：未返回行即车辆不存在，车牌号重复由唯一约束拦截
+        result = get_supabase().table('vehicles').update(update_data).eq('id', vehicle_id).execute()
+        if not result.data:
+            return jsonify({
+                'code': 404,
+                'message': '车辆不存在'
+            }), 404
+        vehicle_count_cache.clear()
+        invalidate_tables('vehicles')
         
         return jsonify({
             'code': 200,
@@ -365,6 +839,8 @@ def update_vehicle(vehicle_id):
             'data': result.data[0]
         })
         
+    except APIError as e:
+        return vehicle_write_error(e)
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -375,16 +851,21 @@ def update_vehicle(vehicle_id):
 @jwt_required
 def delete_vehicle(vehicle_id):
     try:
-        # 检查车辆是否存在
-        existing = supabase.table('vehicles').select('id').eq('id', vehicle_id).execute()
-        if not existing.data:
+        if not is_valid_uuid(vehicle_id):
             return jsonify({
                 'code': 404,
                 'message': '车辆不存在'
             }), 404
         
-        # 删除车辆
-        supabase.table('vehicles').delete().eq('id', vehicle_id).execute()
+        # 单条 DELETE ... RETURNING id：未返回行即车辆不存在
+        result = get_supabase().table('vehicles').delete().eq('id', vehicle_id).execute()
+        if not result.data:
+            return jsonify({
+                'code': 404,
+                'message': '车辆不存在'
+            }), 404
+        vehicle_count_cache.clear()
+        invalidate_tables('vehicles')
         
         return jsonify({
             'code': 200,
@@ -397,15 +878,235 @@ def delete_vehicle(vehicle_id):
             'message': f'服务器错误: {str(e)}'
         }), 500
 
+# 车辆批量写入
+VEHICLE_BULK_BATCH_SIZE = int(os.environ.get('VEHICLE_BULK_BATCH_SIZE', 500))
+VEHICLE_BULK_MAX_ROWS = 5000
+VEHICLE_BULK_ON_ERROR_MODES = ('rollback', 'skip')
+VEHICLE_WRITE_FIELDS = ('license_plate', 'vehicle_type', 'fleet_id', 'driver_name', 'driver_phone', 'status', 'remark')
+
+def chunked(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def bulk_summary(results):
+    results = sorted(results, key=lambda result: result['index'])
+    summary = {'results': results}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return summary
+
+def check_bulk_payload(items, on_error):
+    if on_error not in VEHICLE_BULK_ON_ERROR_MODES:
+        return f'on_error 仅支持: {", ".join(VEHICLE_BULK_ON_ERROR_MODES)}'
+    if not isinstance(items, list) or not items:
+        return '请提供非空的数组'
+    if len(items) > VEHICLE_BULK_MAX_ROWS:
+        return f'单次最多提交 {VEHICLE_BULK_MAX_ROWS} 条'
+    return None
+
+def undo_bulk_upsert(created_ids, previous_rows):
+    # 补偿已写入的批次；期间其他请求对这些车辆的修改会被覆盖
+    queries = [
+        get_supabase().table('vehicles').delete().in_('id', batch) for batch in chunked(created_ids, VEHICLE_BULK_BATCH_SIZE)
+    ] + [
+        get_supabase().table('vehicles').upsert(batch, on_conflict='license_plate')
+        for batch in chunked(previous_rows, VEHICLE_BULK_BATCH_SIZE)
+    ]
+    execute_concurrently(*queries)
+
+@app.route('/api/vehicles/bulk', methods=['POST'])
+@jwt_required
+def bulk_upsert_vehicles():
+    try:
+        data = request.get_json() or {}
+        items = data.get('vehicles')
+        on_error = data.get('on_error', 'rollback')
+        
+        message = check_bulk_payload(items, on_error)
+        if message:
+            return jsonify({
+                'code': 400,
+                'message': message
+            }), 400
+        
+        # 整体校验：必填字段、格式（车牌号须为字符串）、本次提交内车牌重复
+        results, valid, seen = [], [], {}
+        for index, item in enumerate(items):
+            values = {key: item[key] for key in VEHICLE_WRITE_FIELDS if key in item} if isinstance(item, dict) else {}
+            plate = values.get('license_plate')
+            missing = [key for key in ('license_plate', 'vehicle_type', 'fleet_id') if values.get(key) in (None, '')]
+            if missing:
+                results.append({'index': index, 'status': 'error', 'license_plate': plate, 'message': f'缺少必填字段: {", ".join(missing)}'})
+            elif not isinstance(plate, str):
+                results.append({'index': index, 'status': 'error', 'license_plate': plate, 'message': 'license_plate 格式错误'})
+            elif not is_valid_uuid(values['fleet_id']):
+                results.append({'index': index, 'status': 'error', 'license_plate': plate, 'message': 'fleet_id 格式错误'})
+            elif plate in seen:
+                results.append({'index': index, 'status': 'error', 'license_plate': plate, 'message': f'车牌号与第 {seen[plate] + 1} 条重复'})
+            else:
+                seen[plate] = index
+                valid.append((index, values))
+        
+        # 车队是否存在、车牌是否已存在（用于区分新增/更新）并发查询
+        fleet_ids = sorted({values['fleet_id'] for _, values in valid})
+        plates = [values['license_plate'] for _, values in valid]
+        queries = [
+            get_supabase().table('fleets').select('id').in_('id', batch) for batch in chunked(fleet_ids, VEHICLE_BULK_BATCH_SIZE)
+        ] + [
+            get_supabase().table('vehicles').select(','.join(VEHICLE_WRITE_FIELDS)).in_('license_plate', batch)
+            for batch in chunked(plates, VEHICLE_BULK_BATCH_SIZE)
+        ]
+        lookups = execute_concurrently(*queries)
+        fleet_batches = len(chunked(fleet_ids, VEHICLE_BULK_BATCH_SIZE))
+        existing_fleets = {row['id'] for result in lookups[:fleet_batches] for row in result.data}
+        # 已存在车辆的原值，rollback 模式写入失败时用于恢复
+        existing_rows = {row['license_plate']: row for result in lookups[fleet_batches:] for row in result.data}
+        
+        checked = []
+        for index, values in valid:
+            if values['fleet_id'] in existing_fleets:
+                checked.append((index, values))
+            else:
+                results.append({'index': index, 'status': 'error', 'license_plate': values['license_plate'], 'message': '车队不存在'})
+        
+        # 提交字段相同的行合成一条多行 upsert，冲突时只覆盖本次提交的字段
+        groups = {}
+        for index, values in checked:
+            groups.setdefault(tuple(sorted(values)), []).append((index, values))
+        
+        if on_error == 'rollback' and results:
+            return jsonify({
+                'code': 400,
+                'message': '数据校验失败，未写入任何车辆',
+                'data': bulk_summary(results)
+            }), 400
+        
+        batches = [batch for rows in groups.values() for batch in chunked(rows, VEHICLE_BULK_BATCH_SIZE)]
+        created_ids, updated_plates = [], []
+        for batch in batches:
+            try:
+                written = get_supabase().table('vehicles').upsert(
+                    [values for _, values in batch], on_conflict='license_plate'
+                ).execute()
+            except APIError as e:
+                if on_error == 'rollback':
+                    # PostgREST 每个请求各自是一个事务，无法跨批次回滚：删除已新增的车辆、恢复已更新车辆的原值
+                    undo_bulk_upsert(created_ids, [existing_rows[plate] for plate in updated_plates])
+                    vehicle_count_cache.clear()
+                    invalidate_tables('vehicles')
+                    return vehicle_write_error(e)
+                results.extend(
+                    {'index': index, 'status': 'error', 'license_plate': values['license_plate'], 'message': f'写入失败: {e.message}'}
+                    for index, values in batch
+                )
+                continue
+            ids = {row['license_plate']: row['id'] for row in written.data}
+            for _, values in batch:
+                if values['license_plate'] in existing_rows:
+                    updated_plates.append(values['license_plate'])
+                elif values['license_plate'] in ids:
+                    created_ids.append(ids[values['license_plate']])
+            results.extend(
+                {
+                    'index': index,
+                    'status': 'updated' if values['license_plate'] in existing_rows else 'created',
+                    'id': ids.get(values['license_plate']),
+                    'license_plate': values['license_plate']
+                }
+                for index, values in batch
+            )
+        vehicle_count_cache.clear()
+        invalidate_tables('vehicles')
+        
+        return jsonify({
+            'code': 200,
+            'message': '批量保存完成',
+            'data': bulk_summary(results)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
+@app.route('/api/vehicles/bulk', methods=['DELETE'])
+@jwt_required
+def bulk_delete_vehicles():
+    try:
+        data = request.get_json() or {}
+        ids = data.get('ids')
+        on_error = data.get('on_error', 'rollback')
+        
+        message = check_bulk_payload(ids, on_error)
+        if message:
+            return jsonify({
+                'code': 400,
+                'message': message
+            }), 400
+        
+        results = [
+            {'index': index, 'status': 'error', 'id': vehicle_id, 'message': 'ID 格式错误'}
+            for index, vehicle_id in enumerate(ids) if not is_valid_uuid(vehicle_id)
+        ]
+        targets = sorted({str(vehicle_id) for vehicle_id in ids if is_valid_uuid(vehicle_id)})
+        
+        if on_error == 'rollback':
+            # 先确认全部存在再删除，避免删到一半才发现缺失
+            lookups = execute_concurrently(*[
+                get_supabase().table('vehicles').select('id').in_('id', batch) for batch in chunked(targets, VEHICLE_BULK_BATCH_SIZE)
+            ])
+            existing = {row['id'] for result in lookups for row in result.data}
+            results.extend(
+                {'index': index, 'status': 'not_found', 'id': vehicle_id}
+                for index, vehicle_id in enumerate(ids) if is_valid_uuid(vehicle_id) and str(vehicle_id) not in existing
+            )
+            if results:
+                return jsonify({
+                    'code': 400,
+                    'message': '部分车辆不存在或ID无效，未删除任何车辆',
+                    'data': bulk_summary(results)
+                }), 400
+        
+        # 每批一条 DELETE ... WHERE id IN (...)，以返回的行确认删除结果
+        deleted = set()
+        for result in execute_concurrently(*[
+            get_supabase().table('vehicles').delete().in_('id', batch) for batch in chunked(targets, VEHICLE_BULK_BATCH_SIZE)
+        ]):
+            deleted.update(row['id'] for row in result.data)
+        vehicle_count_cache.clear()
+        invalidate_tables('vehicles')
+        
+        results.extend(
+            {'index': index, 'status': 'deleted' if str(vehicle_id) in deleted else 'not_found', 'id': vehicle_id}
+            for index, vehicle_id in enumerate(ids) if is_valid_uuid(vehicle_id)
+        )
+        
+        return jsonify({
+            'code': 200,
+            'message': '批量删除完成',
+            'data': bulk_summary(results)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}'
+        }), 500
+
 # 车队管理路由
 @app.route('/api/fleets', methods=['GET'])
 @jwt_required
+@cached_response('fleets')
 def get_fleets():
     try:
-        result = supabase.table('fleets').select('*').execute()
+        result = get_supabase().table('fleets').select('*').execute()
+        data = result.data
+        if wants_columnar():
+            fields = list(data[0]) if data else []
+            data = {field: [row.get(field) for row in data] for field in fields}
         return jsonify({
             'code': 200,
-            'data': result.data
+            'data': data
         })
         
     except Exception as e:
@@ -429,9 +1130,22 @@ def health_check():
     return jsonify({
         'code': 200,
         'message': 'API服务正常运行',
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow().isoformat(),
+        'caches': {name: cache.stats() for name, cache in CACHES.items()}
     })
 
+# Prometheus 指标，需携带 Authorization: Bearer <METRICS_TOKEN>；函数地址公开可访问，未设置 METRICS_TOKEN 时接口关闭
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    denied = check_metrics_token(request.headers.get('Authorization'))
+    if denied:
+        return jsonify({
+            'code': denied[0],
+            'message': denied[1]
+        }), denied[0]
+    collect_cache_metrics()
+    return Response(request_metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 # Vercel函数入口点
 def handler(request):
     return app(request.environ, lambda *args: None)
@@ -0,0 +1,432 @@
+"""接口性能基准：生成合成数据，在进程内驱动两个 Flask 应用，输出各接口的吞吐、延迟分位数与每请求查询数
+
+  backend：backend/app.py，数据写入临时 SQLite 文件（或 --database-url 指定的数据库）
+  vercel： deploy/vercel/api/index.py，数据来自进程内 PostgREST 桩服务（scripts/postgrest_stub.py）
+
+每请求查询数取自应用自身的请求埋点（backend 为 SQL 语句数，vercel 为 Supabase 请求数）。
+结果为 JSON，可保存后与其他提交的结果比较，p95 或查询数变差时返回非零退出码：
+
+    python scripts/bench_api.py --vehicles 10000 --orders 100000 --output bench.json
+    python scripts/bench_api.py --target backend --vehicles 1000000 --orders 5000000 --requests 50
+    python scripts/bench_api.py --compare bench.json --threshold 0.2
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+API_DIR = os.path.join(ROOT, 'deploy', 'vercel', 'api')
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+PROVINCES = '京津沪渝冀豫云辽黑湘皖鲁新苏浙赣鄂桂甘晋蒙陕吉闽贵粤青藏川宁琼'
+PLATE_LETTERS = 'ABCDEFGHJKLMNPQRSTUVWXY'
+VEHICLE_TYPES = ('重卡', '轻卡', '物流车', '网约车', '出租车', '公交车')
+REGIONS = ('华北', '华东', '华南', '西南', '西北', '东北', '华中')
+TIME_PERIODS = (('峰时', Decimal('1.2000')), ('平时', Decimal('0.8500')), ('谷时', Decimal('0.4500')))
+PLATFORM_COUNT = 11
+INSERT_BATCH = 10000
+
+PASSWORD = 'bench-password'
+
+
+# ---- 合成数据 ----
+
+def plate_number(index):
+    return f'{PROVINCES[index % len(PROVINCES)]}{PLATE_LETTERS[(index // len(PROVINCES)) % len(PLATE_LETTERS)]}{index:06d}'
+
+
+def month_starts(months, end=None):
+    end = end or date.today().replace(day=1)
+    starts = []
+    year, month = end.year, end.month
+    for _ in range(months):
+        starts.append(datetime(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return list(reversed(starts))
+
+
+def vehicle_rows(rng, count, fleet_ids, started):
+    span = max(int((datetime.utcnow() - started).total_seconds()), 1)
+    for index in range(count):
+        yield {
+            'plate': plate_number(index),
+            'vehicle_type': rng.choice(VEHICLE_TYPES),
+            'fleet_id': rng.choice(fleet_ids),
+            'driver_name': f'司机{index % 5000:04d}',
+            'driver_phone': f'138{index % 100000000:08d}',
+            'created_at': started + timedelta(seconds=rng.randrange(span))
+        }
+
+
+def order_rows(rng, count, vehicle_ids, station_ids, months):
+    starts = month_starts(months)
+    for index in range(count):
+        platform_id = index % PLATFORM_COUNT + 1
+        started = starts[rng.randrange(len(starts))]
+        kwh = Decimal(rng.randrange(500, 12000)) / 100
+        amount = (kwh * TIME_PERIODS[index % 3][1]).quantize(Decimal('0.01'))
+        yield {
+            'order_no': f'P{platform_id:02d}{index:012d}',
+            'vehicle_id': rng.choice(vehicle_ids),
+            'station_id': rng.choice(station_ids),
+            'platform_id': platform_id,
+            'charge_kwh': kwh,
+            'amount': amount,
+            'settlement_amount': (amount * Decimal('0.95')).quantize(Decimal('0.01')),
+            'order_time': started + timedelta(seconds=rng.randrange(28 * 86400)),
+            'status': 'completed' if index % 50 else 'pending'
+        }
+
+
+def batches(rows, size=INSERT_BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---- backend/app.py ----
+
+def setup_backend(args):
+    database_url = args.database_url or f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")}'
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, BACKEND_DIR)
+    import app as backend
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert, select
+
+    import balance
+    import dashboard
+    from models import (
+        DiscountRule, Fleet, Order, PricingRule, RechargeRecord, Station, User, Vehicle, db
+    )
+
+    backend.app.logger.setLevel(logging.ERROR)
+    rng = random.Random(args.seed)
+    with backend.app.app_context():
+        if not args.skip_seed:
+            started = time.perf_counter()
+            db.drop_all()
+            backend.create_tables()
+            session = db.session
+            session.execute(insert(Fleet.__table__), [
+                {'name': f'车队{index:03d}', 'contact_person': f'联系人{index:03d}', 'contact_phone': f'139{index:08d}', 'status': 'active'}
+                for index in range(args.fleets)
+            ])
+            session.execute(insert(Station.__table__), [
+                {'name': f'充电站{index:04d}', 'region': REGIONS[index % len(REGIONS)], 'status': 'active', 'charging_piles': 10}
+                for index in range(args.stations)
+            ])
+            fleet_ids = list(session.execute(select(Fleet.id)).scalars())
+            station_ids = list(session.execute(select(Station.id)).scalars())
+            effective = month_starts(args.months)[0].date()
+            session.execute(insert(PricingRule.__table__), [
+                {'fleet_id': fleet_id, 'time_period': period, 'price_per_kwh': price, 'effective_date': effective}
+                for fleet_id in fleet_ids for period, price in TIME_PERIODS
+            ])
+            session.execute(insert(DiscountRule.__table__), [
+                {'fleet_id': fleet_id, 'rule_type': '月度折扣', 'discount_rate': Decimal('0.9500'), 'min_amount': 0, 'effective_date': effective}
+                for fleet_id in fleet_ids
+            ])
+
+            for batch in batches(vehicle_rows(rng, args.vehicles, fleet_ids, month_starts(args.months)[0])):
+                session.execute(insert(Vehicle.__table__), [
+                    {**{key: value for key, value in row.items() if key != 'plate'}, 'plate_number': row['plate'], 'status': 'normal'}
+                    for row in batch
+                ])
+            vehicle_fleets = dict(session.execute(select(Vehicle.id, Vehicle.fleet_id)).all())
+            vehicle_ids = list(vehicle_fleets)
+
+            changes = {}
+            for batch in batches(order_rows(rng, args.orders, vehicle_ids, station_ids, args.months)):
+                batch = [{**row, 'fleet_id': vehicle_fleets[row['vehicle_id']]} for row in batch]
+                session.execute(insert(Order.__table__), batch)
+                for key, (consumption, _) in balance.consumption_changes(batch).items():
+                    current = changes.get(key, (Decimal('0'), Decimal('0')))
+                    changes[key] = (current[0] + consumption, current[1])
+
+            recharges = []
+            for fleet_id in fleet_ids:
+                for month_start in month_starts(args.months):
+                    amount = Decimal(rng.randrange(1000, 50000))
+                    recharges.append({
+                        'fleet_id': fleet_id, 'amount': amount, 'payment_method': '银行转账',
+                        'recharge_time': month_start + timedelta(days=rng.randrange(28)), 'status': 'completed'
+                    })
+                    key = (fleet_id, month_start.year, month_start.month)
+                    current = changes.get(key, (Decimal('0'), Decimal('0')))
+                    changes[key] = (current[0], current[1] + amount)
+            session.execute(insert(RechargeRecord.__table__), recharges)
+            balance.apply_changes(session, changes)
+            session.commit()
+            dashboard.rebuild(session, month_starts(args.months)[0].date(), (month_starts(args.months)[-1] + timedelta(days=31)).date())
+            logging.info('backend 数据生成完成，用时 %.1fs', time.perf_counter() - started)
+
+        admin = db.session.execute(select(User).where(User.username == 'admin')).scalar_one()
+        token = create_access_token(identity=admin.id)
+        fleet_id = db.session.execute(select(Fleet.id).limit(1)).scalar()
+
+    year_month = month_starts(args.months)[-1]
+    counter = iter(range(10 ** 9))
+    endpoints = [
+        ('vehicles_page', 'GET', '/api/vehicles?page=1&per_page=20', None),
+        ('vehicles_deep_page', 'GET', f'/api/vehicles?page={max(args.vehicles // 40, 1)}&per_page=20', None),
+        ('vehicles_keyword', 'GET', f'/api/vehicles?keyword={plate_number(args.vehicles // 2)[2:6]}&per_page=20', None),
+        ('vehicles_cursor', 'GET', '/api/vehicles?limit=50', None),
+        ('vehicles_columnar', 'GET', '/api/vehicles?page=1&per_page=200&format=columnar', None),
+        ('fleets', 'GET', '/api/fleets', None),
+        ('auth_me', 'GET', '/api/auth/me', None),
+        ('balance', 'GET', f'/api/reconciliation/balance?year={year_month.year}&month={year_month.month}', None),
+        ('verify_balance', 'GET', f'/api/reconciliation/verify?year={year_month.year}&month={year_month.month}', None),
+        ('dashboard_week', 'GET', f'/api/dashboard/stats?start_date={year_month:%Y-%m-%d}'
+                                  f'&end_date={year_month + timedelta(days=6):%Y-%m-%d}&group_by=day,platform', None),
+        ('export_orders_csv', 'POST', '/api/export/data', lambda: {
+            'table_name': 'orders', 'format': 'csv',
+            'conditions': {'start_date': year_month.strftime('%Y-%m-%d'), 'end_date': (year_month + timedelta(days=2)).strftime('%Y-%m-%d')}
+        }),
+        ('create_vehicle', 'POST', '/api/vehicles', lambda: {
+            'plate_number': f'测{next(counter):08d}', 'vehicle_type': '重卡', 'fleet_id': fleet_id
+        }),
+        ('auth_login', 'POST', '/api/auth/login', lambda: {'username': 'admin', 'password': 'admin123'})
+    ]
+    return {
+        'app': backend.app,
+        'metrics': backend.request_metrics,
+        'headers': {'Authorization': f'Bearer {token}'},
+        'endpoints': endpoints,
+        'database': database_url.split('://', 1)[0]
+    }
+
+
+# ---- deploy/vercel/api/index.py ----
+
+def setup_vercel(args):
+    os.environ.setdefault('SUPABASE_URL', 'http://postgrest-stub.local')
+    os.environ.setdefault('SUPABASE_SERVICE_KEY', 'stub.service.key')
+    # 默认关闭响应缓存，测量的是实际查询路径
+    if not args.response_cache:
+        os.environ['RESPONSE_CACHE_TTL'] = '0'
+    sys.path.insert(0, API_DIR)
+    import httpx
+    import index
+    from postgrest_stub import PostgrestStub
+
+    index.app.logger.setLevel(logging.ERROR)
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    user_id = str(uuid.uuid4())
+    fleets = [
+        {'id': str(uuid.uuid4()), 'name': f'车队{index:03d}', 'contact_person': f'联系人{index:03d}', 'status': 'active', 'created_at': now.isoformat()}
+        for index in range(args.fleets)
+    ]
+    fleet_ids = [fleet['id'] for fleet in fleets]
+    vehicles = [
+        {
+            'id': str(uuid.uuid4()), 'license_plate': row['plate'], 'vehicle_type': row['vehicle_type'],
+            'fleet_id': row['fleet_id'], 'driver_name': row['driver_name'], 'driver_phone': row['driver_phone'],
+            'status': 'active', 'remark': None, 'created_at': row['created_at'].replace(tzinfo=timezone.utc).isoformat()
+        }
+        for row in vehicle_rows(rng, args.stub_vehicles, fleet_ids, month_starts(args.months)[0])
+    ]
+    stub = PostgrestStub(tables={
+        'users': [{
+            'id': user_id, 'username': 'bench', 'email': 'bench@example.com', 'role': 'admin',
+            'password_hash': index.password_hasher.hash(PASSWORD), 'created_at': now.isoformat()
+        }],
+        'fleets': fleets,
+        'vehicles': vehicles
+    }, latency=args.stub_latency)
+    index.configure_supabase_http(transport=httpx.WSGITransport(app=stub.app))
+
+    counter = iter(range(10 ** 9))
+    endpoints = [
+        ('vehicles_page', 'GET', '/api/vehicles?page=1&per_page=20', None),
+        ('vehicles_deep_page', 'GET', f'/api/vehicles?page={max(args.stub_vehicles // 40, 1)}&per_page=20', None),
+        ('vehicles_keyword', 'GET', f'/api/vehicles?keyword={plate_number(args.stub_vehicles // 2)[2:6]}&per_page=20', None),
+        ('vehicles_cursor', 'GET', '/api/vehicles?limit=50', None),
+        ('vehicles_columnar', 'GET', '/api/vehicles?page=1&per_page=200&format=columnar', None),
+        ('fleets', 'GET', '/api/fleets', None),
+        ('auth_me', 'GET', '/api/auth/me', None),
+        ('create_vehicle', 'POST', '/api/vehicles', lambda: {
+            'license_plate': f'测{next(counter):08d}', 'vehicle_type': '重卡', 'fleet_id': fleet_ids[0]
+        }),
+        ('auth_login', 'POST', '/api/auth/login', lambda: {'username': 'bench', 'password': PASSWORD})
+    ]
+    return {
+        'app': index.app,
+        'metrics': index.request_metrics,
+        'headers': {'Authorization': f'Bearer {index.create_access_token(user_id)}'},
+        'endpoints': endpoints,
+        'database': 'postgrest-stub'
+    }
+
+
+# ---- 测量 ----
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 2)
+
+
+def route_of(app, method, path):
+    rule, _ = app.url_map.bind('localhost').match(path.split('?', 1)[0], method, return_rule=True)
+    return rule.rule
+
+
+def run_endpoint(target, name, method, path, body, args):
+    app, metrics = target['app'], target['metrics']
+    client = app.test_client()
+    total = args.requests if not name.startswith('auth_login') else min(args.requests, args.login_requests)
+
+    def send():
+        started = time.perf_counter()
+        response = client.open(path, method=method, headers=target['headers'], json=body() if body else None)
+        response.get_data()
+        return time.perf_counter() - started, response.status_code
+
+    for _ in range(args.warmup):
+        send()
+    route = route_of(app, method, path)
+    calls_metric = f'{metrics.call_metric}_total'
+    calls_before = metrics.registry.total(calls_metric, route=route)
+
+    started = time.perf_counter()
+    if args.concurrency > 1:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(lambda _: send(), range(total)))
+    else:
+        results = [send() for _ in range(total)]
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'endpoint': name,
+        'method': method,
+        'route': route,
+        'requests': total,
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 400),
+        'status_counts': statuses,
+        'throughput_rps': round(total / elapsed, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'queries_per_request': round((metrics.registry.total(calls_metric, route=route) - calls_before) / total, 2),
+        'query_metric': metrics.call_metric
+    }
+
+
+def compare(results, baseline, threshold, noise_ms):
+    # p95 超过基线 (1 + threshold) 倍且差值大于 noise_ms，或每请求查询数增加，视为退化
+    previous = {(item['app'], item['endpoint']): item for item in baseline.get('results', [])}
+    regressions = []
+    for item in results:
+        base = previous.get((item['app'], item['endpoint']))
+        if base is None:
+            continue
+        if item['p95_ms'] > base['p95_ms'] * (1 + threshold) and item['p95_ms'] - base['p95_ms'] > noise_ms:
+            regressions.append({'app': item['app'], 'endpoint': item['endpoint'], 'metric': 'p95_ms', 'baseline': base['p95_ms'], 'current': item['p95_ms']})
+        if item['queries_per_request'] > base['queries_per_request']:
+            regressions.append({
+                'app': item['app'], 'endpoint': item['endpoint'], 'metric': 'queries_per_request',
+                'baseline': base['queries_per_request'], 'current': item['queries_per_request']
+            })
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='接口性能基准')
+    parser.add_argument('--target', choices=('backend', 'vercel', 'all'), default='all')
+    parser.add_argument('--fleets', type=int, default=20)
+    parser.add_argument('--stations', type=int, default=50)
+    parser.add_argument('--vehicles', type=int, default=10000, help='backend 车辆数')
+    parser.add_argument('--orders', type=int, default=100000, help='backend 订单数，均匀分布在 11 个平台')
+    parser.add_argument('--months', type=int, default=6, help='订单与充值覆盖的月数（截至本月）')
+    parser.add_argument('--stub-vehicles', type=int, default=5000, help='vercel 桩服务中的车辆数（桩服务逐行过滤，不宜过大）')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='桩服务每个请求的模拟网络延迟（秒）')
+    parser.add_argument('--database-url', help='backend 数据库，默认临时 SQLite 文件')
+    parser.add_argument('--skip-seed', action='store_true', help='复用 --database-url 中已有的数据')
+    parser.add_argument('--response-cache', action='store_true', help='开启 vercel 的响应缓存（读接口多数命中缓存）')
+    parser.add_argument('--requests', type=int, default=200, help='每个接口的请求数')
+    parser.add_argument('--login-requests', type=int, default=20, help='登录接口的请求数（密码哈希耗时较长）')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=20240101)
+    parser.add_argument('--output', help='结果写入该文件')
+    parser.add_argument('--compare', help='与该基线结果比较')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p95 允许的相对退化')
+    parser.add_argument('--noise-ms', type=float, default=1.0, help='低于该差值的 p95 变化不计')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    setups = {'backend': setup_backend, 'vercel': setup_vercel}
+    names = list(setups) if args.target == 'all' else [args.target]
+    results, databases = [], {}
+    for app_name in names:
+        target = setups[app_name](args)
+        databases[app_name] = target['database']
+        for name, method, path, body in target['endpoints']:
+            result = run_endpoint(target, name, method, path, body, args)
+            logging.info('%-8s %-20s p50=%7.2fms p95=%7.2fms q/req=%.2f', app_name, name, result['p50_ms'], result['p95_ms'], result['queries_per_request'])
+            results.append({'app': app_name, **result})
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'databases': databases,
+            'dataset': {
+                'fleets': args.fleets, 'stations': args.stations, 'vehicles': args.vehicles, 'orders': args.orders,
+                'platforms': PLATFORM_COUNT, 'months': args.months, 'stub_vehicles': args.stub_vehicles, 'seed': args.seed
+            },
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'stub_latency': args.stub_latency,
+            'response_cache': args.response_cache
+        },
+        'results': results
+    }
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            report['regressions'] = compare(results, json.load(file), args.threshold, args.noise_ms)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    print(output)
+    sys.exit(1 if report.get('regressions') else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""登录吞吐与并发接口延迟基准：对比密码哈希在请求线程内计算与有界线程池计算
+
+在本机启动 deploy/vercel/api/index.py（多线程 WSGI 服务，数据来自进程内 PostgREST 桩服务），
+若干线程持续登录，同时另一个线程定时请求 /api/fleets，统计两者的吞吐与延迟。
+
+    python scripts/bench_password_hashing.py --duration 10 --login-clients 16
+    python scripts/bench_password_hashing.py --method pbkdf2:sha256:600000 --workers 2 --queue 4
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'deploy', 'vercel', 'api'))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+os.environ.setdefault('SUPABASE_URL', 'http://postgrest-stub.local')
+os.environ.setdefault('SUPABASE_SERVICE_KEY', 'stub.service.key')
+
+import httpx  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+import index  # noqa: E402
+from postgrest_stub import PostgrestStub  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 2)
+
+
+def run_scenario(name, hasher, args):
+    stub = PostgrestStub(tables={
+        'users': [{
+            'id': str(uuid.uuid4()),
+            'username': 'bench',
+            'email': 'bench@example.com',
+            'role': 'user',
+            'password_hash': hasher.hash('bench-password'),
+            'created_at': '2025-01-01T00:00:00+00:00'
+        }],
+        'fleets': [{'id': str(uuid.uuid4()), 'name': f'车队{i}'} for i in range(20)]
+    })
+    index.configure_supabase_http(transport=httpx.WSGITransport(app=stub.app))
+    index.password_hasher = hasher
+
+    server = make_server('127.0.0.1', 0, index.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    token = index.create_access_token(stub.tables['users'][0]['id'])
+
+    stop = threading.Event()
+    login_status = {}
+    login_latencies = []
+    api_latencies = []
+    lock = threading.Lock()
+
+    def login_client():
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench-password'})
+                elapsed = time.perf_counter() - started
+                with lock:
+                    login_status[response.status_code] = login_status.get(response.status_code, 0) + 1
+                    if response.status_code == 200:
+                        login_latencies.append(elapsed)
+                if response.status_code == 429:
+                    time.sleep(0.05)
+
+    def api_probe():
+        with httpx.Client(base_url=base_url, timeout=60, headers={'Authorization': f'Bearer {token}'}) as client:
+            while not stop.is_set():
+                started = time.perf_counter()
+                client.get('/api/fleets')
+                api_latencies.append(time.perf_counter() - started)
+                time.sleep(args.probe_interval)
+
+    threads = [threading.Thread(target=login_client) for _ in range(args.login_clients)]
+    threads.append(threading.Thread(target=api_probe))
+    for worker in threads:
+        worker.start()
+    time.sleep(args.duration)
+    stop.set()
+    for worker in threads:
+        worker.join()
+    server.shutdown()
+
+    return {
+        'scenario': name,
+        'login': {
+            'ok_per_second': round(login_status.get(200, 0) / args.duration, 2),
+            'status_counts': {str(code): count for code, count in sorted(login_status.items())},
+            'p50_ms': percentile(login_latencies, 0.50),
+            'p95_ms': percentile(login_latencies, 0.95)
+        },
+        'api_fleets': {
+            'requests': len(api_latencies),
+            'p50_ms': percentile(api_latencies, 0.50),
+            'p95_ms': percentile(api_latencies, 0.95),
+            'p99_ms': percentile(api_latencies, 0.99)
+        }
+    }
+
+
+def main():
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    parser = argparse.ArgumentParser(description='登录吞吐与并发接口延迟基准')
+    parser.add_argument('--duration', type=float, default=10, help='每个场景的持续秒数')
+    parser.add_argument('--login-clients', type=int, default=16, help='并发登录线程数')
+    parser.add_argument('--probe-interval', type=float, default=0.02, help='/api/fleets 探测间隔（秒）')
+    parser.add_argument('--method', default=index.PASSWORD_HASH_METHOD, help='werkzeug 哈希参数')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='哈希线程数')
+    parser.add_argument('--queue', type=int, default=4, help='哈希排队上限')
+    args = parser.parse_args()
+
+    results = [
+        run_scenario('inline', index.PasswordHasher(method=args.method, workers=0), args),
+        run_scenario(
+            f'pool(workers={args.workers}, queue={args.queue})',
+            index.PasswordHasher(method=args.method, workers=args.workers, max_pending=args.queue),
+            args
+        )
+    ]
+    print(json.dumps({'method': args.method, 'login_clients': args.login_clients, 'results': results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
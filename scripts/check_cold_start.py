@@ -0,0 +1,151 @@
+"""Vercel 函数冷启动检查：测量 deploy/vercel/api/index.py 的导入耗时与首个请求耗时，超出预算时返回非零退出码
+
+每轮在全新的 Python 子进程中测量，取多轮中位数：
+  - import：``python -X importtime`` 下 index 模块的累计导入耗时，以及耗时最多的依赖模块
+  - first_health：从开始导入到 /api/health 返回的耗时（不访问数据库）
+  - first_query：从开始导入到首个访问数据库的请求（/api/fleets）返回的耗时，
+    数据来自进程内 PostgREST 桩服务，包含创建 Supabase 客户端的开销
+
+默认预算为导入 300 ms、首个数据库请求 800 ms，预算设为 0 时不检查该项：
+
+    python scripts/check_cold_start.py --runs 5
+    python scripts/check_cold_start.py --budget-import-ms 250 --budget-first-response-ms 0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, 'deploy', 'vercel', 'api')
+SCRIPTS_DIR = os.path.join(ROOT, 'scripts')
+
+# 在子进程中执行：计时从导入 index 之前开始；构造桩服务的耗时从 first_query 中扣除
+FIRST_RESPONSE_CODE = '''
+import json, sys, time, uuid
+sys.path[:0] = [{api_dir!r}, {scripts_dir!r}]
+
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+client = index.app.test_client()
+health = client.get('/api/health')
+first_health = time.perf_counter()
+
+import httpx
+paused = time.perf_counter()
+from postgrest_stub import PostgrestStub
+stub = PostgrestStub(tables={{'fleets': [{{'id': str(uuid.uuid4()), 'name': '车队'}}]}})
+resumed = time.perf_counter()
+index.configure_supabase_http(transport=httpx.WSGITransport(app=stub.app))
+token = index.create_access_token(str(uuid.uuid4()))
+fleets = client.get('/api/fleets', headers={{'Authorization': 'Bearer ' + token}})
+first_query = time.perf_counter() - (resumed - paused)
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_health_ms': (first_health - started) * 1000,
+    'first_query_ms': (first_query - started) * 1000,
+    'status': [health.status_code, fleets.status_code]
+}}))
+'''
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault('SUPABASE_URL', 'http://postgrest-stub.local')
+    env.setdefault('SUPABASE_SERVICE_KEY', 'stub.service.key')
+    env.setdefault('JWT_SECRET_KEY', 'cold-start-check')
+    # 与 Vercel 运行环境一致：不读取 .env
+    env.setdefault('VERCEL', '1')
+    return env
+
+
+def parse_importtime(stderr):
+    # 行格式：import time: self [us] | cumulative | imported package
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        # 子模块名带缩进，顶层包无缩进
+        name = name.strip()
+        modules[name] = {'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000}
+    return modules
+
+
+def measure_import(top):
+    code = f'import sys; sys.path.insert(0, {API_DIR!r}); import index'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, env=child_env(), cwd=ROOT
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'导入 index 失败:\n{result.stderr[-2000:]}')
+    modules = parse_importtime(result.stderr)
+    # 只统计顶层包，避免子模块重复计算
+    packages = [
+        (name, stats) for name, stats in modules.items()
+        if name != 'index' and '.' not in name
+    ]
+    packages.sort(key=lambda item: item[1]['cumulative_ms'], reverse=True)
+    return modules['index']['cumulative_ms'], [
+        {'module': name, 'cumulative_ms': round(stats['cumulative_ms'], 1)} for name, stats in packages[:top]
+    ]
+
+
+def measure_first_response():
+    code = FIRST_RESPONSE_CODE.format(api_dir=API_DIR, scripts_dir=SCRIPTS_DIR)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=child_env(), cwd=ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(f'首个请求测量失败:\n{result.stderr[-2000:]}')
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    if measured['status'] != [200, 200]:
+        raise RuntimeError(f'请求返回异常状态码: {measured["status"]}')
+    return measured
+
+
+def median(values):
+    return round(statistics.median(values), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vercel 函数冷启动检查')
+    parser.add_argument('--runs', type=int, default=5, help='测量轮数，取中位数')
+    parser.add_argument('--top', type=int, default=10, help='列出导入耗时最多的顶层模块数')
+    parser.add_argument('--budget-import-ms', type=float, default=300, help='index 导入耗时预算，0 表示不检查')
+    parser.add_argument('--budget-first-response-ms', type=float, default=800, help='首个数据库请求耗时预算，0 表示不检查')
+    args = parser.parse_args()
+
+    import_times, top_modules, responses = [], None, []
+    for _ in range(args.runs):
+        cumulative_ms, top_modules = measure_import(args.top)
+        import_times.append(cumulative_ms)
+        responses.append(measure_first_response())
+
+    report = {
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'import_ms': median(import_times),
+        'first_health_ms': median([response['first_health_ms'] for response in responses]),
+        'first_query_ms': median([response['first_query_ms'] for response in responses]),
+        'top_imports': top_modules,
+        'budgets': {},
+        'ok': True
+    }
+    for name, budget, measured in (
+        ('import_ms', args.budget_import_ms, report['import_ms']),
+        ('first_response_ms', args.budget_first_response_ms, report['first_query_ms'])
+    ):
+        if budget <= 0:
+            continue
+        within = measured <= budget
+        report['budgets'][name] = {'budget': budget, 'measured': measured, 'ok': within}
+        report['ok'] = report['ok'] and within
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(0 if report['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
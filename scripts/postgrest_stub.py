@@ -0,0 +1,348 @@
+"""本地 PostgREST 兼容桩服务，用于在没有 Supabase 的环境下运行和测试 deploy/vercel/api/index.py
+
+支持的子集：
+  - GET / POST / PATCH / DELETE /rest/v1/<table>
+  - select（含一层外键嵌入，如 ``*, fleets(name)``）
+  - 过滤：eq / neq / gt / gte / lt / lte / like / ilike / in / is，以及 or=(..., and(...))
+  - order / limit / offset，Prefer: count=exact|planned|estimated（Content-Range），超出范围返回 416
+  - 唯一约束冲突返回 409 / 23505，upsert（Prefer: resolution=merge-duplicates|ignore-duplicates, on_conflict）
+  - /rest/v1/rpc/<function> 通过 register_rpc 注册，未注册时返回 PGRST202
+
+独立运行：
+    python scripts/postgrest_stub.py --port 54321
+    SUPABASE_URL=http://127.0.0.1:54321 python deploy/vercel/api/index.py
+
+进程内使用（不占端口）：
+    stub = PostgrestStub()
+    index.configure_supabase_http(transport=httpx.WSGITransport(app=stub.app))
+"""
+import argparse
+import copy
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import Flask, Response, json, request
+
+# 各表的唯一约束，与 backend/migrations/001_initial_schema.sql 保持一致
+UNIQUE_COLUMNS = {
+    'users': [('username',), ('email',)],
+    'vehicles': [('license_plate',)],
+    'orders': [('order_no',)],
+    'fleet_balance': [('fleet_id', 'year', 'month')]
+}
+
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+
+
+class StubError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def split_top_level(text):
+    # 按不在括号、引号内的逗号切分
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        if char == ',' and depth == 0 and not quoted:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def coerce(value, sample):
+    # 按行中已有值的类型转换过滤值
+    if value == 'null':
+        return None
+    if isinstance(sample, bool):
+        return value.lower() == 'true'
+    if isinstance(sample, int):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if isinstance(sample, float):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def like_to_regex(pattern):
+    return re.compile('^' + '.*'.join(re.escape(part) for part in pattern.replace('*', '%').split('%')) + '$', re.S)
+
+
+def compare(operator, actual, value):
+    if operator == 'is':
+        return actual is None if value.lower() == 'null' else actual == (value.lower() == 'true')
+    if operator == 'in':
+        values = [unquote(item) for item in split_top_level(value.strip('()'))]
+        return actual is not None and str(actual) in values
+    if actual is None:
+        return False
+    if operator in ('like', 'ilike'):
+        flags = re.I if operator == 'ilike' else 0
+        return re.match(like_to_regex(value).pattern, str(actual), flags) is not None
+    expected = coerce(value, actual)
+    if operator == 'eq':
+        return actual == expected
+    if operator == 'neq':
+        return actual != expected
+    if operator == 'gt':
+        return actual > expected
+    if operator == 'gte':
+        return actual >= expected
+    if operator == 'lt':
+        return actual < expected
+    if operator == 'lte':
+        return actual <= expected
+    raise StubError(400, 'PGRST100', f'unsupported operator: {operator}')
+
+
+def parse_condition(text):
+    # column.op.value | not.column.op.value | and(...) | or(...)
+    for logic in ('and', 'or'):
+        if text.startswith(logic + '(') and text.endswith(')'):
+            children = [parse_condition(part) for part in split_top_level(text[len(logic) + 1:-1])]
+            if logic == 'and':
+                return lambda row: all(child(row) for child in children)
+            return lambda row: any(child(row) for child in children)
+    negate = text.startswith('not.')
+    if negate:
+        text = text[4:]
+    column, operator, value = text.split('.', 2)
+    value = unquote(value)
+
+    def check(row):
+        result = compare(operator, row.get(column), value)
+        return not result if negate else result
+    return check
+
+
+def parse_filter(column, expression):
+    if column in ('or', 'and'):
+        return parse_condition(f'{column}{expression}')
+    return parse_condition(f'{column}.{expression}')
+
+
+class PostgrestStub:
+    def __init__(self, tables=None, latency=0.0):
+        # latency：每个请求的模拟网络延迟（秒），用于观察串行/并发请求的差异
+        self.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.latency = latency
+        self.rpcs = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.app = self.create_app()
+
+    def register_rpc(self, name, function):
+        # function(stub, params) -> JSON 可序列化的结果
+        self.rpcs[name] = function
+
+    def rows(self, table):
+        return self.tables.setdefault(table, [])
+
+    # ---- 查询 ----
+
+    def filters(self, args):
+        checks = []
+        for column, expression in args.items(multi=True):
+            if column in RESERVED_PARAMS or '.' in column:
+                continue
+            checks.append(parse_filter(column, expression))
+        return lambda row: all(check(row) for check in checks)
+
+    def project(self, table, row, select):
+        if not select or select.strip() == '*':
+            return dict(row)
+        result = {}
+        for item in split_top_level(select):
+            match = re.match(r'^(\w+)\((.*)\)$', item)
+            if match:
+                # 一层外键嵌入：fleets(name) 通过 fleet_id 关联
+                related, columns = match.groups()
+                foreign_key = related.rstrip('s') + '_id'
+                target = next((r for r in self.rows(related) if r.get('id') == row.get(foreign_key)), None)
+                result[related] = self.project(related, target, columns) if target else None
+            elif item == '*':
+                result.update(row)
+            else:
+                result[item] = row.get(item)
+        return result
+
+    @staticmethod
+    def sort(rows, order):
+        for item in reversed(split_top_level(order or '')):
+            parts = item.split('.')
+            column = parts[0]
+            desc = 'desc' in parts[1:]
+            nulls_first = 'nullsfirst' in parts[1:] or ('nullslast' not in parts[1:] and desc)
+            present = [row for row in rows if row.get(column) is not None]
+            missing = [row for row in rows if row.get(column) is None]
+            present.sort(key=lambda row: row[column], reverse=desc)
+            rows = missing + present if nulls_first else present + missing
+        return rows
+
+    @staticmethod
+    def prefer(name):
+        for item in request.headers.get('Prefer', '').split(','):
+            key, _, value = item.strip().partition('=')
+            if key == name:
+                return value
+        return None
+
+    def select(self, table):
+        rows = [row for row in self.rows(table) if self.filters(request.args)(row)]
+        rows = self.sort(rows, request.args.get('order'))
+        total = len(rows)
+        offset = int(request.args.get('offset', 0))
+        limit = request.args.get('limit')
+        if offset and offset >= total:
+            raise StubError(416, 'PGRST103', 'Requested range not satisfiable')
+        page = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+        body = [self.project(table, row, request.args.get('select')) for row in page]
+        return body, self.content_range(offset, len(page), total)
+
+    def content_range(self, offset, size, total):
+        counted = self.prefer('count') is not None
+        span = f'{offset}-{offset + size - 1}' if size else '*'
+        return f'{span}/{total if counted else "*"}'
+
+    # ---- 写入 ----
+
+    def check_unique(self, table, row, ignore=None):
+        for columns in UNIQUE_COLUMNS.get(table, []):
+            for existing in self.rows(table):
+                if existing is ignore:
+                    continue
+                if all(existing.get(column) == row.get(column) for column in columns):
+                    return columns, existing
+        return None, None
+
+    def insert(self, table, payload):
+        resolution = self.prefer('resolution')
+        on_conflict = tuple(filter(None, request.args.get('on_conflict', '').split(',')))
+        created = []
+        for values in payload if isinstance(payload, list) else [payload]:
+            row = dict(values)
+            row.setdefault('id', str(uuid.uuid4()))
+            row.setdefault('created_at', datetime.now(timezone.utc).isoformat())
+            columns, existing = self.check_unique(table, row)
+            if existing is None and resolution:
+                # upsert 按主键或 on_conflict 列匹配已有行
+                keys = on_conflict or ('id',)
+                existing = next(
+                    (r for r in self.rows(table) if all(r.get(key) == values.get(key) for key in keys)), None
+                ) if all(key in values for key in keys) else None
+            if existing is not None:
+                if resolution == 'ignore-duplicates':
+                    continue
+                if resolution == 'merge-duplicates':
+                    existing.update({key: value for key, value in values.items() if key != 'id'})
+                    created.append(existing)
+                    continue
+                raise StubError(409, '23505', f'duplicate key value violates unique constraint on {table}({", ".join(columns)})')
+            self.rows(table).append(row)
+            created.append(row)
+        return created
+
+    def update(self, table, values):
+        matched = [row for row in self.rows(table) if self.filters(request.args)(row)]
+        for row in matched:
+            candidate = {**row, **values}
+            columns, existing = self.check_unique(table, candidate, ignore=row)
+            if existing is not None:
+                raise StubError(409, '23505', f'duplicate key value violates unique constraint on {table}({", ".join(columns)})')
+        for row in matched:
+            row.update(values)
+        return matched
+
+    def delete(self, table):
+        check = self.filters(request.args)
+        deleted = [row for row in self.rows(table) if check(row)]
+        self.tables[table] = [row for row in self.rows(table) if not check(row)]
+        return deleted
+
+    # ---- 路由 ----
+
+    def create_app(self):
+        app = Flask(__name__)
+
+        def respond(body, status=200, headers=None):
+            return Response(json.dumps(body), status=status, headers=headers or {}, mimetype='application/json')
+
+        @app.errorhandler(StubError)
+        def handle_error(error):
+            return respond({'code': error.code, 'message': error.message, 'hint': None, 'details': None}, error.status)
+
+        @app.before_request
+        def simulate_latency():
+            with self._lock:
+                self.requests += 1
+            if self.latency:
+                time.sleep(self.latency)
+
+        @app.route('/rest/v1/rpc/<name>', methods=['GET', 'POST'])
+        def rpc(name):
+            if name not in self.rpcs:
+                raise StubError(404, 'PGRST202', f'Could not find the function public.{name}')
+            params = request.get_json(silent=True) or request.args.to_dict()
+            return respond(self.rpcs[name](self, params))
+
+        @app.route('/rest/v1/<table>', methods=['GET', 'HEAD', 'POST', 'PATCH', 'DELETE'])
+        def table_endpoint(table):
+            with self._lock:
+                if request.method in ('GET', 'HEAD'):
+                    body, content_range = self.select(table)
+                    if request.method == 'HEAD':
+                        return Response(status=200, headers={'Content-Range': content_range})
+                    return respond(body, 200, {'Content-Range': content_range})
+                if request.method == 'POST':
+                    rows = self.insert(table, request.get_json())
+                    status = 201
+                elif request.method == 'PATCH':
+                    rows = self.update(table, request.get_json())
+                    status = 200
+                else:
+                    rows = self.delete(table)
+                    status = 200
+                body = copy.deepcopy(rows) if self.prefer('return') == 'representation' else []
+                headers = {'Content-Range': self.content_range(0, len(rows), len(rows))}
+                return respond(body, status, headers)
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 PostgREST 兼容桩服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的模拟延迟（秒）')
+    args = parser.parse_args()
+    PostgrestStub(latency=args.latency).app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()